@@ -4,18 +4,33 @@ import random
 import re
 import html
 
+from rate_limiter import RateLimited, get_rate_limiter
+from sanitizer import UnsafeInput, sanitize
+
 class OpenAIClient:
     def __init__(self):
         self.client = None
 
     def _get_client(self):
+        """OpenAI-клиент. OPENAI_BASE_URL (окружение или secrets) — OpenAI-совместимый сервер,
+        например mock_llm_server.py: ему ключ вида sk-... не нужен"""
         if self.client is None:
             try:
+                import os
                 import streamlit as st
-                api_key = st.secrets.get("OPENAI_API_KEY")
-                if api_key and "sk-" in str(api_key):
+                base_url = os.environ.get("OPENAI_BASE_URL")
+                api_key = os.environ.get("OPENAI_API_KEY")
+                if not (base_url and api_key):
+                    try:
+                        base_url = base_url or st.secrets.get("OPENAI_BASE_URL")
+                        api_key = api_key or st.secrets.get("OPENAI_API_KEY")
+                    except FileNotFoundError:  # нет secrets.toml
+                        pass
+                if base_url or (api_key and "sk-" in str(api_key)):
                     import openai
-                    self.client = openai.OpenAI(api_key=api_key)
+                    # Без встроенных повторов SDK: 429 должен дойти до rate_limiter.throttle(),
+                    # а не повторяться внутри занятого слота очереди
+                    self.client = openai.OpenAI(api_key=api_key or "mock", base_url=base_url or None, max_retries=0)
                 else:
                     print("[DEBUG] OpenAI API key missing or invalid")
                     return None
@@ -24,36 +39,29 @@ class OpenAIClient:
                 return None
         return self.client
 
-    def _sanitize_input(self, text: str) -> str:
-        dangerous_patterns = [
-            r'\b(UPDATE|INSERT|DELETE|DROP|ALTER|CREATE|TRUNCATE|EXEC)\b',
-            r';\s*(--|#|/\*)',
-            r"'(\s*OR\s+1=1|--)",
-            r'(\.\.|/proc/self/environ)',
-            r'<script.*?>.*?</script>',
-        ]
-        text = text.strip()
-        for pattern in dangerous_patterns:
-            if re.search(pattern, text, re.IGNORECASE | re.MULTILINE):
-                raise ValueError("dangerous content")
-        return text
+    def _sanitize_input(self, text: str, character=None) -> str:
+        return sanitize(text, character)
 
-    def generate_response(self, character, user_message, chat_history=[]):
+    def generate_response(self, character, user_message, chat_history=None, session_id=None, priority=False):
+        """chat_history — контекст чата (conversation_memory.ConversationMemory.context).
+        session_id/priority — место в общей очереди к LLM (rate_limiter): priority у открытого чата"""
         try:
-            user_message = self._sanitize_input(user_message)
-        except ValueError:
+            user_message = self._sanitize_input(user_message, character)
+        except UnsafeInput as e:
+            spans = ", ".join(f"{f['rule']}@{f['start']}-{f['end']}" for f in e.findings)
+            print(f"[DEBUG] 🛑 Сообщение для {character} отклонено: {spans}")
             return "❌ Запрос содержит потенциально опасные команды. Пожалуйста, переформулируйте."
 
         delay = self._get_character_delay(character)
         time.sleep(delay)
 
-        ai_response = self._try_openai(character, user_message, chat_history)
+        ai_response = self._try_openai(character, user_message, chat_history or [], session_id, priority)
         if ai_response:
             return ai_response
 
         return self._get_smart_fallback(character, user_message)
 
-    def _try_openai(self, character, user_message, chat_history):
+    def _try_openai(self, character, user_message, chat_history, session_id=None, priority=False):
         client = self._get_client()
         if not client:
             print("[DEBUG] 🔴 OpenAI client = None → fallback")
@@ -63,24 +71,30 @@ class OpenAIClient:
             print(f"[DEBUG] 🟢 Вызываю OpenAI для {character}: '{user_message[:20]}...'")
             import streamlit as st
             messages = [{"role": "system", "content": self._get_detailed_prompt(character)}]
-            for msg in chat_history[-6:]:
-                role = "user" if msg["role"] == "user" else "assistant"
+            for msg in chat_history:
+                role = msg["role"] if msg["role"] in ("user", "system") else "assistant"
                 messages.append({"role": role, "content": msg["content"]})
             messages.append({"role": "user", "content": user_message})
 
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                temperature=0.3,
-                max_tokens=500,
-                timeout=10
-            )
+            with get_rate_limiter().slot(session_id or "default", priority):
+                response = client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=500,
+                    timeout=10
+                )
 
             result = response.choices[0].message.content
             result = self._filter_sql_queries(result, character)
             print(f"[DEBUG] 🟢 Ответ получен: '{result[:30]}...'")
             return html.escape(result, quote=False)
+        except RateLimited as e:
+            print(f"[DEBUG] 🟡 Очередь к OpenAI ({e.reason}) → fallback")
+            return None
         except Exception as e:
+            if getattr(e, "status_code", None) == 429:
+                get_rate_limiter().throttle()
             print(f"[DEBUG] 🔴 OpenAI error: {str(e)}")
             return None
 
@@ -519,46 +533,8 @@ class OpenAIClient:
         return prompts.get(character, "Отвечай как профессионал. Без эмодзи.")
 
     def _get_smart_fallback(self, character, user_message):
-        fallbacks = {
-            "alice": [
-                "Давай разберемся с задачей. Что именно нужно сделать?",
-                "Помогу разобраться. С чем возникли сложности?",
-                "Расскажи подробнее о задаче - вместе найдем решение.",
-                "Что уже пробовал сделать? С чего хочешь начать?"
-            ],
-            "maxim": [
-                "Нужны цифры для отчетности. За деталями по данным - к Алисе.",
-                "ASAP к 11:00 для встречи с инвесторами.",
-                "Зайди к Алисе за техническими деталями.",
-                "Мне нужны готовые цифры для отчетности."
-            ],
-            "kirill": [
-                "Нужна статистика для отчета. Что именно интересует?",
-                "Горит! Нужны данные как можно скорее.",
-                "Помоги с отчетом - какие данные нужны?",
-                "Критично для отчета продукту."
-            ],
-            "dba_team": [
-                "Формат запросов: UPDATE|INSERT таблица УСЛОВИЯ.",
-                "Выполняем технические запросы по установленному формату.",
-                "Для бизнес-логики обратитесь к Алисе.",
-                "Не могу выполнить в таком виде. Уточни формат запроса."
-            ],
-            "partner_a": [
-                "Наши статусы: COMPLETED, DECLINED, IN_PROGRESS.",
-                "Проверим данные и вернемся с ответом.",
-                "Чем можем помочь с реестрами?",
-                "Добрый день! По вопросам реестров и статусов операций - обращайтесь."
-            ],
-            "partner_b": [
-                "Наши статусы: SUCCESS, FAILED.", 
-                "Готовы помочь с вопросами по операциям.",
-                "Проверим информацию и ответим.",
-                "Добрый день! Готовы помочь с вопросами по операциям и реестрам."
-            ]
-        }
-        resp = random.choice(fallbacks.get(character, ["Давай обсудим этот вопрос."]))
-        return html.escape(resp, quote=False)
+        from intents import fallback_reply
+        return html.escape(fallback_reply(character, user_message), quote=False)
 
     def _filter_sql_queries(self, text, character):
         if character == "alice":
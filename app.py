@@ -1,17 +1,15 @@
 # app.py — финальная версия, 955 строк
 import streamlit as st
 import pandas as pd
+import numpy as np
 import time
 import html
 import json
+import uuid
 import plotly.graph_objects as go
 from datetime import datetime
 
 # Lazy imports
-def get_demo_database():
-    from database import get_demo_database as _get
-    return _get()
-
 def get_database_schema():
     from database_schema import DATABASE_SCHEMA
     return DATABASE_SCHEMA
@@ -20,9 +18,62 @@ def get_knowledge_base():
     from knowledge_base import KNOWLEDGE_BASE
     return KNOWLEDGE_BASE
 
-def validate_sql_query(sql_query):
+def get_schema_index():
+    from sql_autocomplete import get_schema_index as _get
+    return _get()
+
+def get_kb_index():
+    from kb_search import get_kb_index as _get
+    return _get()
+
+def validate_sql_query(sql_query, overlay=None):
     from sql_validator import validate_sql_query as _validate
-    return _validate(sql_query)
+    return _validate(sql_query, overlay)
+
+def new_data_overlay():
+    from sql_validator import DataOverlay
+    return DataOverlay()
+
+def get_dba_engine():
+    from sql_validator import get_sql_simulator
+    from dba_engine import DBAEngine
+    return DBAEngine(get_sql_simulator(), st.session_state.data_overlay, st.session_state.dba_log)
+
+def get_report_store():
+    from candidate_reports import get_report_store as _get
+    return _get()
+
+def new_transaction_log():
+    from dba_engine import TransactionLog
+    return TransactionLog()
+
+def new_query_history():
+    from sql_history import QueryHistory
+    return QueryHistory()
+
+def new_conversation_memory():
+    from conversation_memory import ConversationMemory
+    return ConversationMemory()
+
+def get_reconciliation():
+    from reconciliation import get_reconciliation as _get
+    return _get()
+
+def get_answer_registry():
+    from result_fingerprint import get_answer_registry as _get
+    return _get()
+
+def get_fingerprint(df):
+    from result_fingerprint import fingerprint
+    return fingerprint(df)
+
+def new_session_scorer():
+    from session_scoring import SessionScorer
+    return SessionScorer(TRIGGERS, evaluator, get_answer_registry())
+
+def new_scenario_scheduler(scenario, start_time):
+    from scenario_scheduler import ScenarioScheduler
+    return ScenarioScheduler(scenario, start_time)
 
 # Load configs
 try:
@@ -32,6 +83,13 @@ except Exception as e:
     st.warning(f"⚠️ Не найден triggers.json: {e}")
     TRIGGERS = {"mvp_triggers": []}
 
+try:
+    with open("scenarios.json", "r", encoding="utf-8") as f:
+        SCENARIOS = json.load(f)["scenarios"]
+except Exception as e:
+    st.warning(f"⚠️ Не найден scenarios.json: {e}")
+    SCENARIOS = {}
+
 try:
     with open("role_weights.json", "r", encoding="utf-8") as f:
         ROLE_WEIGHTS = json.load(f)
@@ -44,6 +102,10 @@ except Exception as e:
     }
 
 from text_evaluator import TextEvaluator
+from events import ChatEvent, DBAEvent, EventLog, KBSearchEvent, ReportEvent, SQLEvent
+from exports import PARQUET_AVAILABLE, deferred, to_csv, to_parquet
+from scoring import radar_figure, score_summary
+from tracing import Tracer, span as trace_span
 evaluator = TextEvaluator()
 
 # ==========================================
@@ -145,21 +207,26 @@ def initialize_session():
         st.session_state.chats = {key: [] for key in CHAT_KEYS}
         st.session_state.active_chat = "alice"
         st.session_state.active_tab = "chats"
-        st.session_state.sql_history = []
+        # История: текст, отпечаток и сжатое превью результата (память сессии ограничена)
+        st.session_state.sql_history = new_query_history()
         st.session_state.sql_last_result = None
         st.session_state.sql_last_feedback = ""
         st.session_state.sql_last_query = ""
+        # Приватные изменения данных кандидата (UPDATE/INSERT через #dba-team)
+        st.session_state.data_overlay = new_data_overlay()
+        st.session_state.dba_log = new_transaction_log()
+        # Контекст чатов для LLM: последние реплики + свёрнутое содержание ранних
+        st.session_state.conversation_memory = new_conversation_memory()
         st.session_state.kb_expanded = {}
+        st.session_state.kb_last_query = ""
         st.session_state.active_scenario = None
         st.session_state.scenario_start_time = None
+        st.session_state.scenario_scheduler = None
         st.session_state.task_reports = []
-        st.session_state.scores = {
-            "soft_skills": 0,
-            "hard_skills": 0,
-            "data_integrity": 0,
-            "process_documentation": 0
-        }
-        st.session_state.events = []
+        # Баллы блоков и журнал начислений (session_scoring.py); scores — тот же dict, что у scorer
+        st.session_state.scorer = new_session_scorer()
+        st.session_state.scores = st.session_state.scorer.scores
+        st.session_state.events = EventLog()
         st.session_state.custom_weights = None
         st.session_state.reviewer_role = "analyst"
         st.session_state.w_soft = 20
@@ -168,8 +235,28 @@ def initialize_session():
         st.session_state.w_doc = 10
         st.session_state.pending_response_for = None
         st.session_state.pending_user_input = ""
+        st.session_state.pending_message_index = None  # позиция вопроса в чате: история для LLM — до него
         st.session_state.response_start_time = None
         st.session_state.last_check = 0
+        # Сессия кандидата в общей сводке (📈 Отчёты по кандидатам) — с первого события (record_event)
+        st.session_state.candidate_id = f"{st.session_state.active_profile}_{uuid.uuid4().hex[:8]}"
+
+def record_event(event):
+    """Лог события сессии (events.EventLog), начисление баллов за него и инкрементальное обновление сводки"""
+    events = st.session_state.events
+    events.append(event)
+    if st.session_state.scenario_scheduler:
+        st.session_state.scenario_scheduler.on_event(event)
+    store = get_report_store()
+    profile = st.session_state.user_profiles[st.session_state.active_profile]
+    if profile["role"] == "candidate":
+        # Первое событие кандидата заводит его в сводку; сессии без действий (ревьюер, смена профиля) — нет
+        store.register(st.session_state.candidate_id, profile["name"], st.session_state.active_profile,
+                       st.session_state.active_scenario)
+    store.ingest_event(st.session_state.candidate_id, event.type, event.timestamp)
+    for block, points, score, trigger_id in st.session_state.scorer.observe(event, events.appended - 1):
+        store.ingest_score(st.session_state.candidate_id, block, points, score, trigger_id)
+    return event
 
 # ==========================================
 # UI: sidebar — с badge’ами для непрочитанных
@@ -250,13 +337,24 @@ def render_sidebar():
                 st.session_state.active_tab = "reports_overview"
             if st.button("🕒 История выполненного", key="tab_history", use_container_width=True):
                 st.session_state.active_tab = "history"
+            if st.button("⏱️ Профилирование", key="tab_profiling", use_container_width=True):
+                st.session_state.active_tab = "profiling"
         
         # 🎯 Сценарии
         st.markdown("### 🎯 Обучение")
         if st.button("▶️ Запустить сценарий", key="start_scenario", use_container_width=True):
-            st.session_state.active_scenario = "revenue_mismatch"
-            st.session_state.scenario_start_time = time.time()
-            st.success("Сценарий запущен!")
+            # Повторное нажатие не перезапускает идущий сценарий — иначе его сообщения придут ещё раз
+            if st.session_state.active_scenario != "revenue_mismatch" or not st.session_state.scenario_scheduler:
+                st.session_state.active_scenario = "revenue_mismatch"
+                st.session_state.scenario_start_time = time.time()
+                st.session_state.scenario_scheduler = (
+                    new_scenario_scheduler(SCENARIOS["revenue_mismatch"], st.session_state.scenario_start_time)
+                    if "revenue_mismatch" in SCENARIOS else None
+                )
+                get_report_store().set_scenario(st.session_state.candidate_id, "revenue_mismatch")
+                st.success("Сценарий запущен!")
+            else:
+                st.info("Сценарий уже идёт")
         
         if st.button("🔄 Обнулить прогресс", key="reset", use_container_width=True):
             st.session_state.clear()
@@ -351,6 +449,8 @@ def render_message(msg, is_typing=False):
             sender_icon = "🟡 "
         elif source == "openai":
             sender_icon = "🤖 "
+        elif source == "dba":
+            sender_icon = "🛠️ "
         else:
             sender_icon = "❓ "
     
@@ -431,16 +531,12 @@ def display_chat(chat_id):
                 "read": False,
                 "timestamp": time.time()
             })
-            st.session_state.events.append({
-                "type": "chat",
-                "to": chat_id,
-                "content": user_input.strip(),
-                "timestamp": time.time()
-            })
+            record_event(ChatEvent(user_input.strip(), to=chat_id))
             
             # ✅ Устанавливаем флаг ожидания
             st.session_state.pending_response_for = chat_id
             st.session_state.pending_user_input = user_input.strip()
+            st.session_state.pending_message_index = len(st.session_state.chats[chat_id]) - 1
             st.session_state.response_start_time = time.time()
             
             # ✅ ЕДИНСТВЕННЫЙ st.rerun() — чтобы отобразить сообщение
@@ -472,7 +568,7 @@ def task_report_form():
     )
     
     if st.session_state.sql_history:
-        recent_queries = [item["query"] for item in st.session_state.sql_history[-5:]]
+        recent_queries = st.session_state.sql_history.queries(5)
         selected_sql = st.selectbox(
             "Вставить последний SQL-запрос",
             options=["— не выбрано —"] + recent_queries,
@@ -494,11 +590,7 @@ def task_report_form():
                 "result": result.strip()
             }
             st.session_state.task_reports.append(new_report)
-            st.session_state.events.append({"type": "report", "data": new_report, "timestamp": time.time()})
-            
-            # Оценка отчёта
-            report_score = evaluator.evaluate_task_report(description, action, result)
-            st.session_state.scores["process_documentation"] = max(0, min(12, st.session_state.scores["process_documentation"] + report_score["score"]))
+            record_event(ReportEvent(new_report))  # оценка отчёта — в session_scoring
             
             st.success("Отчёт сохранён!")
             st.rerun()
@@ -517,26 +609,16 @@ def show_database_schema():
         st.markdown(f"**Описание:** {table_info['description']}")
         st.markdown("---")
         st.markdown("**Структура таблицы:**")
-        cols = st.columns([2, 2, 1, 3])
-        cols[0].markdown("**Колонка**")
-        cols[1].markdown("**Тип**")
-        cols[2].markdown("**Ключ**")
-        cols[3].markdown("**Описание**")
-        for col_name, col_info in table_info['columns'].items():
-            c0, c1, c2, c3 = st.columns([2, 2, 1, 3])
-            c0.code(col_name)
-            c1.code(col_info['type'])
-            if col_info.get('pk'):
-                c2.markdown("🔑")
-            elif col_info.get('fk'):
-                c2.markdown("🔗")
-            else:
-                c2.markdown("")
-            c3.write(col_info['description'])
+        st.dataframe(pd.DataFrame(get_schema_index().table_rows[selected_table]),
+                     use_container_width=True, hide_index=True)
 
 # ==========================================
 # UI: SQL песочница
 # ==========================================
+def _apply_sql_completion(sql_query, insert):
+    from sql_autocomplete import apply_completion
+    st.session_state.sql_input = apply_completion(sql_query, insert)
+
 def sql_sandbox():
     st.subheader("🔧 SQL Песочница")
     tab1, tab2 = st.tabs(["📝 SQL Запрос", "🗃️ Схема БД"])
@@ -544,49 +626,99 @@ def sql_sandbox():
     with tab1:
         col1, col2 = st.columns([3, 1])
         with col1:
-            sql_query = st.text_area("SQL запрос:", 
-                                    value=st.session_state.get("sql_last_query", ""),
-                                    height=120,
-                                    key="sql_input")
+            # Поле управляется только через session_state (подсказки пишут в sql_input).
+            # Streamlit удаляет состояние виджета на других вкладках — восстанавливаем последний запрос
+            if "sql_input" not in st.session_state:
+                st.session_state.sql_input = st.session_state.sql_last_query
+            sql_query = st.text_area("SQL запрос:", height=120, key="sql_input")
+            # Подсказки по схеме: колонки после alias., условия связи после ON, таблицы после FROM/JOIN
+            suggestions = get_schema_index().complete(sql_query)
+            if suggestions:
+                st.caption("💡 Подсказки:")
+                hint_cols = st.columns(min(len(suggestions), 4))
+                for i, (insert, label) in enumerate(suggestions):
+                    hint_cols[i % len(hint_cols)].button(
+                        label, key=f"sql_hint_{i}", on_click=_apply_sql_completion, args=(sql_query, insert)
+                    )
         # ✅ Кнопка ВЫПОЛНИТЬ — ПЕРЕМЕЩЕНА ВНИЗ, ПОД ПОЛЕМ
         if st.button("▶️ Выполнить", type="primary", key="run_sql", use_container_width=True):
             if sql_query.strip():
                 st.session_state.sql_last_query = sql_query
-                result, feedback = validate_sql_query(sql_query)
+                with trace_span("sql_execute"):
+                    result, feedback = validate_sql_query(sql_query, st.session_state.data_overlay)
                 st.session_state.sql_last_result = result
                 st.session_state.sql_last_feedback = feedback
-                st.session_state.sql_history.append({
-                    "query": sql_query,
-                    "result": result.copy() if result is not None else None,
-                    "feedback": feedback,
-                    "timestamp": time.time()
-                })
-                st.session_state.sql_history = st.session_state.sql_history[-10:]
+                st.session_state.sql_history.append(sql_query, result, feedback)
                 
-                # Лог событий + оценка
-                st.session_state.events.append({"type": "sql", "query": sql_query, "timestamp": time.time()})
-                triggers = evaluator.evaluate_sql_query(sql_query)
-                for t in triggers:
-                    for trig in TRIGGERS["mvp_triggers"]:
-                        if trig["id"] == t["id"]:
-                            st.session_state.scores[trig["block"]] = max(0, st.session_state.scores[trig["block"]] + t["points"])
-                            break
+                # Лог событий + оценка (session_scoring)
+                record_event(SQLEvent(sql_query))
+                # Автопроверка: результат совпал с эталонным ответом шага сценария (баллы — один раз за шаг)
+                for match in st.session_state.scorer.result_matches(result, sql_query, st.session_state.active_scenario):
+                    record_event(match)
         
         # Результаты — под кнопкой
         if st.session_state.sql_last_result is not None:
             st.success("✅ Запрос выполнен")
-            st.dataframe(st.session_state.sql_last_result, use_container_width=True)
+            result = st.session_state.sql_last_result
+            st.dataframe(result, use_container_width=True)
+            export_cols = st.columns(4)
+            export_cols[0].download_button(
+                "📥 CSV", data=deferred(lambda: to_csv(result)),
+                file_name="sql_result.csv", mime="text/csv", key="sql_export_csv"
+            )
+            if PARQUET_AVAILABLE:
+                export_cols[1].download_button(
+                    "📥 Parquet", data=deferred(lambda: to_parquet(result)),
+                    file_name="sql_result.parquet", mime="application/vnd.apache.parquet", key="sql_export_parquet"
+                )
         if st.session_state.sql_last_feedback:
             st.info(f"💡 {st.session_state.sql_last_feedback}")
         
         with st.expander("🕒 История запросов (последние 10)", expanded=False):
-            for item in reversed(st.session_state.sql_history):
+            history = st.session_state.sql_history
+            for item in reversed(history.entries):
                 st.code(item["query"], language="sql")
-                if item["result"] is not None:
-                    st.dataframe(item["result"], use_container_width=True)
-                if item["feedback"]:
-                    st.caption(item["feedback"])
-                st.markdown("---")
+                rows = f"{item['rows']} строк · " if item["rows"] is not None else ""
+                st.caption(f"{time.strftime('%H:%M:%S', time.localtime(item['timestamp']))} · {rows}{item['feedback']}")
+            # Таблица рендерится только для выбранного запроса
+            with_result = [item["id"] for item in reversed(history.entries) if item["rows"] is not None]
+            if with_result:
+                selected = st.selectbox(
+                    "Показать результат",
+                    [None] + with_result,
+                    format_func=lambda i: "— не выбрано —" if i is None else f"#{i}: {history.get(i)['query'][:80]}",
+                    key="sql_history_selected",
+                )
+                item = history.get(selected) if selected is not None else None
+                if item is not None:
+                    preview = history.preview(item)
+                    if preview is not None:
+                        st.dataframe(preview, use_container_width=True)
+                        if item["rows"] > len(preview):
+                            st.caption(f"Показаны первые {len(preview)} из {item['rows']} строк")
+                    elif st.button("🔄 Пересчитать результат", key=f"sql_history_rerun_{item['id']}"):
+                        # Превью вытеснено лимитом памяти — выполняем запрос заново
+                        rerun, _ = validate_sql_query(item["query"], st.session_state.data_overlay)
+                        if rerun is not None:
+                            st.dataframe(rerun, use_container_width=True)
+                            if get_fingerprint(rerun) != item["fingerprint"]:
+                                st.warning("⚠️ Данные изменились: результат отличается от исходного")
+
+        if st.session_state.dba_log.entries:
+            with st.expander("🛠️ Журнал DBA (изменения ваших данных)", expanded=False):
+                for entry in reversed(st.session_state.dba_log.entries):
+                    status = "↩️ откатано" if entry["rolled_back"] else f"#{entry['id']}"
+                    st.code(entry["statement"], language="sql")
+                    st.caption(f"{status} · {time.strftime('%H:%M:%S', time.localtime(entry['timestamp']))}")
+                    if entry["images"]:
+                        st.dataframe(pd.DataFrame([
+                            {"": "до", **(before or {})} for _, _, before, _, _ in entry["images"][:20]
+                        ] + [
+                            {"": "после", **after} for _, _, _, after, _ in entry["images"][:20]
+                        ]), use_container_width=True)
+                    if not entry["rolled_back"] and st.button("↩️ Откатить", key=f"rollback_{entry['id']}"):
+                        get_dba_engine().rollback(entry["id"])
+                        st.rerun()
     
     with tab2:
         show_database_schema()
@@ -597,27 +729,53 @@ def sql_sandbox():
 def knowledge_base():
     st.subheader("📚 База знаний")
     KNOWLEDGE_BASE = get_knowledge_base()
-    for key, article in KNOWLEDGE_BASE.items():
-        is_expanded = st.session_state.kb_expanded.get(key, False)
-        with st.expander(article['title'], expanded=is_expanded):
-            st.session_state.kb_expanded[key] = True
-            st.markdown(article['content'])
+
+    query = st.text_input("🔎 Поиск", key="kb_query", placeholder="Например: статусы партнёра, бэкап, is_excluded").strip()
+    if not query:
+        for key, article in KNOWLEDGE_BASE.items():
+            is_expanded = st.session_state.kb_expanded.get(key, False)
+            with st.expander(article['title'], expanded=is_expanded):
+                st.session_state.kb_expanded[key] = True
+                st.markdown(article['content'])
+        return
+
+    results = get_kb_index().search(query)
+    # Логируем каждый новый запрос — по этим событиям отчёт считает kb_search_before_ask
+    if query != st.session_state.kb_last_query:
+        st.session_state.kb_last_query = query
+        record_event(KBSearchEvent(query, len(results)))
+
+    if not results:
+        st.info("Ничего не найдено. Попробуйте другие слова.")
+        return
+    st.caption(f"Найдено статей: {len(results)}")
+    for hit in results:
+        st.markdown(f"**{hit['title']}**")
+        st.caption(hit["snippet"])
+        with st.expander("Открыть статью", expanded=False):
+            st.markdown(KNOWLEDGE_BASE[hit["key"]]["content"])
 
 # ==========================================
 # UI: сценарий — БЕЗ st.rerun()
 # ==========================================
 def scenario_engine():
-    if st.session_state.active_scenario and st.session_state.scenario_start_time:
-        elapsed = time.time() - st.session_state.scenario_start_time
-        if elapsed > 2 and not st.session_state.get('scenario_step_1'):
-            st.session_state.chats["maxim"].append({
-                "role": "bot",
-                "content": "Нужна выручка за 15.01 к 11:00. ASAP!",
-                "timestamp": time.time(),
-                "read": False,
-                "id": f"auto_{int(time.time() * 1000)}"
-            })
-            st.session_state.scenario_step_1 = True
+    """Сообщения шагов сценария (scenarios.json), срок которых наступил к этому rerun"""
+    scheduler = st.session_state.scenario_scheduler
+    if not scheduler:
+        return
+    now = time.time()
+    for step in scheduler.due(now):
+        chat = st.session_state.chats[step["chat"]]
+        message_id = f"auto_{step['id']}"
+        if any(m.get("id") == message_id for m in chat):  # шаг уже отправлен
+            continue
+        chat.append({
+            "role": "bot",
+            "content": step["message"],
+            "timestamp": now,
+            "read": False,
+            "id": message_id
+        })
 
 # ==========================================
 # UI: режим ревьюера
@@ -658,56 +816,40 @@ def reviewer_mode():
         st.session_state.w_doc = doc
         st.success("Конфигурация применена. Теперь отчёты будут использовать эти веса.")
 
+    with st.expander("🧾 Эталонная сверка (правильный ответ)", expanded=False):
+        recon = get_reconciliation()
+        summary = recon.summary
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Выручка в БД", f"{summary['our_revenue_minor'] / 100:,.2f}")
+        col2.metric("Выручка после сверки", f"{summary['expected_revenue_minor'] / 100:,.2f}")
+        col3.metric("Влияние расхождений", f"{summary['revenue_impact_minor'] / 100:+,.2f}")
+        st.dataframe(recon.table(), use_container_width=True, hide_index=True)
+
 # ==========================================
 # UI: отчёт
 # ==========================================
 def report_result():
     st.subheader("🏆 Ваш отчёт по компетенциям")
-    
-    blocks = {
-        "soft_skills": {"name": "Soft Skills", "score": st.session_state.scores["soft_skills"], "max": 100},
-        "hard_skills": {"name": "Hard Skills", "score": st.session_state.scores["hard_skills"], "max": 100},
-        "data_integrity": {"name": "Data Integrity", "score": st.session_state.scores["data_integrity"], "max": 100},
-        "process_documentation": {"name": "Документация", "score": st.session_state.scores["process_documentation"], "max": 12}
-    }
-    
+
     weights = st.session_state.custom_weights or ROLE_WEIGHTS["role_weights"][st.session_state.reviewer_role]
-    
-    weighted_score = (
-        blocks["soft_skills"]["score"] * weights["soft_skills"] +
-        blocks["hard_skills"]["score"] * weights["hard_skills"] +
-        blocks["data_integrity"]["score"] * weights["data_integrity"] +
-        blocks["process_documentation"]["score"] * weights["process_documentation"]
-    ) / 100
+    # Кэш по (баллы, веса): повторный показ вкладки ничего не пересчитывает
+    summary = score_summary(st.session_state.scores, weights)
 
-    st.metric("Итоговый балл", f"{weighted_score:.1f} / 100")
+    st.metric("Итоговый балл", f"{summary.weighted:.1f} / 100")
     
-    for k, v in blocks.items():
+    for k, v in summary.blocks().items():
         st.markdown(f"### {v['name']}")
         st.progress(min(v["score"] / v["max"], 1.0))
         st.write(f"{v['score']} / {v['max']}")
         st.markdown("---")
     
     # Радар
-    fig = go.Figure(data=go.Scatterpolar(
-        r=[min(v["score"], v["max"]) for v in blocks.values()],
-        theta=[v["name"] for v in blocks.values()],
-        fill='toself'
-    ))
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(radar_figure(summary), use_container_width=True)
     
     # Рекомендации
-    recommendations = []
-    if blocks["soft_skills"]["score"] < 70:
-        recommendations.append("🔹 Практикуйте уточнение сроков и приоритетов перед началом задачи")
-    if blocks["data_integrity"]["score"] < 70:
-        recommendations.append("🔹 Обратите внимание на работу с метаданными (is_excluded, registry_statuses)")
-    if blocks["process_documentation"]["score"] < 10:
-        recommendations.append("🔹 Используйте шаблон оформления задачи из базы знаний")
-    
-    if recommendations:
+    if summary.recommendations:
         st.subheader("📈 Рекомендации")
-        for rec in recommendations:
+        for rec in summary.recommendations:
             st.info(rec)
 
 # ==========================================
@@ -720,54 +862,38 @@ def history_overview():
         st.info("История пуста. Запустите сценарий.")
         return
     
-    # === 1. Собираем данные ===
-    rows = []
-    for event in st.session_state.events:
-        profile = st.session_state.user_profiles[st.session_state.active_profile]
-        scenario = st.session_state.active_scenario or "—" 
-        ts = time.strftime("%H:%M:%S", time.localtime(event["timestamp"]))
-        hour = int(time.strftime("%H", time.localtime(event["timestamp"])))
-        
-        if event["type"] == "chat":
-            content = event["content"][:100] + ("..." if len(event["content"]) > 100 else "")
-            event_str = f"💬 {content}"
-            if "срок" in event["content"].lower() or "дедлайн" in event["content"].lower():
-                trigger, points = "clarify_deadline", 10
-            elif "спасибо" in event["content"].lower() or "пожалуйста" in event["content"].lower():
-                trigger, points = "polite_language", 1
-            else:
-                trigger, points = "—", 0
-            context = "—" 
-        elif event["type"] == "sql":
-            query = event["query"][:100] + ("..." if len(event["query"]) > 100 else "")
-            event_str = f"🔍 `{query}`"
-            if "registry_statuses" in event["query"] and "is_excluded" not in event["query"]:
-                trigger, points = "missing_is_excluded", -20
-            elif "CREATE TABLE" in event["query"] and "backup" in event["query"].lower():
-                trigger, points = "create_backup_table", 10
-            else:
-                trigger, points = "—", 0
-            context = "REG002" if "REG002" in event["query"] else "—"
-        elif event["type"] == "report":
-            event_str = "📝 Отчёт по задаче"
-            trigger, points = "task_report_filled", 12
-            context = "—"
-        else:
-            event_str, trigger, points, context = str(event), "—", 0, "—"
-        
-        rows.append({
-            "Кандидат": profile["name"],
-            "Сценарий": scenario,
-            "Событие": event_str,
-            "Время": ts,
-            "Час": hour,
-            "Триггер": trigger,
-            "Баллы": points,
-            "Контекст": context,
-            "Тип": "positive" if points > 0 else "negative" if points < 0 else "neutral"
-        })
-    
-    df = pd.DataFrame(rows)
+    # === 1. Собираем данные: колонки лога событий + начисления из журнала баллов ===
+    frame = st.session_state.events.to_frame().join(st.session_state.scorer.ledger.by_event(), on="seq")
+    kind, target = frame["type"], frame["target"].fillna("").astype(str)
+    text = frame["text"].fillna("").astype(str)
+    short = text.str.slice(0, 100) + np.where(text.str.len() > 100, "...", "")
+    count = frame["count"].astype("string").fillna("?")
+    local = frame["timestamp"].dt.tz_localize("UTC").dt.tz_convert(datetime.now().astimezone().tzinfo)
+    points = frame["points"].fillna(0).astype(int)
+
+    event_str = np.select(
+        [kind == "chat", kind == "sql", kind == "kb_search", kind == "dba", kind == "result_match", kind == "report"],
+        ["💬 " + short, "🔍 `" + short + "`", "📚 Поиск: «" + text.str.slice(0, 100) + "»", "🛠️ `" + short + "`",
+         "🎯 Верный ответ: " + target, "📝 Отчёт по задаче"],
+        default=kind,
+    )
+    context = np.select(
+        [(kind == "sql") & text.str.contains("REG002", regex=False), kind == "kb_search",
+         (kind == "dba") & (target == "backup"), kind == "dba"],
+        ["REG002", count + " статей", "бэкап", count + " строк"],
+        default="—",
+    )
+    df = pd.DataFrame({
+        "Кандидат": st.session_state.user_profiles[st.session_state.active_profile]["name"],
+        "Сценарий": st.session_state.active_scenario or "—",
+        "Событие": event_str,
+        "Время": local.dt.strftime("%H:%M:%S"),
+        "Час": local.dt.hour,
+        "Триггер": frame["trigger"].fillna("—"),
+        "Баллы": points,
+        "Контекст": context,
+        "Тип": np.select([points > 0, points < 0], ["positive", "negative"], default="neutral"),
+    })
     
     # === 2. Фильтры слева (в 2 колонки) ===
     col_filter, col_main = st.columns([1, 3])
@@ -854,15 +980,117 @@ def history_overview():
             fig.update_layout(barmode='stack', xaxis_title="Час", yaxis_title="Кол-во событий")
             st.plotly_chart(fig, use_container_width=True)
         
-        # === 6. Экспорт (внизу) ===
+        # === 6. Экспорт (внизу) — файлы собираются только при скачивании (exports.py) ===
+        st.markdown("#### 📥 Экспорт")
+        export_cols = st.columns(4)
         if not filtered_df.empty:
-            csv = filtered_df.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                "📥 Скачать CSV",
-                data=csv,
+            history_df = filtered_df.drop(columns=["Час", "Тип"])
+            export_cols[0].download_button(
+                "📥 История (CSV)",
+                data=deferred(lambda: to_csv(history_df)),
                 file_name="datawork_history.csv",
-                mime="text/csv"
+                mime="text/csv",
+                key="export_history_csv"
             )
+            if PARQUET_AVAILABLE:
+                export_cols[1].download_button(
+                    "📥 История (Parquet)",
+                    data=deferred(lambda: to_parquet(history_df)),
+                    file_name="datawork_history.parquet",
+                    mime="application/vnd.apache.parquet",
+                    key="export_history_parquet"
+                )
+        events = st.session_state.events
+        if PARQUET_AVAILABLE:
+            export_cols[2].download_button(
+                "📥 События (Parquet)",
+                data=deferred(lambda: to_parquet(events.to_frame())),
+                file_name=f"{st.session_state.candidate_id}_events.parquet",
+                mime="application/vnd.apache.parquet",
+                key="export_events_parquet"
+            )
+        # Лог сессии для повторного прогона на новой версии оценки (replay.py)
+        session_meta = {
+            "session_id": st.session_state.candidate_id,
+            "candidate": st.session_state.user_profiles[st.session_state.active_profile]["name"],
+            "scenario": st.session_state.active_scenario,
+            "role": st.session_state.reviewer_role,
+        }
+        scores = dict(st.session_state.scores)
+        export_cols[3].download_button(
+            "⬇️ Лог сессии (JSON)",
+            data=deferred(lambda: json.dumps(
+                {**session_meta, "events": events.to_dicts(), "scores": scores}, ensure_ascii=False, indent=2
+            ).encode("utf-8")),
+            file_name=f"{st.session_state.candidate_id}.json",
+            mime="application/json",
+            key="export_session_json"
+        )
+
+# ==========================================
+# UI: профилирование rerun'ов (только ревьюер)
+# ==========================================
+def profiling_panel():
+    st.subheader("⏱️ Профилирование")
+    tracer = st.session_state.tracer
+
+    st.session_state.profiling_enabled = st.toggle(
+        "cProfile для каждого rerun'а (замедляет приложение)",
+        value=st.session_state.get("profiling_enabled", False),
+        key="profiling_toggle"
+    )
+
+    # Текущий rerun ещё не завершён — в истории только предыдущие
+    traces = list(tracer.history)
+    if not traces:
+        st.info("Пока нет замеров. Переключитесь между вкладками и вернитесь сюда.")
+        return
+
+    st.markdown("#### 🕒 Последние rerun'ы")
+    st.dataframe(pd.DataFrame([
+        {
+            "Время": time.strftime("%H:%M:%S", time.localtime(t.started_at)),
+            "Вкладка": t.label,
+            "Всего, мс": round(t.total_ms, 1),
+            "Самые медленные этапы": ", ".join(f"{name} {duration:.1f}" for name, _, duration, _ in t.slowest()),
+        }
+        for t in reversed(traces)
+    ]), use_container_width=True)
+
+    st.markdown("#### 🐢 Этапы (по всей истории)")
+    stats = tracer.span_stats()
+    st.dataframe(pd.DataFrame([
+        {"Этап": name, "Вызовов": count, "Среднее, мс": round(avg, 2), "Макс, мс": round(worst, 2)}
+        for name, (count, avg, worst) in sorted(stats.items(), key=lambda kv: kv[1][2], reverse=True)
+    ]), use_container_width=True)
+
+    from sql_validator import get_sql_simulator
+    cache = get_sql_simulator().result_cache
+    if cache is not None:
+        st.markdown("#### 🗄️ Кэш результатов SQL (общий для всех сессий)")
+        cache_stats = cache.stats()
+        lookups = cache_stats["hits"] + cache_stats["misses"]
+        cols = st.columns(4)
+        cols[0].metric("Записей", cache_stats["entries"])
+        cols[1].metric("Объём, КБ", round(cache_stats["bytes"] / 1024, 1))
+        cols[2].metric("Hit rate", f"{cache_stats['hits'] / lookups:.0%}" if lookups else "—")
+        cols[3].metric("Вытеснено", cache_stats["evictions"])
+
+    from rate_limiter import get_rate_limiter
+    llm = get_rate_limiter().stats()
+    if llm["granted"] or llm["rejected"] or llm["timed_out"]:
+        st.markdown("#### 🚦 Очередь к LLM (общая для всех сессий)")
+        cols = st.columns(5)
+        cols[0].metric("В очереди", llm["queue_depth"], help=f"Максимум: {llm['max_depth']}")
+        cols[1].metric("Выполняется", llm["in_flight"])
+        cols[2].metric("Ожидание p50 / p95, с", f"{llm['wait_p50']:.1f} / {llm['wait_p95']:.1f}")
+        cols[3].metric("Отказов (fallback)", llm["rejected"] + llm["timed_out"])
+        cols[4].metric("429 от провайдера", llm["throttled"])
+
+    profiled = [t for t in traces if t.profile]
+    if profiled:
+        st.markdown("#### 🔬 cProfile последнего rerun'а")
+        st.code(profiled[-1].profile, language="text")
 
 # ==========================================
 # UI: stub-вкладки
@@ -873,16 +1101,80 @@ def scenario_manager():
 
 def reports_overview():
     st.subheader("📈 Отчёты по кандидатам")
-    st.info("Скоро: сравнение кандидатов, экспорт PDF")
+    store = get_report_store()
+    if not len(store):
+        st.info("Пока нет кандидатов.")
+        return
+
+    weights = st.session_state.custom_weights or ROLE_WEIGHTS["role_weights"][st.session_state.reviewer_role]
+    sort_options = {
+        "total": "Итоговый балл",
+        "soft_skills": "Soft Skills",
+        "hard_skills": "Hard Skills",
+        "data_integrity": "Data Integrity",
+        "process_documentation": "Документация",
+        "events": "Кол-во событий",
+        "last_event_at": "Последняя активность",
+    }
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        name_contains = st.text_input("Поиск по имени", key="ro_name")
+        scenario = st.selectbox("Сценарий", ["Все"] + store.scenarios(), key="ro_scenario")
+    with col2:
+        sort_by = st.selectbox("Сортировка", list(sort_options), format_func=sort_options.get, key="ro_sort")
+        descending = st.radio("Порядок", ["По убыванию", "По возрастанию"], horizontal=True, key="ro_order") == "По убыванию"
+    with col3:
+        min_total = st.slider("Мин. итоговый балл", 0, 100, 0, key="ro_min_total")
+        top_k = st.number_input("Top-K (0 — все)", min_value=0, max_value=10000, value=50, step=10, key="ro_top_k")
+
+    rows = store.query(
+        weights,
+        sort_by=sort_by,
+        descending=descending,
+        top_k=int(top_k) or None,
+        name_contains=name_contains,
+        scenario=None if scenario == "Все" else scenario,
+        min_total=min_total or None,
+    )
+
+    st.caption(f"Кандидатов: {len(store)} · показано: {len(rows)} · веса: {weights}")
+    if not rows:
+        st.info("Нет кандидатов под фильтры.")
+        return
+
+    df = pd.DataFrame(rows)
+    df["last_event_at"] = df["last_event_at"].map(
+        lambda ts: time.strftime("%d.%m %H:%M:%S", time.localtime(ts)) if ts else "—"
+    )
+    df = df.rename(columns={
+        "name": "Кандидат", "scenario": "Сценарий", "total": "Итог", "soft_skills": "Soft",
+        "hard_skills": "Hard", "data_integrity": "Integrity", "process_documentation": "Док.",
+        "events": "Событий", "top_trigger": "Топ-триггер", "last_event_at": "Активность",
+    })
+    st.dataframe(df.drop(columns=["candidate_id"]), use_container_width=True, height=500)
 
 # ==========================================
 # Main — ФИНАЛЬНАЯ ЛОГИКА
 # ==========================================
 def main():
     st.set_page_config(page_title="DataWork Lab", page_icon="🔍", layout="wide")
-    initialize_session()
-    render_sidebar()
-    scenario_engine()
+    # Трассировка rerun'а (панель ⏱️ Профилирование у ревьюера)
+    if "tracer" not in st.session_state:
+        st.session_state.tracer = Tracer()
+    with st.session_state.tracer.rerun(
+        label=st.session_state.get("active_tab", "—"),
+        profile=st.session_state.get("profiling_enabled", False)
+    ):
+        run_app()
+
+def run_app():
+    with trace_span("initialize_session"):
+        initialize_session()
+    with trace_span("render_sidebar"):
+        render_sidebar()
+    with trace_span("scenario_engine"):
+        scenario_engine()
     
     # ✅ ГАРАНТИРОВАННОЕ обновление — даже если вы в чате
     if st.session_state.pending_response_for:
@@ -896,11 +1188,28 @@ def main():
         # Если прошло 1.5 сек — генерируем ответ
         if elapsed >= 1.5:
             try:
-                from characters import get_ai_response_with_source
-                response, source = get_ai_response_with_source(
-                    st.session_state.pending_response_for,
-                    st.session_state.pending_user_input
-                )
+                response = None
+                if st.session_state.pending_response_for == "dba_team":
+                    # DBA реально выполняет запросы — на данных этой сессии, с журналом
+                    with trace_span("dba_execute"):
+                        response, applied = get_dba_engine().execute_request(st.session_state.pending_user_input)
+                    for entry in applied:
+                        record_event(DBAEvent(entry["statement"], entry["kind"], len(entry["images"]), entry["timestamp"]))
+                    source = "dba"
+                if response is None:
+                    from characters import get_ai_response_with_source
+                    from conversation_memory import history_before
+                    chat_id = st.session_state.pending_response_for
+                    history = history_before(st.session_state.chats[chat_id], st.session_state.pending_message_index)
+                    with trace_span(f"llm_call:{st.session_state.pending_response_for}"):
+                        response, source = get_ai_response_with_source(
+                            st.session_state.pending_response_for,
+                            st.session_state.pending_user_input,
+                            chat_history=st.session_state.conversation_memory.context(chat_id, history),
+                            session_id=st.session_state.candidate_id,
+                            priority=(st.session_state.active_tab == "chats"
+                                      and st.session_state.active_chat == st.session_state.pending_response_for)
+                        )
             except Exception as e:
                 response = f"❌ Ошибка: {str(e)}"
                 source = "fallback"
@@ -924,6 +1233,7 @@ def main():
             # Сбрасываем флаги
             st.session_state.pending_response_for = None
             st.session_state.pending_user_input = ""
+            st.session_state.pending_message_index = None
             
             # ✅ ГАРАНТИРОВАННЫЙ st.rerun() — даже если вы в чате
             st.rerun()
@@ -943,7 +1253,11 @@ def main():
     
     # ... остальной код ...
     current_role = st.session_state.user_profiles[st.session_state.active_profile]["role"]
-    
+
+    with trace_span(f"tab:{st.session_state.active_tab}"):
+        render_active_tab()
+
+def render_active_tab():
     if st.session_state.active_tab == "chats":
         display_chat(st.session_state.active_chat)
     elif st.session_state.active_tab == "sql":
@@ -969,6 +1283,9 @@ def main():
         reports_overview()
     elif st.session_state.active_tab == "history":
         history_overview()
+    elif st.session_state.active_tab == "profiling":
+        if st.session_state.user_profiles[st.session_state.active_profile]["role"] == "reviewer":
+            profiling_panel()
 
 if __name__ == "__main__":
     main()
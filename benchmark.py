@@ -0,0 +1,421 @@
+# benchmark.py — бенчмарки горячих путей DataWork Lab
+#
+#   python benchmark.py                    # прогон + сравнение с benchmark_baselines.json
+#   python benchmark.py --save-baseline    # сохранить текущие цифры как базовые
+#   python benchmark.py --sizes 1 10 --filter sql_ --threshold 1.5
+#
+# Код возврата 1, если хотя бы один бенчмарк медленнее базового больше чем в threshold раз
+# (для шумных бенчмарков — в TOLERANCES раз) и больше чем на NOISE_FLOOR. Подозрение на
+# регрессию перепроверяется повторным замером (медиана по CONFIRM_REPEAT повторам).
+import argparse
+import copy
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import warnings
+
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baselines.json")
+DEFAULT_SIZES = [1, 10, 50]
+DEFAULT_THRESHOLD = 1.25
+NOISE_FLOOR = 0.0005  # сек: разница меньше — шум таймера и планировщика, не регрессия
+CONFIRM_REPEAT = 15
+# Бенчмарк -> допуск вместо threshold: deepcopy/GC и чтение файлов заметно плавают между прогонами
+TOLERANCES = {
+    "calculate_commissions": 1.6,
+    "simulator_startup_rows": 1.5,
+    "simulator_startup_columnar": 1.6,
+    "reconcile": 1.5,
+}
+
+# ==========================================
+# Данные
+# ==========================================
+def _suffix(value, k):
+    return value if k == 0 else f"{value}_{k}"
+
+def build_scaled_data(scale):
+    """Демо-данные × scale: копии строк с уникальными ID, связи между таблицами сохраняются.
+    Комиссии не рассчитаны — это делает calculate_commissions."""
+    from database import _BASE_DATA
+    base = copy.deepcopy(_BASE_DATA)
+    data = {
+        "registry_statuses": base["registry_statuses"],
+        "commission_rates": base["commission_rates"],
+    }
+    id_fields = {
+        "processing_operations": ["processing_id"],
+        "operation_additional_data": ["processing_id", "additional_value"],
+        "partner_a_payments": ["partner_id", "processing_id"],
+        "partner_b_payments": ["partner_id"],
+    }
+    for table, fields in id_fields.items():
+        rows = []
+        for k in range(scale):
+            for row in base[table]:
+                row = dict(row)
+                for field in fields:
+                    row[field] = _suffix(row[field], k)
+                rows.append(row)
+        data[table] = rows
+    return data
+
+def build_scaled_database(scale):
+    from database import calculate_commissions
+    data = build_scaled_data(scale)
+    calculate_commissions(data)
+    return data
+
+def build_events(scale):
+    """Лог сессии: 100 × scale событий чата, SQL и отчётов"""
+    chat = [
+        ("alice", "Спасибо! Из-за чего расходится выручка по PA023? Какой срок?"),
+        ("partner_a", "Добрый день, у вас ошибка у вас в реестре, статус DECLINED"),
+        ("dba_team", "CREATE TABLE po_backup AS SELECT * FROM processing_operations WHERE processing_id = 'PA023'"),
+    ]
+    sql = [
+        "SELECT * FROM processing_operations WHERE status = 'success'",
+        "SELECT * FROM registry_statuses WHERE partner_contract_id = 'PARTNER_A'",
+        "SELECT p.processing_id FROM processing_operations p JOIN operation_additional_data o ON p.processing_id = o.processing_id WHERE o.additional_type = 'partner_operation_id'",
+    ]
+    report = {
+        "description": "Выручка за 15.01: 12 345.67 EUR vs 12 392.87 EUR — расхождение 47.20",
+        "action": "UPDATE processing_operations SET status='failed' WHERE processing_id='PA023', до этого CREATE TABLE po_backup",
+        "result": "Было 12 345.67, стало 12 392.87, проверил запросом",
+    }
+    from events import ChatEvent, EventLog, ReportEvent, SQLEvent
+    events = EventLog()
+    for i in range(100 * scale):
+        kind = i % 10
+        if kind < 5:
+            to, content = chat[i % len(chat)]
+            events.append(ChatEvent(content, to=to, timestamp=float(i)))
+        elif kind < 9:
+            events.append(SQLEvent(sql[i % len(sql)], timestamp=float(i)))
+        else:
+            events.append(ReportEvent(report, timestamp=float(i)))
+    return events
+
+# ==========================================
+# Бенчмарки: name -> setup(scale) -> callable
+# ==========================================
+SQL_QUERIES = {
+    "sql_single_table": "SELECT * FROM processing_operations",
+    "sql_where_eq": "SELECT * FROM processing_operations WHERE status = 'success'",
+    "sql_where_gt": "SELECT processing_id, amount FROM processing_operations WHERE amount > 250",
+    "sql_where_in": "SELECT * FROM processing_operations WHERE status IN ('failed', 'pending')",
+    "sql_where_and": "SELECT * FROM processing_operations p WHERE p.status = 'success' AND p.amount >= 100",
+    "sql_order_limit": "SELECT processing_id, amount FROM processing_operations ORDER BY amount DESC LIMIT 10",
+    "sql_join": "SELECT p.processing_id, p.amount, a.commission FROM processing_operations p "
+                "INNER JOIN partner_a_payments a ON p.processing_id = a.processing_id",
+    "sql_join_where": "SELECT p.processing_id, o.additional_value FROM processing_operations p "
+                      "INNER JOIN operation_additional_data o ON p.processing_id = o.processing_id "
+                      "WHERE o.additional_type = 'partner_operation_id'",
+    "sql_revenue_sum": "SELECT SUM(amount - commission_amount) AS revenue FROM processing_operations WHERE status = 'success'",
+    "sql_group_by": "SELECT partner_contract_id, status, COUNT(*) AS operations, SUM(amount) AS total "
+                    "FROM processing_operations GROUP BY partner_contract_id, status",
+}
+
+_simulators = {}
+
+def _simulator(scale):
+    if scale not in _simulators:
+        from sql_validator import SQLSimulator
+        _simulators[scale] = SQLSimulator(build_scaled_database(scale))
+    return _simulators[scale]
+
+def _sql_bench(query):
+    def setup(scale):
+        simulator = _simulator(scale)
+        def run():
+            result, feedback = simulator.execute_sql(query)
+            if result is None:
+                raise RuntimeError(feedback)
+        return run
+    return setup
+
+def _bench_commissions(scale):
+    data = build_scaled_data(scale)
+    from database import calculate_commissions
+    def run():
+        calculate_commissions(copy.deepcopy(data))
+    return run
+
+def _bench_simulator_from_rows(scale):
+    """Старый путь старта worker'а: DataFrame из списков словарей"""
+    data = build_scaled_database(scale)
+    from sql_validator import SQLSimulator
+    def run():
+        SQLSimulator(data)
+    return run
+
+def _bench_simulator_from_columnar(scale):
+    """Старт worker'а с колоночного кэша (mmap); файлы пишутся один раз в setup и удаляются после замера"""
+    import tempfile
+    import pandas as pd
+    from columnar_store import open_store
+    from sql_validator import SQLSimulator, categorical_columns, prepare_tables
+    categorical = categorical_columns()
+    cache_dir = tempfile.TemporaryDirectory(prefix="datawork_bench_", ignore_cleanup_errors=True)
+    data = prepare_tables({name: pd.DataFrame(rows) for name, rows in build_scaled_database(scale).items()})
+    open_store(lambda: data, f"bench_{scale}", cache_dir=cache_dir.name)
+    def run():
+        tables = open_store(None, f"bench_{scale}", categorical, cache_dir=cache_dir.name)
+        SQLSimulator(tables, data_version=f"bench_{scale}")
+    run.cleanup = cache_dir.cleanup
+    return run
+
+def _money_column(scale):
+    """100 000 × scale сумм с 2 знаками"""
+    import numpy as np
+    rng = np.random.default_rng(42)
+    return np.round(rng.uniform(50, 800, 100_000 * scale), 2)
+
+def _bench_money_sum(scale):
+    import money
+    minor = money.to_minor_array(_money_column(scale))
+    def run():
+        money.total(minor)
+    return run
+
+def _bench_float_sum(scale):
+    """Для сравнения с money_sum: та же сумма во float64 (с накоплением погрешности)"""
+    values = _money_column(scale)
+    def run():
+        round(float(values.sum()), 2)
+    return run
+
+def _bench_reconcile(scale):
+    simulator = _simulator(scale)
+    from reconciliation import reconcile
+    def run():
+        reconcile(simulator.tables)
+    return run
+
+def _bench_result_fingerprint(scale):
+    """Автопроверка результата SELECT * FROM processing_operations"""
+    result, _ = _simulator(scale).execute_sql(SQL_QUERIES["sql_single_table"])
+    from result_fingerprint import fingerprint
+    def run():
+        fingerprint(result)
+    return run
+
+def _bench_scenario_scheduler(scale):
+    """Час сессии (rerun раз в секунду) со сценарием из 200 × scale шагов по времени и по событиям"""
+    from events import SQLEvent
+    from scenario_scheduler import ScenarioScheduler
+    steps = []
+    for i in range(200 * scale):
+        step = {"id": f"s{i}", "chat": "alice", "message": "..."}
+        step.update({"at": i * 3600 / (100 * scale)} if i % 2 else {"on": "sql", "count": i % 20 + 1, "delay": 5})
+        steps.append(step)
+    scenario = {"steps": steps}
+    def run():
+        scheduler = ScenarioScheduler(scenario, 0.0)
+        for second in range(3600):
+            scheduler.due(float(second))
+            if second % 60 == 0:
+                scheduler.on_event(SQLEvent("SELECT 1", timestamp=float(second)))
+    return run
+
+def _bench_chat(scale):
+    from text_evaluator import TextEvaluator
+    evaluator = TextEvaluator()
+    events = build_events(scale)
+    messages = list(zip(events.texts("chat"), events.targets("chat")))
+    def run():
+        for content, to in messages:
+            evaluator.evaluate_chat_message(content, to=to)
+    return run
+
+def _bench_fallback_reply(scale):
+    """Ответы персонажей без LLM на все сообщения чата из лога"""
+    from intents import fallback_reply
+    events = build_events(scale)
+    messages = list(zip(events.texts("chat"), events.targets("chat")))
+    def run():
+        for content, to in messages:
+            fallback_reply(to or "alice", content)
+    return run
+
+def _bench_sanitize(scale):
+    """Проверка всех сообщений чата из лога перед отправкой в LLM"""
+    from sanitizer import violations
+    events = build_events(scale)
+    messages = list(zip(events.texts("chat"), events.targets("chat")))
+    def run():
+        for content, to in messages:
+            violations(content, to)
+    return run
+
+def _bench_sql_eval(scale):
+    from text_evaluator import TextEvaluator
+    evaluator = TextEvaluator()
+    queries = build_events(scale).texts("sql")
+    def run():
+        for query in queries:
+            evaluator.evaluate_sql_query(query)
+    return run
+
+def _bench_report_eval(scale):
+    from text_evaluator import TextEvaluator
+    evaluator = TextEvaluator()
+    reports = [e.data for e in build_events(scale).of_type("report")]
+    def run():
+        for r in reports:
+            evaluator.evaluate_task_report(r["description"], r["action"], r["result"])
+    return run
+
+def _bench_generate_report(scale):
+    from report_generator import generate_report
+    with open("triggers.json", "r", encoding="utf-8") as f:
+        triggers = json.load(f)
+    events = build_events(scale)
+    def run():
+        generate_report(events, triggers)
+    return run
+
+BENCHMARKS = {
+    **{name: _sql_bench(query) for name, query in SQL_QUERIES.items()},
+    "evaluate_chat_message": _bench_chat,
+    "evaluate_sql_query": _bench_sql_eval,
+    "fallback_reply": _bench_fallback_reply,
+    "sanitize": _bench_sanitize,
+    "evaluate_task_report": _bench_report_eval,
+    "generate_report": _bench_generate_report,
+    "calculate_commissions": _bench_commissions,
+    "money_sum": _bench_money_sum,
+    "float_sum": _bench_float_sum,
+    "simulator_startup_rows": _bench_simulator_from_rows,
+    "simulator_startup_columnar": _bench_simulator_from_columnar,
+    "reconcile": _bench_reconcile,
+    "result_fingerprint": _bench_result_fingerprint,
+    "scenario_scheduler": _bench_scenario_scheduler,
+}
+
+# ==========================================
+# Прогон
+# ==========================================
+def measure(run, repeat, min_time=0.2):
+    """Медиана и минимум времени одного вызова (сек). Вызовы группируются, пока группа не займёт ≥ min_time/repeat"""
+    run()  # прогрев
+    start = time.perf_counter()
+    run()
+    single = max(time.perf_counter() - start, 1e-7)
+    number = max(1, int(min_time / repeat / single))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        timings.append((time.perf_counter() - start) / number)
+    return statistics.median(timings), min(timings)
+
+def measure_benchmark(name, scale, repeat):
+    """Замер одного бенчмарка; run.cleanup (если есть) — удалить то, что setup создал на диске"""
+    run = BENCHMARKS[name](scale)
+    try:
+        return measure(run, repeat)
+    finally:
+        getattr(run, "cleanup", lambda: None)()
+
+def run_benchmarks(sizes, name_filter="", repeat=5):
+    results = {}
+    for name in BENCHMARKS:
+        if name_filter and name_filter not in name:
+            continue
+        for scale in sizes:
+            key = f"{name}[{scale}]"
+            median, best = measure_benchmark(name, scale, repeat)
+            results[key] = {"median": median, "min": best}
+            print(f"{key:<36} median {median * 1000:10.3f} ms   min {best * 1000:10.3f} ms", flush=True)
+    return results
+
+def load_baselines():
+    if not os.path.exists(BASELINES_FILE):
+        return {}
+    with open(BASELINES_FILE, "r", encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+def save_baselines(results):
+    payload = {
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {k: round(v["median"], 9) for k, v in sorted(results.items())},
+    }
+    with open(BASELINES_FILE, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+def _split_key(key):
+    name, scale = key[:-1].split("[")
+    return name, int(scale)
+
+def is_regression(key, base, current, threshold):
+    """Медленнее допуска бенчмарка и больше чем на NOISE_FLOOR (суб-миллисекундные — по абсолютной разнице)"""
+    tolerance = max(threshold, TOLERANCES.get(_split_key(key)[0], threshold))
+    return current > base * tolerance and current - base > NOISE_FLOOR
+
+def compare(results, baselines, threshold):
+    """Список регрессий: (key, base, current, ratio)"""
+    regressions = []
+    print(f"\n{'benchmark':<36} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+    for key, value in results.items():
+        base = baselines.get(key)
+        if base is None:
+            print(f"{key:<36} {'—':>12} {value['median'] * 1000:12.3f} {'new':>7}")
+            continue
+        ratio = value["median"] / base if base else float("inf")
+        regressed = is_regression(key, base, value["median"], threshold)
+        mark = "  ❌" if regressed else ""
+        print(f"{key:<36} {base * 1000:12.3f} {value['median'] * 1000:12.3f} {ratio:7.2f}{mark}")
+        if regressed:
+            regressions.append((key, base, value["median"], ratio))
+    return regressions
+
+def confirm(regressions, threshold, repeat=CONFIRM_REPEAT):
+    """Перезамер подозрительных бенчмарков: регрессия остаётся, только если повторяется"""
+    confirmed = []
+    if regressions:
+        print(f"\n🔁 Перепроверка ({repeat} повторов)")
+    for key, base, first, _ in regressions:
+        median, _ = measure_benchmark(*_split_key(key), repeat)
+        current = min(first, median)
+        verdict = "❌" if is_regression(key, base, current, threshold) else "шум"
+        print(f"{key:<36} {base * 1000:12.3f} {current * 1000:12.3f} {current / base:7.2f}  {verdict}")
+        if verdict == "❌":
+            confirmed.append((key, base, current, current / base))
+    return confirmed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки DataWork Lab")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="множители размера демо-данных")
+    parser.add_argument("--filter", default="", help="запускать только бенчмарки, содержащие подстроку")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="регрессия, если медиана > baseline × threshold (см. TOLERANCES, NOISE_FLOOR)")
+    parser.add_argument("--save-baseline", action="store_true", help="сохранить результаты в benchmark_baselines.json")
+    args = parser.parse_args(argv)
+
+    warnings.simplefilter("ignore")
+    os.chdir(os.path.dirname(BASELINES_FILE))
+    results = run_benchmarks(args.sizes, args.filter, args.repeat)
+
+    if args.save_baseline:
+        baselines = load_baselines()
+        save_baselines({**{k: {"median": v} for k, v in baselines.items()}, **results})
+        print(f"\n💾 Baseline сохранён: {BASELINES_FILE}")
+        return 0
+
+    regressions = confirm(compare(results, load_baselines(), args.threshold), args.threshold)
+    if regressions:
+        print(f"\n❌ Регрессии (> ×{args.threshold}): {len(regressions)}")
+        return 1
+    print("\n✅ Регрессий нет")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
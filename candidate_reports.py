@@ -0,0 +1,190 @@
+# candidate_reports.py — сводные отчёты по всем кандидатам
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+import streamlit as st
+
+BLOCKS = ["soft_skills", "hard_skills", "data_integrity", "process_documentation"]
+
+
+def _sort_key(agg, sort_by, weights):
+    """(есть значение, значение) — кандидаты без значения при сортировке по убыванию в конце.
+    None — сессия без событий: в сводку не попадает"""
+    if not agg["events"]:
+        return None
+    if sort_by == "total":
+        value = sum(agg["scores"][block] * w for block, w in zip(BLOCKS, weights)) / 100
+    elif sort_by in agg["scores"]:
+        value = agg["scores"][sort_by]
+    else:
+        value = agg[sort_by]
+    return (value is not None, value or 0)
+
+
+class _Ranking:
+    """Кандидаты, упорядоченные по одному ключу сортировки (и весам для total).
+    order — отсортированный список (ключ, candidate_id), поддерживается вставкой при каждом событии"""
+
+    __slots__ = ("sort_by", "weights", "keys", "order")
+
+    def __init__(self, sort_by, weights, candidates):
+        self.sort_by, self.weights = sort_by, weights
+        keys = ((cid, _sort_key(agg, sort_by, weights)) for cid, agg in candidates.items())
+        self.keys = {cid: key for cid, key in keys if key is not None}
+        self.order = sorted((key, cid) for cid, key in self.keys.items())
+
+    def update(self, cid, agg):
+        """agg=None — кандидат удалён"""
+        old = self.keys.pop(cid, None)
+        key = None if agg is None else _sort_key(agg, self.sort_by, self.weights)
+        if old == key:
+            if key is not None:
+                self.keys[cid] = key
+            return
+        if old is not None:
+            del self.order[bisect_left(self.order, (old, cid))]
+        if key is not None:
+            insort(self.order, (key, cid))
+            self.keys[cid] = key
+
+
+class CandidateReportStore:
+    """Материализованные агрегаты по кандидатам и блокам компетенций.
+
+    Обновляются инкрементально при каждом событии сессии (ingest), поэтому
+    сравнение всей когорты не требует пересчёта событий каждого кандидата.
+    Порядок для сводки (_Ranking по ключу сортировки и весам) тоже обновляется на событии —
+    top-k читается с начала упорядоченного списка. Сессии без событий в порядок не входят;
+    без активности дольше idle_ttl и сверх capacity (самые давние) вытесняются.
+    Один экземпляр на процесс, доступ из всех сессий — под блокировкой.
+    """
+
+    def __init__(self, capacity=10_000, idle_ttl=7 * 24 * 3600, max_rankings=8):
+        self._lock = threading.Lock()
+        self._candidates = OrderedDict()  # по последней активности: давние — в начале
+        self._rankings = OrderedDict()  # (sort_by, веса) -> _Ranking
+        self.capacity = capacity
+        self.idle_ttl = idle_ttl
+        self.max_rankings = max_rankings
+
+    def register(self, candidate_id, name, profile_id, scenario=None):
+        with self._lock:
+            if candidate_id not in self._candidates:
+                agg = self._candidates[candidate_id] = {
+                    "candidate_id": candidate_id,
+                    "name": name,
+                    "profile_id": profile_id,
+                    "scenario": scenario,
+                    "started_at": time.time(),
+                    "last_event_at": None,
+                    "events": 0,
+                    "scores": {block: 0 for block in BLOCKS},
+                    "positive": {block: 0 for block in BLOCKS},
+                    "negative": {block: 0 for block in BLOCKS},
+                    "event_counts": {},
+                    "trigger_counts": {},
+                }
+                self._changed(candidate_id, agg)
+                self._evict()
+
+    def _changed(self, candidate_id, agg):
+        self._candidates.move_to_end(candidate_id)
+        for ranking in self._rankings.values():
+            ranking.update(candidate_id, agg)
+
+    def _evict(self):
+        deadline = time.time() - self.idle_ttl
+        while self._candidates:
+            cid, agg = next(iter(self._candidates.items()))
+            if len(self._candidates) <= self.capacity and (agg["last_event_at"] or agg["started_at"]) >= deadline:
+                break
+            del self._candidates[cid]
+            for ranking in self._rankings.values():
+                ranking.update(cid, None)
+
+    def set_scenario(self, candidate_id, scenario):
+        with self._lock:
+            if candidate_id in self._candidates:
+                self._candidates[candidate_id]["scenario"] = scenario
+
+    def ingest_event(self, candidate_id, event_type, timestamp=None):
+        with self._lock:
+            agg = self._candidates.get(candidate_id)
+            if agg is None:
+                return
+            agg["last_event_at"] = timestamp or time.time()
+            agg["events"] += 1
+            agg["event_counts"][event_type] = agg["event_counts"].get(event_type, 0) + 1
+            self._changed(candidate_id, agg)
+
+    def ingest_score(self, candidate_id, block, points, score, trigger_id=None):
+        """score — итоговый балл блока после начисления (как в st.session_state.scores)"""
+        with self._lock:
+            agg = self._candidates.get(candidate_id)
+            if agg is None:
+                return
+            agg["scores"][block] = score
+            if points > 0:
+                agg["positive"][block] += points
+            elif points < 0:
+                agg["negative"][block] += points
+            if trigger_id:
+                agg["trigger_counts"][trigger_id] = agg["trigger_counts"].get(trigger_id, 0) + 1
+            self._changed(candidate_id, agg)
+
+    def __len__(self):
+        return len(self._candidates)
+
+    def _ranking(self, sort_by, weights):
+        key = (sort_by, weights if sort_by == "total" else None)
+        ranking = self._rankings.get(key)
+        if ranking is None:
+            ranking = self._rankings[key] = _Ranking(sort_by, weights, self._candidates)
+            if len(self._rankings) > self.max_rankings:
+                self._rankings.popitem(last=False)
+        self._rankings.move_to_end(key)
+        return ranking
+
+    def query(self, weights, sort_by="total", descending=True, top_k=None,
+              name_contains="", scenario=None, min_total=None):
+        """Строки сводки: обход готового порядка с фильтрами до top_k строк"""
+        weights = tuple(weights[block] for block in BLOCKS)
+        name_contains = name_contains.strip().lower()
+        rows = []
+        with self._lock:
+            self._evict()
+            order = self._ranking(sort_by, weights).order
+            for _, cid in (reversed(order) if descending else order):
+                agg = self._candidates[cid]
+                if name_contains and name_contains not in agg["name"].lower():
+                    continue
+                if scenario and agg["scenario"] != scenario:
+                    continue
+                scores = agg["scores"]
+                total = sum(scores[block] * w for block, w in zip(BLOCKS, weights)) / 100
+                if min_total is not None and total < min_total:
+                    continue
+                rows.append({
+                    "candidate_id": cid,
+                    "name": agg["name"],
+                    "scenario": agg["scenario"] or "—",
+                    "total": round(total, 1),
+                    **scores,
+                    "events": agg["events"],
+                    "top_trigger": max(agg["trigger_counts"], key=agg["trigger_counts"].get) if agg["trigger_counts"] else "—",
+                    "last_event_at": agg["last_event_at"],
+                })
+                if top_k and len(rows) >= top_k:
+                    break
+        return rows
+
+    def scenarios(self):
+        with self._lock:
+            return sorted({agg["scenario"] for agg in self._candidates.values() if agg["scenario"]})
+
+
+@st.cache_resource
+def get_report_store():
+    return CandidateReportStore()
@@ -1,5 +1,4 @@
 # characters.py — финальная версия, без сокращений
-import random
 
 CHARACTERS_PROFILES = {
     "alice": {
@@ -49,12 +48,14 @@ GROUP_CHATS = {
     }
 }
 
-def get_ai_response_with_source(character_key, user_message):
-    """Возвращает (response: str, source: str)"""
+def get_ai_response_with_source(character_key, user_message, chat_history=None, session_id=None, priority=False):
+    """Возвращает (response: str, source: str). chat_history — контекст чата для LLM,
+    session_id/priority — для общей очереди к LLM"""
     try:
         from ai_client import OpenAIClient
         client = OpenAIClient()
-        response = client.generate_response(character_key, user_message)
+        response = client.generate_response(character_key, user_message, chat_history,
+                                            session_id=session_id, priority=priority)
         if response:
             return response, "openai"
     except Exception:
@@ -65,78 +66,9 @@ def get_ai_response_with_source(character_key, user_message):
     return fallback_response, "fallback"
 
 def get_smart_fallback(character_key, user_message):
-    """Умные fallback ответы БЕЗ эмодзи + логирование"""
-    message_lower = user_message.lower()
-    
-    if character_key == "alice":
-        if any(word in message_lower for word in ["максим", "кирилл", "пришел", "задач"]):
-            questions = [
-                "Уточнял ли срочность задачи?",
-                "За какой период нужно посчитать?",
-                "В чем нужна помощь с выполнением?",
-                "Какие данные требуются для задачи?"
-            ]
-            return random.choice(questions)
-        
-        elif any(word in message_lower for word in ["выручк", "доход"]):
-            questions = [
-                "Есть сомнения как считать выручку? Какие есть версии расчета?",
-                "С чем нужна помощь в расчетах? Какие данные уже смотрел?",
-                "Как думаешь подойти к расчету? Нужен совет по структуре запроса?",
-                "Что именно вызывает сложности? Данные, логика или сроки?"
-            ]
-            return random.choice(questions)
-        
-        elif any(word in message_lower for word in ["статус", "расхожден"]):
-            return "При расхождениях статусов данные партнера всегда приоритетны. У нас success/failed, у PARTNER_A - COMPLETED/DECLINED, у PARTNER_B - SUCCESS/FAILED. Если статусы разные - нужно исправить наши данные через DBA."
-        
-        elif any(word in message_lower for word in ["sql", "запрос", "таблиц"]):
-            return "Лучше попробуй сам написать запрос, а я помогу его улучшить. Например, начни с SELECT * FROM processing_operations WHERE status='success'. Покажи что получилось."
-        
-        else:
-            return "Интересный вопрос! Давай разберемся подробнее. Что именно ты пытаешься сделать и что уже пробовал?"
-
-    elif character_key == "maxim":
-        if any(word in message_lower for word in ["операц", "успешн", "выручк", "доход"]):
-            return "Нужна общая выручка за вчера по успешным операциям. ASAP к 11:00 для встречи с инвесторами. За деталями по данным - к Алисе."
-        
-        elif any(word in message_lower for word in ["срок", "когда", "врем"]):
-            return "Нужно к 11:00 к встрече с инвесторами. ASAP! Если не успеваешь - скажи заранее."
-        
-        else:
-            return "Зайди к Алисе за техническими деталями. Мне нужны готовые цифры для отчетности."
-
-    elif character_key == "kirill":
-        if any(word in message_lower for word in ["статистик", "отчет", "юзер"]):
-            return "Нужна статистика по юзерам за последнюю неделю — сколько новых, сколько ушедших. Горит!"
-        elif any(word in message_lower for word in ["срочно", "горит", "критичн"]):
-            return "Критично для отчета продукту. Какие данные уже есть?"
-        else:
-            return "Горит! Нужны данные как можно скорее. Что именно интересует?"
-
-    elif character_key == "dba_team":
-        if any(word in message_lower for word in ["update", "insert", "delete"]):
-            if "where" in message_lower and any(word in message_lower for word in ["update", "insert"]):
-                return "Выполнено, проверяй"
-            else:
-                return "Не могу выполнить в таком виде. Формат: UPDATE|INSERT таблица УСЛОВИЯ. Уточни у Алисы."
-        else:
-            return "Мы выполняем запросы в формате: UPDATE|INSERT таблица УСЛОВИЯ. Для бизнес-логики обратись к Алисе."
-
-    elif character_key == "partner_a":
-        if any(word in message_lower for word in ["статус", "расхожден"]):
-            return "Добрый день! Наши статусы: COMPLETED=успех, DECLINED=отказ, IN_PROGRESS=в процессе. Проверим расхождения и вернемся с ответом."
-        else:
-            return "Добрый день! По вопросам реестров и статусов операций - обращайтесь. Чем можем помочь?"
-
-    elif character_key == "partner_b":
-        if any(word in message_lower for word in ["статус", "расхожден"]):
-            return "Добрый день! Наши статусы: SUCCESS=успех, FAILED=отказ. Проверим данные и предоставим актуальную информацию."
-        else:
-            return "Добрый день! Готовы помочь с вопросами по операциям и реестрам."
-
-    else:
-        return "Давай разберемся с этим вопросом. Расскажи подробнее что именно нужно сделать?"
+    """Умные fallback ответы БЕЗ эмодзи — по таблице интентов (intents.py)"""
+    from intents import fallback_reply
+    return fallback_reply(character_key, user_message)
 
 CHARACTERS_RESPONSES = {
     "alice": {
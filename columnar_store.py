@@ -0,0 +1,174 @@
+# columnar_store.py — колоночное хранение демо-БД на диске (.npy на колонку, загрузка через mmap)
+#
+# .data_cache/<версия>/
+#     manifest.json               — таблицы, порядок колонок, способ кодирования
+#     <table>.<column>.npy        — числа / коды словаря / datetime64[us] и Int64 как int64
+#     <table>.<column>.dict.json  — словарь строковой колонки
+#
+# Файлы генерируются один раз (атомарно: временная папка + rename) и открываются
+# через np.load(mmap_mode="r") — все worker'ы Streamlit разделяют страницы ОС.
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 2
+_INT_NA = np.iinfo(np.int64).min
+CACHE_DIR = os.environ.get(
+    "DATAWORK_DATA_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data_cache"),
+)
+
+
+def encode_column(values):
+    """(kind, array, dictionary): числа — float64/int64 (None → NaN), даты — datetime64[us],
+    Int64 — int64 с NA = INT64_MIN, остальное — коды словаря (None → -1)"""
+    series = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return "datetime", series.to_numpy(dtype="datetime64[us]").view(np.int64), None
+    if isinstance(series.dtype, pd.Int64Dtype):
+        return "nullable_int", series.to_numpy(dtype=np.int64, na_value=_INT_NA), None
+    non_null = series.dropna()
+    if series.dtype.kind in "iub":
+        return "numeric", series.to_numpy(np.int64), None
+    if series.dtype.kind == "f" or (
+        len(non_null) and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in non_null)
+    ):
+        return "numeric", pd.to_numeric(series).to_numpy(np.float64), None
+    codes, uniques = pd.factorize(series, sort=True, use_na_sentinel=True)
+    return "dictionary", codes.astype(np.int32 if len(uniques) > 32767 else np.int16), [str(u) for u in uniques]
+
+
+def encode_table(df):
+    """DataFrame → {column: (kind, array, dictionary)}"""
+    return {col: encode_column(df[col]) for col in df.columns}
+
+
+def decode_column(kind, array, dictionary, categorical=False):
+    if kind == "numeric":
+        return array
+    if kind == "datetime":
+        return array.view("datetime64[us]")
+    if kind == "nullable_int":
+        values = np.asarray(array)
+        return pd.arrays.IntegerArray(values, values == _INT_NA)
+    if categorical:
+        return pd.Categorical.from_codes(np.asarray(array), categories=pd.Index(dictionary))
+    # Код -1 (NULL) попадает на последний элемент — None
+    return np.array(dictionary + [None], dtype=object)[array]
+
+
+def decode_table(columns, categorical=()):
+    """{column: (kind, array, dictionary)} → DataFrame. Колонки из categorical остаются pd.Categorical"""
+    return pd.DataFrame({
+        col: decode_column(kind, array, dictionary, col in categorical)
+        for col, (kind, array, dictionary) in columns.items()
+    }, copy=False)
+
+
+def source_version(*paths):
+    """Версия по исходникам, из которых строятся данные: изменили database.py — файлы пересоздаются.
+    Считается по файлам, а не по самим данным, чтобы старт не зависел от размера БД"""
+    digest = hashlib.blake2b(str(FORMAT_VERSION).encode(), digest_size=8)
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def write_tables(tables, directory):
+    """tables — {name: DataFrame | list[dict]}. Пишет во временную папку и атомарно переименовывает"""
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".tmp_", dir=parent)
+    manifest = {"format": FORMAT_VERSION, "tables": {}}
+    try:
+        for name, rows in tables.items():
+            df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+            columns = {}
+            for col, (kind, array, dictionary) in encode_table(df).items():
+                np.save(os.path.join(tmp, f"{name}.{col}.npy"), array, allow_pickle=False)
+                if dictionary is not None:
+                    with open(os.path.join(tmp, f"{name}.{col}.dict.json"), "w", encoding="utf-8") as f:
+                        json.dump(dictionary, f, ensure_ascii=False)
+                columns[col] = kind
+            manifest["tables"][name] = {"rows": len(df), "columns": columns}
+        with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        try:
+            os.rename(tmp, directory)
+        except OSError:
+            # Другой процесс успел сгенерировать те же файлы — используем их
+            shutil.rmtree(tmp, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def read_columns(directory):
+    """{name: {column: (kind, array, dictionary)}} без декодирования; массивы — read-only mmap"""
+    with open(os.path.join(directory, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    tables = {}
+    for name, info in manifest["tables"].items():
+        columns = {}
+        for col, kind in info["columns"].items():
+            array = np.load(os.path.join(directory, f"{name}.{col}.npy"), mmap_mode="r", allow_pickle=False)
+            dictionary = None
+            if kind == "dictionary":
+                with open(os.path.join(directory, f"{name}.{col}.dict.json"), "r", encoding="utf-8") as f:
+                    dictionary = json.load(f)
+            columns[col] = (kind, array, dictionary)
+        tables[name] = columns
+    return tables
+
+
+def load_tables(directory, categorical=None):
+    """{name: DataFrame}; числовые колонки и коды — read-only mmap.
+    categorical — {table: [колонки]}, которые вернуть как pd.Categorical"""
+    categorical = categorical or {}
+    return {
+        name: decode_table(columns, categorical.get(name, ()))
+        for name, columns in read_columns(directory).items()
+    }
+
+
+def ensure_store(build, version, cache_dir=None):
+    """Папка с файлами версии; build() — {name: rows}, вызывается только если файлов ещё нет"""
+    directory = os.path.join(cache_dir or CACHE_DIR, version)
+    if not os.path.exists(os.path.join(directory, "manifest.json")):
+        write_tables(build(), directory)
+    return directory
+
+
+def open_store(build, version, categorical=None, cache_dir=None):
+    """Таблицы через колоночный кэш. build() — {name: rows}, вызывается только если файлов версии ещё нет"""
+    return load_tables(ensure_store(build, version, cache_dir), categorical)
+
+
+def demo_version():
+    # Типы колонок задаются схемой и sql_validator — они тоже часть версии
+    import database
+    import database_schema
+    import sql_validator
+    return source_version(database.__file__, database_schema.__file__, sql_validator.__file__)
+
+
+def load_demo_tables():
+    """Демо-БД с типами SQLSimulator (центы, даты, справочники) — при загрузке ничего не приводится.
+    DATAWORK_SHARED_TABLES=1 — таблицы публикуются в shared memory одна на все процессы (shared_tables)"""
+    import database
+    from sql_validator import categorical_columns, prepare_tables
+
+    def build():
+        return prepare_tables({name: pd.DataFrame(rows) for name, rows in database.get_demo_database().items()})
+
+    version = demo_version()
+    if os.environ.get("DATAWORK_SHARED_TABLES"):
+        from shared_tables import open_shared_tables
+        return open_shared_tables(lambda: read_columns(ensure_store(build, version)), version, categorical_columns())
+    return open_store(build, version, categorical_columns())
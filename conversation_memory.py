@@ -0,0 +1,81 @@
+# conversation_memory.py — история чата для LLM в пределах бюджета токенов
+#
+# В запрос уходят последние реплики чата, сколько влезает в budget токенов. Более ранние
+# сворачиваются в краткое содержание (первое предложение каждой реплики) — без отдельного
+# вызова LLM. Содержание накапливается по чату: каждая реплика сворачивается один раз,
+# граница «свёрнуто / целиком» только сдвигается вперёд. Старые строки содержания
+# вытесняются, когда оно больше summary_budget.
+import math
+import re
+
+MESSAGE_OVERHEAD = 4  # служебные токены роли и разметки на сообщение
+_SENTENCE = re.compile(r"^.+?(?:[.!?…](?=\s)|$)", re.S)
+
+
+def estimate_tokens(text):
+    """Оценка без токенизатора: ~3 символа на токен (кириллица и SQL вперемешку)"""
+    return math.ceil(len(text) / 3) + MESSAGE_OVERHEAD
+
+
+def _summary_line(message, line_chars):
+    who = "Сотрудник" if message["role"] == "user" else "Ты"
+    text = " ".join(message["content"].split())
+    sentence = _SENTENCE.match(text).group(0)
+    if len(sentence) > line_chars:
+        sentence = sentence[:line_chars - 1].rstrip() + "…"
+    return f"{who}: {sentence}"
+
+
+def history_before(messages, index):
+    """Реплики чата до вопроса с позицией index (pending_message_index), без «печатает…».
+    Сам вопрос уходит в запрос отдельно; сообщения, пришедшие после него, в историю не попадают"""
+    return [m for m in messages[:index] if not m.get("typing")]
+
+
+class ConversationMemory:
+    """Контекст чатов одной сессии. summaries: chat_id -> {"covered": свёрнуто реплик, "lines": [...]}"""
+
+    def __init__(self, budget=1200, summary_budget=300, line_chars=120):
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.line_chars = line_chars
+        self.summaries = {}
+
+    def context(self, chat_id, messages):
+        """[{"role": "system"|"user"|"assistant", "content"}] для LLM: содержание + последние реплики.
+        messages — сообщения чата (st.session_state.chats[chat_id]) без текущего вопроса"""
+        turns = [m for m in messages if m.get("content") and not m.get("typing")]
+        summary = self.summaries.setdefault(chat_id, {"covered": 0, "lines": []})
+        if summary["covered"] > len(turns):  # чат очищен
+            summary["covered"], summary["lines"] = 0, []
+
+        # Последние реплики — сколько влезает вместе с местом под содержание
+        window = self.budget - self.summary_budget
+        start, used = len(turns), 0
+        while start > summary["covered"]:
+            cost = estimate_tokens(turns[start - 1]["content"])
+            if used + cost > window and start < len(turns):
+                break
+            used += cost
+            start -= 1
+
+        # Свернуть вышедшие из окна реплики (только новые — прежние уже в содержании)
+        if start > summary["covered"]:
+            summary["lines"] += [_summary_line(m, self.line_chars) for m in turns[summary["covered"]:start]]
+            summary["covered"] = start
+            while summary["lines"] and sum(estimate_tokens(l) for l in summary["lines"]) > self.summary_budget:
+                summary["lines"].pop(0)
+
+        result = []
+        if summary["lines"]:
+            result.append({"role": "system", "content": "Ранее в переписке:\n" + "\n".join(summary["lines"])})
+        recent = turns[start:]
+        for i, m in enumerate(recent):
+            content = m["content"]
+            if i == 0 and estimate_tokens(content) > window:  # одна реплика больше окна — её конец
+                content = "…" + content[-(window - MESSAGE_OVERHEAD) * 3:]
+            result.append({"role": "user" if m["role"] == "user" else "assistant", "content": content})
+        return result
+
+    def tokens(self, context):
+        return sum(estimate_tokens(m["content"]) for m in context)
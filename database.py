@@ -1,6 +1,8 @@
 import copy
 import random
 
+import money
+
 _BASE_DATA = {
     "processing_operations": [
         # PARTNER_A операции (60)
@@ -74,25 +76,46 @@ _BASE_DATA = {
 }
 
 def calculate_commissions(data):
+    """Комиссии в целых центах (money), ставки — по партнёру. Поиск связей — через словари, O(n)"""
+    rates = {r["partner_contract_id"]: r for r in data["commission_rates"]}
+    # Дубли processing_id: как и раньше, берётся первая операция
+    ops_by_id = {}
+    for op in data["processing_operations"]:
+        ops_by_id.setdefault(op["processing_id"], op)
+
+    pending = {}
     for op in data["processing_operations"]:
         if op["status"] == "success" and op["commission_amount"] is None:
-            rate = next(r for r in data["commission_rates"] if r["partner_contract_id"] == op["partner_contract_id"])
-            op["commission_amount"] = round(op["amount"] * rate["commission_percent"] + rate["fixed_commission"], 2)
-    
+            pending.setdefault(op["partner_contract_id"], []).append(op)
+    for partner, ops in pending.items():
+        rate = rates[partner]
+        amounts = money.to_minor_array([op["amount"] for op in ops])
+        fees = money.commission(amounts, rate["commission_percent"], money.to_minor(rate["fixed_commission"]))
+        for op, fee in zip(ops, money.from_minor(fees).tolist()):
+            op["commission_amount"] = fee
+
     for payment in data["partner_a_payments"]:
         if payment["commission"] is None and payment["status"] == "COMPLETED":
-            op = next(op for op in data["processing_operations"] if op["processing_id"] == payment["processing_id"])
-            payment["commission"] = op["commission_amount"]
-            
+            payment["commission"] = ops_by_id[payment["processing_id"]]["commission_amount"]
+
+    rate_b = rates["PARTNER_B"]
+    op_by_partner_id = {}
+    for add in data["operation_additional_data"]:
+        if add["additional_type"] == "partner_operation_id":
+            op_by_partner_id.setdefault(add["additional_value"], add["processing_id"])
     for payment in data["partner_b_payments"]:
         if payment["commission"] is None and payment["status"] == "SUCCESS":
-            rate = next(r for r in data["commission_rates"] if r["partner_contract_id"] == "PARTNER_B")
-            add_data = next(add for add in data["operation_additional_data"] 
-                          if add["additional_value"] == payment["partner_id"] and add["additional_type"] == "partner_operation_id")
-            op = next(op for op in data["processing_operations"] if op["processing_id"] == add_data["processing_id"])
-            payment["commission"] = round(op["amount"] * rate["commission_percent"] + rate["fixed_commission"], 2)
+            op = ops_by_id[op_by_partner_id[payment["partner_id"]]]
+            fee = money.commission(money.to_minor(op["amount"]), rate_b["commission_percent"], money.to_minor(rate_b["fixed_commission"]))
+            payment["commission"] = money.from_minor(fee)
+
+_DEMO_DATABASE = None
 
 def get_demo_database():
-    data = copy.deepcopy(_BASE_DATA)
-    calculate_commissions(data)
-    return data
+    # Комиссии считаются один раз на процесс; вызывающий получает свою копию
+    global _DEMO_DATABASE
+    if _DEMO_DATABASE is None:
+        data = copy.deepcopy(_BASE_DATA)
+        calculate_commissions(data)
+        _DEMO_DATABASE = data
+    return copy.deepcopy(_DEMO_DATABASE)
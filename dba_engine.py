@@ -0,0 +1,177 @@
+# dba_engine.py — выполнение запросов #dba-team на данных сессии
+import re
+import time
+
+# Что DBA выполняет (см. "Форматы запросов к DBA" в базе знаний)
+_STATEMENT_START = re.compile(
+    r'\b(?:update\s+\w+\s+set|insert\s+into|create\s+table|delete\s+from|drop\s+table|truncate|alter\s+table)\b',
+    re.IGNORECASE
+)
+_FORBIDDEN = re.compile(r'^\s*(delete|drop|truncate|alter)\b', re.IGNORECASE)
+_CREATE_BACKUP = re.compile(r'^\s*create\s+table\s+(\w+)\s+as\s+(select\b.+)$', re.IGNORECASE | re.DOTALL)
+_TARGET_TABLE = re.compile(r'^\s*(?:update|insert\s+into)\s+(\w+)', re.IGNORECASE)
+_SOURCE_TABLE = re.compile(r'\bfrom\s+(\w+)', re.IGNORECASE)
+# Откат — только явной командой на всё сообщение: «rollback», «откати #3»; «не надо откатывать» — не команда
+_ROLLBACK = re.compile(r'^\s*(?:rollback|откат(?:и|ить)?)\s*#?(\d+)?\s*[.!]?\s*$', re.IGNORECASE)
+
+# Реестры партнёров правит только партнёр — через корректирующий реестр
+PARTNER_TABLES = {"partner_a_payments", "partner_b_payments"}
+
+
+def extract_statements(text):
+    """Выделяет SQL-операторы из сообщения в #dba-team (текст вокруг запросов игнорируется)"""
+    starts = [m.start() for m in _STATEMENT_START.finditer(text)]
+    statements = []
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(text)
+        statement = text[start:end].split(';')[0].strip()
+        if statement:
+            statements.append(statement)
+    return statements
+
+
+class TransactionLog:
+    """Журнал выполненных DBA операций сессии с образами строк до/после.
+
+    entry: {"id", "statement", "kind", "table", "images", "timestamp", "rolled_back"}
+    images — [(table, key, before, after, state)] из SQLSimulator.apply_dml
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def append(self, statement, kind, table, images):
+        entry = {
+            "id": len(self.entries) + 1,
+            "statement": statement,
+            "kind": kind,
+            "table": table,
+            "images": images,
+            "timestamp": time.time(),
+            "rolled_back": False,
+        }
+        self.entries.append(entry)
+        return entry
+
+    def active(self):
+        return [e for e in self.entries if not e["rolled_back"]]
+
+    def get(self, entry_id):
+        if 1 <= entry_id <= len(self.entries):
+            return self.entries[entry_id - 1]
+        return None
+
+    def has_backup_of(self, table_name):
+        return any(e["kind"] == "backup" and e["table"] == table_name for e in self.active())
+
+    def last_update(self):
+        for entry in reversed(self.entries):
+            if entry["kind"] == "update" and not entry["rolled_back"]:
+                return entry
+        return None
+
+    def changed_ids(self, entry, id_column="processing_id"):
+        """ID строк, изменённых операцией (по образу после изменения)"""
+        return {after.get(id_column) for _, _, _, after, _ in entry["images"] if after}
+
+
+class DBAEngine:
+    """Проверяет и по порядку применяет запросы к DBA. Состояние — overlay и журнал сессии."""
+
+    def __init__(self, simulator, overlay, log):
+        self.simulator = simulator
+        self.overlay = overlay
+        self.log = log
+
+    def validate(self, statement):
+        """Возвращает текст ошибки или None"""
+        if _FORBIDDEN.match(statement):
+            return "❌ DROP, DELETE, TRUNCATE и ALTER не выполняем."
+
+        backup = _CREATE_BACKUP.match(statement)
+        if backup:
+            name = backup.group(1).lower()
+            if "_backup" not in name:
+                return "❌ CREATE TABLE выполняем только для бэкапов: имя таблицы должно содержать _backup."
+            if self.simulator.has_table(name, self.overlay):
+                return f"❌ Таблица `{name}` уже существует."
+            return None
+        if re.match(r'^\s*create\b', statement, re.IGNORECASE):
+            return "❌ Формат бэкапа: CREATE TABLE имя_backup AS SELECT ..."
+
+        target = _TARGET_TABLE.match(statement)
+        if not target:
+            return "❌ Мы выполняем запросы в формате: UPDATE|INSERT таблица УСЛОВИЯ."
+        table_name = target.group(1).lower()
+        if table_name in PARTNER_TABLES:
+            return f"❌ `{table_name}` — данные партнёра, их не меняем. Запросите корректирующий реестр."
+        if re.match(r'^\s*update\b', statement, re.IGNORECASE):
+            if not re.search(r'\bwhere\b', statement, re.IGNORECASE):
+                return "❌ Запросы без WHERE не выполняем. Формат: UPDATE таблица SET поле=значение WHERE условие."
+            if not self.log.has_backup_of(table_name):
+                return f"❌ Без бэкапа `{table_name}` изменения не выполняем. Сначала: CREATE TABLE {table_name}_backup AS SELECT ..."
+        return None
+
+    def execute(self, statement):
+        """Выполняет один оператор. Возвращает (entry | None, сообщение)"""
+        error = self.validate(statement)
+        if error:
+            return None, error
+
+        backup = _CREATE_BACKUP.match(statement)
+        if backup:
+            name = backup.group(1).lower()
+            result, feedback = self.simulator.execute_sql(backup.group(2), self.overlay)
+            if result is None:
+                return None, feedback
+            source = _SOURCE_TABLE.search(backup.group(2))
+            self.overlay.create_table(name, result.copy())
+            entry = self.log.append(statement, "backup", source.group(1).lower() if source else name, [])
+            entry["created_table"] = name
+            return entry, f"✅ Backup `{name}` created: {len(result)} rows"
+
+        images, feedback = self.simulator.apply_dml(statement, self.overlay)
+        if images is None:
+            return None, feedback
+        kind = "update" if re.match(r'^\s*update\b', statement, re.IGNORECASE) else "insert"
+        entry = self.log.append(statement, kind, _TARGET_TABLE.match(statement).group(1).lower(), images)
+        return entry, feedback
+
+    def execute_request(self, message):
+        """Выполняет все операторы из сообщения по порядку, до первой ошибки.
+        Возвращает (ответ DBA | None, выполненные записи журнала)"""
+        statements = extract_statements(message)
+        if not statements:
+            rollback = _ROLLBACK.match(message)
+            if rollback and self.log.active():
+                entry_id = int(rollback.group(1)) if rollback.group(1) else self.log.active()[-1]["id"]
+                return self.rollback(entry_id), []
+            return None, []
+
+        applied, replies = [], []
+        for i, statement in enumerate(statements):
+            entry, feedback = self.execute(statement)
+            replies.append(feedback)
+            if entry is None:
+                skipped = len(statements) - i - 1
+                if skipped:
+                    replies.append(f"Остальные запросы ({skipped}) не выполнялись.")
+                break
+            applied.append(entry)
+
+        header = "Выполнено, проверяй" if len(applied) == len(statements) else "Не всё получилось выполнить:"
+        return header + "\n" + "\n".join(replies), applied
+
+    def rollback(self, entry_id):
+        """Откат операции и всех более поздних (LIFO) — O(изменённых строк). Возвращает сообщение"""
+        entry = self.log.get(entry_id)
+        if entry is None or entry["rolled_back"]:
+            return "❌ Нечего откатывать"
+        undone = [e for e in self.log.active() if e["id"] >= entry_id]
+        for e in reversed(undone):
+            if e["kind"] == "backup":
+                self.overlay.drop_table(e["created_table"])
+            else:
+                self.simulator.restore_images(e["images"], self.overlay)
+            e["rolled_back"] = True
+        return f"↩️ Откат выполнен: {len(undone)} операц. начиная с «{entry['statement'][:60]}»"
@@ -0,0 +1,289 @@
+# events.py — события сессии кандидата: типизированные записи и колоночный кольцевой буфер
+#
+# Записи (ChatEvent, SQLEvent, ...) — классы со __slots__, у каждого свои поля.
+# EventLog хранит их не объектами, а колонками:
+#   type      uint8   — код типа (EVENT_TYPES)
+#   timestamp float64
+#   target    int32   — код интернированной строки: адресат чата, шаг сценария, вид операции DBA (-1 — нет)
+#   count     int64   — найдено статей / затронуто строк (-1 — нет)
+#   text      list    — сообщение, SQL, поисковый запрос
+#   data      dict    — только у редких событий (отчёт по задаче), по индексу ячейки
+# Номер события за сессию (seq) — dropped + позиция в буфере.
+# Запись собирается из колонок при чтении; выборки по типу — чтение колонок по маске.
+import time
+
+import numpy as np
+
+
+class Event:
+    """Общее у всех событий — type и timestamp. columns: поле записи -> колонка EventLog"""
+
+    __slots__ = ("timestamp",)
+    type = None
+    columns = {}
+
+    def __init__(self, timestamp=None):
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def _column(self, column):
+        return next((getattr(self, name) for name, col in self.columns.items() if col == column), None)
+
+    @property
+    def target(self):
+        """Значение колонки target: адресат чата, вид операции DBA, шаг эталона"""
+        return self._column("target")
+
+    @property
+    def text(self):
+        return self._column("text")
+
+    def _fields(self):
+        return {name: getattr(self, name) for name in self.columns}
+
+    def to_dict(self):
+        """JSON-совместимый вид для лога сессии (см. event_from_dict)"""
+        return {"type": self.type, **self._fields(), "timestamp": self.timestamp}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.timestamp == other.timestamp and self._fields() == other._fields()
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={v!r}" for k, v in self._fields().items())
+        return f"{type(self).__name__}({fields}, timestamp={self.timestamp!r})"
+
+
+class ChatEvent(Event):
+    __slots__ = ("to", "content")
+    type = "chat"
+    columns = {"to": "target", "content": "text"}
+
+    def __init__(self, content, to=None, timestamp=None):
+        super().__init__(timestamp)
+        self.to = to
+        self.content = content
+
+
+class SQLEvent(Event):
+    __slots__ = ("query",)
+    type = "sql"
+    columns = {"query": "text"}
+
+    def __init__(self, query, timestamp=None):
+        super().__init__(timestamp)
+        self.query = query
+
+
+class KBSearchEvent(Event):
+    __slots__ = ("query", "results")
+    type = "kb_search"
+    columns = {"query": "text", "results": "count"}
+
+    def __init__(self, query, results, timestamp=None):
+        super().__init__(timestamp)
+        self.query = query
+        self.results = results
+
+
+class DBAEvent(Event):
+    __slots__ = ("statement", "kind", "rows")
+    type = "dba"
+    columns = {"statement": "text", "kind": "target", "rows": "count"}
+
+    def __init__(self, statement, kind, rows, timestamp=None):
+        super().__init__(timestamp)
+        self.statement = statement
+        self.kind = kind
+        self.rows = rows
+
+
+class ReportEvent(Event):
+    __slots__ = ("data",)
+    type = "report"
+    columns = {"data": "data"}
+
+    def __init__(self, data, timestamp=None):
+        super().__init__(timestamp)
+        self.data = data
+
+
+class ResultMatchEvent(Event):
+    __slots__ = ("step", "query")
+    type = "result_match"
+    columns = {"step": "target", "query": "text"}
+
+    def __init__(self, step, query, timestamp=None):
+        super().__init__(timestamp)
+        self.step = step
+        self.query = query
+
+
+EVENT_CLASSES = {cls.type: cls for cls in (ChatEvent, SQLEvent, KBSearchEvent, DBAEvent, ReportEvent, ResultMatchEvent)}
+EVENT_TYPES = tuple(EVENT_CLASSES)
+_TYPE_CODES = {t: i for i, t in enumerate(EVENT_TYPES)}
+
+
+def event_from_dict(record):
+    """{"type", ...поля, "timestamp"} → запись нужного класса"""
+    cls = EVENT_CLASSES[record["type"]]
+    event = object.__new__(cls)
+    event.timestamp = record["timestamp"]
+    for field in cls.columns:
+        setattr(event, field, record.get(field))
+    return event
+
+
+class EventLog:
+    """Кольцевой буфер событий сессии: хранит последние capacity событий (старые вытесняются).
+    Массивы растут удвоением до capacity, так что короткая сессия не держит весь буфер"""
+
+    def __init__(self, capacity=50_000, initial=256):
+        self.capacity = capacity
+        self.dropped = 0
+        self._start = 0
+        self._size = 0
+        self._targets = []
+        self._target_codes = {}
+        self._alloc(min(initial, capacity))
+
+    def _alloc(self, n):
+        order = self._order() if self._size else np.zeros(0, dtype=np.int64)
+        old = getattr(self, "_type", None)
+        type_, timestamp = np.zeros(n, np.uint8), np.zeros(n, np.float64)
+        target, count = np.full(n, -1, np.int32), np.full(n, -1, np.int64)
+        text, data = [None] * n, {}
+        if old is not None:
+            m = len(order)
+            type_[:m], timestamp[:m] = self._type[order], self._timestamp[order]
+            target[:m], count[:m] = self._target[order], self._count[order]
+            for j, i in enumerate(order.tolist()):
+                text[j] = self._text[i]
+                if i in self._data:
+                    data[j] = self._data[i]
+        self._type, self._timestamp, self._target, self._count, self._text, self._data = (
+            type_, timestamp, target, count, text, data
+        )
+        self._start = 0
+
+    def _order(self):
+        """Индексы ячеек от старого события к новому"""
+        return (np.arange(self._size) + self._start) % len(self._type)
+
+    def _intern(self, value):
+        if value is None:
+            return -1
+        code = self._target_codes.get(value)
+        if code is None:
+            code = self._target_codes[value] = len(self._targets)
+            self._targets.append(value)
+        return code
+
+    def append(self, event):
+        if self._size == len(self._type):
+            if len(self._type) < self.capacity:
+                self._alloc(min(len(self._type) * 2, self.capacity))
+            else:
+                self._data.pop(self._start, None)
+                self._start = (self._start + 1) % len(self._type)
+                self._size -= 1
+                self.dropped += 1
+        i = (self._start + self._size) % len(self._type)
+        self._type[i] = _TYPE_CODES[event.type]
+        self._timestamp[i] = event.timestamp
+        self._target[i], self._count[i], self._text[i] = -1, -1, None
+        self._data.pop(i, None)
+        for field, column in event.columns.items():
+            value = getattr(event, field)
+            if column == "target":
+                self._target[i] = self._intern(value)
+            elif column == "count":
+                self._count[i] = -1 if value is None else value
+            elif column == "text":
+                self._text[i] = value
+            elif value is not None:
+                self._data[i] = value
+        self._size += 1
+        return event
+
+    def _record(self, i):
+        cls = EVENT_CLASSES[EVENT_TYPES[self._type[i]]]
+        event = object.__new__(cls)
+        event.timestamp = float(self._timestamp[i])
+        for field, column in cls.columns.items():
+            if column == "target":
+                code = self._target[i]
+                value = self._targets[code] if code >= 0 else None
+            elif column == "count":
+                value = int(self._count[i]) if self._count[i] >= 0 else None
+            elif column == "text":
+                value = self._text[i]
+            else:
+                value = self._data.get(i)
+            setattr(event, field, value)
+        return event
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def appended(self):
+        """Сколько событий записано за сессию (с вытесненными); номер события — appended - 1 после append"""
+        return self.dropped + self._size
+
+    def __iter__(self):
+        for i in self._order().tolist():
+            yield self._record(i)
+
+    def _selected(self, types):
+        order = self._order()
+        if not types:
+            return order
+        codes = [_TYPE_CODES[t] for t in types]
+        return order[np.isin(self._type[order], codes)]
+
+    def of_type(self, *types):
+        """Записи указанных типов по порядку"""
+        return [self._record(i) for i in self._selected(types).tolist()]
+
+    def has(self, event_type):
+        return bool(np.any(self._type[self._order()] == _TYPE_CODES[event_type]))
+
+    def texts(self, *types):
+        """Колонка text (сообщения, SQL, запросы) событий указанных типов"""
+        return [self._text[i] for i in self._selected(types).tolist()]
+
+    def targets(self, *types):
+        """Колонка target (адресат, шаг, вид операции) событий указанных типов"""
+        return [self._targets[c] if c >= 0 else None for c in self._target[self._selected(types)].tolist()]
+
+    def timestamps(self, *types):
+        return self._timestamp[self._selected(types)]
+
+    def to_dicts(self):
+        return [event.to_dict() for event in self]
+
+    def to_frame(self):
+        """Колонки буфера как DataFrame (seq, type, timestamp, target, count, text) — без сборки записей.
+        seq — номер события за сессию (как у начислений session_scoring.ScoreLedger)"""
+        import pandas as pd
+        order = self._order()
+        codes, counts = self._target[order], self._count[order]
+        targets = np.array(self._targets + [None], dtype=object)
+        return pd.DataFrame({
+            "seq": np.arange(self.dropped, self.appended),
+            "type": np.array(EVENT_TYPES, dtype=object)[self._type[order]],
+            "timestamp": pd.to_datetime(self._timestamp[order], unit="s"),
+            "target": targets[np.where(codes >= 0, codes, len(self._targets))],
+            "count": pd.arrays.IntegerArray(counts, counts < 0),
+            "text": [self._text[i] for i in order.tolist()],
+        })
+
+    @classmethod
+    def from_dicts(cls, records, capacity=50_000):
+        log = cls(capacity=capacity)
+        for record in records:
+            log.append(event_from_dict(record))
+        return log
+
+    def counts_by_type(self):
+        counts = np.bincount(self._type[self._order()], minlength=len(EVENT_TYPES))
+        return {t: int(n) for t, n in zip(EVENT_TYPES, counts) if n}
@@ -0,0 +1,60 @@
+# exports.py — выгрузки истории, лога событий и результатов SQL (CSV / Parquet)
+#
+# Выгрузки отложенные, не потоковые: st.download_button получает функцию (deferred), Streamlit
+# вызывает её только при скачивании — rerun страницы ничего не сериализует. Файл при этом
+# целиком собирается в памяти (io.BytesIO), как и раньше, пиковая память та же.
+# CSV пишется блоками по CHUNK_ROWS строк (без строки со всей таблицей), Parquet — по row group на блок.
+# Parquet — только с pyarrow (requirements.txt); без него кнопки Parquet не показываются (PARQUET_AVAILABLE).
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # без pyarrow — только CSV
+    pa = pq = None
+
+try:
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    DEFERRED_DOWNLOADS = hasattr(MediaFileManager, "add_deferred")
+except ImportError:
+    DEFERRED_DOWNLOADS = False
+
+CHUNK_ROWS = 50_000
+PARQUET_AVAILABLE = pq is not None
+
+
+def _chunks(df, chunk_rows):
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield start, df.iloc[start:start + chunk_rows]
+
+
+def to_csv(df, chunk_rows=CHUNK_ROWS):
+    """CSV (UTF-8) в io.BytesIO"""
+    out = io.BytesIO()
+    for start, chunk in _chunks(df, chunk_rows):
+        out.write(chunk.to_csv(index=False, header=start == 0).encode("utf-8"))
+    out.seek(0)
+    return out
+
+
+def to_parquet(df, chunk_rows=CHUNK_ROWS):
+    """Parquet (zstd) в io.BytesIO; row group на каждый блок строк"""
+    if pq is None:
+        raise RuntimeError("Для Parquet нужен pyarrow: pip install pyarrow")
+    out = io.BytesIO()
+    # Схема по первому блоку: у пустого среза object-колонки получили бы тип null
+    schema = pa.Schema.from_pandas(df.iloc[:chunk_rows], preserve_index=False)
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for _, chunk in _chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    out.seek(0)
+    return out
+
+
+def deferred(build):
+    """data для st.download_button: build() вызывается при скачивании.
+    Streamlit без отложенных загрузок получает готовые данные (как раньше)"""
+    if DEFERRED_DOWNLOADS:
+        return build
+    data = build()
+    return data.read() if hasattr(data, "read") else data
@@ -0,0 +1,162 @@
+# intents.py — интенты сообщений кандидата и fallback-ответы персонажей (когда LLM недоступна)
+#
+# INTENTS: персонаж -> интенты по приоритету. Интент — {"id", "keywords", "responses"}:
+#   keywords — группы основ слов: интент подходит, если в сообщении есть слово
+#   с основой из КАЖДОЙ группы (в группе — любая). Последний интент без keywords — ответ по умолчанию.
+# Таблица компилируется в индекс «основа -> (интент, группа)»: сообщение разбивается на слова
+# один раз, каждое слово проверяется по длинам основ персонажа — без перебора всех ключевых слов.
+import random
+import re
+
+DEFAULT_REPLY = "Давай разберемся с этим вопросом. Расскажи подробнее что именно нужно сделать?"
+
+INTENTS = {
+    "alice": [
+        {"id": "new_task", "keywords": [["максим", "кирилл", "пришел", "задач"]], "responses": [
+            "Уточнял ли срочность задачи?",
+            "За какой период нужно посчитать?",
+            "В чем нужна помощь с выполнением?",
+            "Какие данные требуются для задачи?",
+        ]},
+        {"id": "revenue", "keywords": [["выручк", "доход"]], "responses": [
+            "Есть сомнения как считать выручку? Какие есть версии расчета?",
+            "С чем нужна помощь в расчетах? Какие данные уже смотрел?",
+            "Как думаешь подойти к расчету? Нужен совет по структуре запроса?",
+            "Что именно вызывает сложности? Данные, логика или сроки?",
+        ]},
+        {"id": "status_mismatch", "keywords": [["статус", "расхожден"]], "responses": [
+            "При расхождениях статусов данные партнера всегда приоритетны. У нас success/failed, у PARTNER_A - COMPLETED/DECLINED, у PARTNER_B - SUCCESS/FAILED. Если статусы разные - нужно исправить наши данные через DBA.",
+        ]},
+        {"id": "sql_help", "keywords": [["sql", "запрос", "таблиц"]], "responses": [
+            "Лучше попробуй сам написать запрос, а я помогу его улучшить. Например, начни с SELECT * FROM processing_operations WHERE status='success'. Покажи что получилось.",
+        ]},
+        {"id": "default", "responses": [
+            "Интересный вопрос! Давай разберемся подробнее. Что именно ты пытаешься сделать и что уже пробовал?",
+            "Давай разберемся с задачей. Что именно нужно сделать?",
+            "Помогу разобраться. С чем возникли сложности?",
+            "Расскажи подробнее о задаче - вместе найдем решение.",
+            "Что уже пробовал сделать? С чего хочешь начать?",
+        ]},
+    ],
+    "maxim": [
+        {"id": "revenue", "keywords": [["операц", "успешн", "выручк", "доход"]], "responses": [
+            "Нужна общая выручка за вчера по успешным операциям. ASAP к 11:00 для встречи с инвесторами. За деталями по данным - к Алисе.",
+        ]},
+        {"id": "deadline", "keywords": [["срок", "когда", "врем"]], "responses": [
+            "Нужно к 11:00 к встрече с инвесторами. ASAP! Если не успеваешь - скажи заранее.",
+        ]},
+        {"id": "default", "responses": [
+            "Зайди к Алисе за техническими деталями. Мне нужны готовые цифры для отчетности.",
+            "Нужны цифры для отчетности. За деталями по данным - к Алисе.",
+            "ASAP к 11:00 для встречи с инвесторами.",
+        ]},
+    ],
+    "kirill": [
+        {"id": "user_stats", "keywords": [["статистик", "отчет", "юзер"]], "responses": [
+            "Нужна статистика по юзерам за последнюю неделю — сколько новых, сколько ушедших. Горит!",
+        ]},
+        {"id": "urgency", "keywords": [["срочно", "горит", "критичн"]], "responses": [
+            "Критично для отчета продукту. Какие данные уже есть?",
+        ]},
+        {"id": "default", "responses": [
+            "Горит! Нужны данные как можно скорее. Что именно интересует?",
+            "Нужна статистика для отчета. Что именно интересует?",
+            "Помоги с отчетом - какие данные нужны?",
+        ]},
+    ],
+    "dba_team": [
+        {"id": "execute", "keywords": [["update", "insert"], ["where"]], "responses": [
+            "Выполнено, проверяй",
+        ]},
+        {"id": "bad_format", "keywords": [["update", "insert", "delete"]], "responses": [
+            "Не могу выполнить в таком виде. Формат: UPDATE|INSERT таблица УСЛОВИЯ. Уточни у Алисы.",
+        ]},
+        {"id": "default", "responses": [
+            "Мы выполняем запросы в формате: UPDATE|INSERT таблица УСЛОВИЯ. Для бизнес-логики обратись к Алисе.",
+            "Формат запросов: UPDATE|INSERT таблица УСЛОВИЯ.",
+        ]},
+    ],
+    "partner_a": [
+        {"id": "status_mismatch", "keywords": [["статус", "расхожден"]], "responses": [
+            "Добрый день! Наши статусы: COMPLETED=успех, DECLINED=отказ, IN_PROGRESS=в процессе. Проверим расхождения и вернемся с ответом.",
+        ]},
+        {"id": "default", "responses": [
+            "Добрый день! По вопросам реестров и статусов операций - обращайтесь. Чем можем помочь?",
+            "Проверим данные и вернемся с ответом.",
+        ]},
+    ],
+    "partner_b": [
+        {"id": "status_mismatch", "keywords": [["статус", "расхожден"]], "responses": [
+            "Добрый день! Наши статусы: SUCCESS=успех, FAILED=отказ. Проверим данные и предоставим актуальную информацию.",
+        ]},
+        {"id": "default", "responses": [
+            "Добрый день! Готовы помочь с вопросами по операциям и реестрам.",
+            "Проверим информацию и ответим.",
+        ]},
+    ],
+}
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(message):
+    """Слова сообщения в нижнем регистре (ё -> е), без повторов"""
+    return set(_WORD.findall(message.lower().replace("ё", "е")))
+
+
+class IntentIndex:
+    """Скомпилированная таблица интентов: у каждого персонажа — {основа: [(№ интента, № группы)]}"""
+
+    def __init__(self, intents):
+        self.intents = intents
+        self._stems = {}
+        self._lengths = {}
+        for character, table in intents.items():
+            stems = self._stems[character] = {}
+            for i, intent in enumerate(table):
+                for g, group in enumerate(intent.get("keywords", ())):
+                    for stem in group:
+                        stems.setdefault(stem, []).append((i, g))
+            self._lengths[character] = sorted({len(stem) for stem in stems})
+
+    def resolve(self, character, message=None, tokens=None):
+        """Интент персонажа для сообщения (None — персонажа нет в таблице).
+        tokens — уже разобранное сообщение (tokenize), чтобы не разбирать его повторно"""
+        table = self.intents.get(character)
+        if table is None:
+            return None
+        if tokens is None:
+            tokens = tokenize(message)
+        stems, lengths = self._stems[character], self._lengths[character]
+        hits = {}
+        for token in tokens:
+            for n in lengths:
+                if n > len(token):
+                    break
+                for i, g in stems.get(token[:n], ()):
+                    hits.setdefault(i, set()).add(g)
+        for i, intent in enumerate(table):
+            if len(hits.get(i, ())) == len(intent.get("keywords", ())):
+                return intent
+        return None
+
+    def reply(self, character, message):
+        intent = self.resolve(character, message)
+        if intent is None:
+            return DEFAULT_REPLY
+        return random.choice(intent["responses"])
+
+
+_index = None
+
+
+def get_intent_index():
+    global _index
+    if _index is None:
+        _index = IntentIndex(INTENTS)
+    return _index
+
+
+def fallback_reply(character, message):
+    """Ответ персонажа без LLM — общий для characters.py и ai_client.py"""
+    return get_intent_index().reply(character, message)
@@ -0,0 +1,139 @@
+# kb_search.py — полнотекстовый поиск по базе знаний
+import bisect
+import heapq
+import math
+import re
+
+import streamlit as st
+
+_TOKEN = re.compile(r"[a-zа-я0-9_]+")
+_CYRILLIC = re.compile(r"[а-я]")
+
+# Окончания для облегчённого стемминга русского (по мотивам Snowball), длинные — первыми
+_RU_ENDINGS = sorted([
+    "иями", "ями", "ами", "иях", "ях", "ах", "ией", "ием", "ем", "ом", "ов", "ев", "ей", "ой", "ий", "ый",
+    "ая", "яя", "ое", "ее", "ие", "ые", "ую", "юю", "ого", "его", "ому", "ему", "ыми", "ими", "их", "ых",
+    "ться", "тся", "ешь", "ете", "ишь", "ите", "ить", "ать", "ять", "еть", "уть", "ть", "ет", "ит", "ут", "ют",
+    "ат", "ят", "ал", "ял", "ил", "ыл", "ла", "ли", "ло", "ние", "ния", "нии", "нию", "нием", "ость", "ости",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+], key=len, reverse=True)
+_MIN_STEM = 3
+
+TITLE_WEIGHT = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def normalize(text):
+    return text.lower().replace("ё", "е")
+
+
+def stem(token):
+    """Облегчённый стемминг: русские слова — без окончания, остальное (SQL, ID) — как есть"""
+    if not _CYRILLIC.search(token):
+        return token
+    for ending in _RU_ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= _MIN_STEM:
+            return token[:-len(ending)]
+    return token
+
+
+def tokenize(text):
+    """[(stem, start, end)] — позиции в исходном тексте нужны для сниппетов"""
+    return [(stem(m.group(0)), m.start(), m.end()) for m in _TOKEN.finditer(normalize(text))]
+
+
+class KBIndex:
+    """Инвертированный индекс по заголовкам и тексту статей, ранжирование BM25.
+
+    postings: term -> {doc_key: вклад терма в BM25} — веса считаются при построении
+    (частота в заголовке × TITLE_WEIGHT), запрос — только сложение готовых весов.
+    Последнее слово запроса дополняется по префиксу
+    через бинарный поиск по отсортированному словарю (поиск «по мере ввода»).
+    """
+
+    def __init__(self, knowledge_base):
+        self.articles = knowledge_base
+        self.postings = {}
+        self.doc_len = {}
+        self.positions = {}  # doc_key -> {term: [start, ...]} в content
+        for key, article in knowledge_base.items():
+            length = 0
+            for term, _, _ in tokenize(article["title"]):
+                self._add(term, key, TITLE_WEIGHT)
+                length += TITLE_WEIGHT
+            doc_positions = {}
+            for term, start, _ in tokenize(article["content"]):
+                self._add(term, key, 1)
+                doc_positions.setdefault(term, []).append(start)
+                length += 1
+            self.doc_len[key] = length
+            self.positions[key] = doc_positions
+        self.avg_len = sum(self.doc_len.values()) / max(1, len(self.doc_len))
+        self.terms = sorted(self.postings)
+        n_docs = len(self.doc_len)
+        for term, docs in self.postings.items():
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for key, tf in docs.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[key] / self.avg_len)
+                docs[key] = idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+    def _add(self, term, key, weight):
+        docs = self.postings.setdefault(term, {})
+        docs[key] = docs.get(key, 0) + weight
+
+    def _expand_prefix(self, prefix, limit=20):
+        i = bisect.bisect_left(self.terms, prefix)
+        found = []
+        while i < len(self.terms) and self.terms[i].startswith(prefix) and len(found) < limit:
+            found.append(self.terms[i])
+            i += 1
+        return found
+
+    def search(self, query, limit=5):
+        """[{"key", "title", "score", "snippet"}] по убыванию релевантности"""
+        tokens = [m.group(0) for m in _TOKEN.finditer(normalize(query))]
+        if not tokens:
+            return []
+        terms = [stem(t) for t in tokens]
+        # Последнее слово может быть недописано — добавляем термы с таким префиксом
+        query_terms = set(terms[:-1]) | {terms[-1]}
+        if len(tokens[-1]) >= 2:
+            query_terms.update(self._expand_prefix(tokens[-1]))
+
+        scores = {}
+        matched = {}
+        for term in query_terms:
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            for key, weight in docs.items():
+                scores[key] = scores.get(key, 0.0) + weight
+                matched.setdefault(key, []).append(term)
+
+        ranked = heapq.nlargest(limit, scores.items(), key=lambda kv: kv[1])
+        return [
+            {
+                "key": key,
+                "title": self.articles[key]["title"],
+                "score": round(score, 3),
+                "snippet": self.snippet(key, matched[key]),
+            }
+            for key, score in ranked
+        ]
+
+    def snippet(self, key, terms, width=90):
+        content = self.articles[key]["content"]
+        starts = [p for term in terms for p in self.positions[key].get(term, [])[:1]]
+        if not starts:
+            return " ".join(content.split())[:width * 2]
+        center = min(starts)
+        begin, end = max(0, center - width), min(len(content), center + width)
+        text = " ".join(content[begin:end].split())
+        return ("…" if begin else "") + text + ("…" if end < len(content) else "")
+
+
+@st.cache_resource
+def get_kb_index():
+    from knowledge_base import KNOWLEDGE_BASE
+    return KBIndex(KNOWLEDGE_BASE)
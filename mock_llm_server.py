@@ -0,0 +1,246 @@
+# mock_llm_server.py — локальная замена OpenAI chat-completions для нагрузочных тестов без расхода квоты
+#
+#   python mock_llm_server.py --port 8765 --latency lognormal:0.8,0.5 --error-rate 0.02 --rate-limit-rate 0.05
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 streamlit run app.py
+#   python mock_llm_server.py --load 200 --concurrency 20 --sessions 10   # сервер + нагрузка через OpenAIClient
+#
+# POST /v1/chat/completions — ответ персонажа (intents.py, персонаж угадывается по system prompt);
+#   "stream": true — SSE-чанки chat.completion.chunk и data: [DONE].
+# Задержка — из распределения --latency:
+#   fixed:S | uniform:A,B | lognormal:MEDIAN,SIGMA | exp:MEAN   (секунды)
+# --error-rate — доля ответов 500, --rate-limit-rate — доля 429 с Retry-After.
+# GET /v1/models — список моделей, GET /stats — счётчики сервера.
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from intents import fallback_reply
+
+# Первая строка system prompt (ai_client._get_detailed_prompt) -> персонаж
+_NAMES = {
+    "Алиса": "alice", "Максим": "maxim", "Кирилл": "kirill",
+    "Михаил": "dba_team", "Партнера А": "partner_a", "Партнера Б": "partner_b",
+}
+
+
+def parse_latency(spec):
+    """'lognormal:0.8,0.5' → функция rng -> секунды"""
+    kind, _, args = spec.partition(":")
+    params = [float(x) for x in args.split(",")] if args else []
+    if kind == "fixed":
+        return lambda rng: params[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(np.log(params[0]), params[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1 / params[0])
+    raise ValueError(f"Неизвестное распределение задержки: {spec}")
+
+
+def _character(messages):
+    system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+    first_line = system.strip().split("\n", 1)[0]
+    return next((key for name, key in _NAMES.items() if name in first_line), "alice")
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency="fixed:0", error_rate=0.0, rate_limit_rate=0.0,
+                 chunk_delay=0.02, seed=None):
+        super().__init__(address, _Handler)
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.chunk_delay = chunk_delay
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "streams": 0,
+                         "in_flight": 0, "max_in_flight": 0}
+
+    def count(self, **deltas):
+        with self.lock:
+            for key, delta in deltas.items():
+                self.counters[key] += delta
+            self.counters["max_in_flight"] = max(self.counters["max_in_flight"], self.counters["in_flight"])
+
+    def draw(self):
+        """(задержка, исход) для очередного запроса: исход — "ok" | "error" | "rate_limited" """
+        with self.lock:
+            delay = max(self.latency(self.rng), 0.0)
+            roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            return delay, "rate_limited"
+        if roll < self.rate_limit_rate + self.error_rate:
+            return delay, "error"
+        return delay, "ok"
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/v1/models", "/models"):
+            self._json(200, {"object": "list", "data": [{"id": "gpt-3.5-turbo", "object": "model", "owned_by": "mock"}]})
+        elif self.path.rstrip("/") == "/stats":
+            with self.server.lock:
+                self._json(200, dict(self.server.counters))
+        else:
+            self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server = self.server
+        server.count(requests=1, in_flight=1)
+        try:
+            delay, outcome = server.draw()
+            time.sleep(delay)
+            if outcome == "rate_limited":
+                server.count(rate_limited=1)
+                self._json(429, {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_error"}},
+                           {"Retry-After": "1"})
+                return
+            if outcome == "error":
+                server.count(errors=1)
+                self._json(500, {"error": {"message": "Internal error (mock)", "type": "server_error"}})
+                return
+
+            messages = request.get("messages", [])
+            user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+            reply = fallback_reply(_character(messages), user)
+            completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+            model = request.get("model", "gpt-3.5-turbo")
+            if request.get("stream"):
+                server.count(streams=1)
+                self._stream(completion_id, model, reply)
+            else:
+                prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+                self._json(200, {
+                    "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(reply) // 4,
+                              "total_tokens": prompt_tokens + len(reply) // 4},
+                })
+            server.count(ok=1)
+        finally:
+            server.count(in_flight=-1)
+
+    def _stream(self, completion_id, model, reply):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta, finish=None):
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        chunk({"role": "assistant", "content": ""})
+        for i, word in enumerate(reply.split(" ")):
+            time.sleep(self.server.chunk_delay)
+            chunk({"content": word if i == 0 else " " + word})
+        chunk({}, "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start_server(port=0, **options):
+    """Сервер в фоновом потоке (port=0 — свободный порт). Остановка: server.shutdown()"""
+    server = MockLLMServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def load_test(base_url, requests, concurrency, sessions):
+    """requests ответов через OpenAIClient (очередь rate_limiter, fallback) в concurrency потоков"""
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+    os.environ["OPENAI_BASE_URL"] = base_url
+    from ai_client import OpenAIClient
+    from rate_limiter import get_rate_limiter
+
+    client = OpenAIClient()
+    characters = list(_NAMES.values())
+
+    def one(i):
+        started = time.perf_counter()
+        reply = client._try_openai(characters[i % len(characters)], "Когда нужна выручка за 15.01?", [],
+                                   session_id=f"load_{i % sessions}", priority=i % 4 == 0)
+        return time.perf_counter() - started, reply is not None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies = np.array([r[0] for r in results])
+    answered = sum(r[1] for r in results)
+    print(f"⏱️ {requests} запросов за {elapsed:.1f} с · {requests / elapsed:.1f} запр/с · "
+          f"от LLM {answered}, fallback {requests - answered}")
+    print(f"   Задержка: p50 {np.percentile(latencies, 50):.2f} с · p95 {np.percentile(latencies, 95):.2f} с · "
+          f"max {latencies.max():.2f} с")
+    print(f"   Очередь: {get_rate_limiter().stats()}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальный OpenAI-совместимый сервер для нагрузочных тестов")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="lognormal:0.8,0.5", help="fixed:S | uniform:A,B | lognormal:M,SIGMA | exp:MEAN")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="пауза между SSE-чанками, с")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--load", type=int, default=0, help="прогнать N запросов через OpenAIClient и выйти")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--sessions", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    options = dict(latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                   chunk_delay=args.chunk_delay, seed=args.seed)
+    if args.load:
+        server = start_server(0, **options)
+        load_test(server.base_url, args.load, args.concurrency, args.sessions)
+        print(f"   Сервер: {server.counters}")
+        server.shutdown()
+        return
+    server = MockLLMServer(("127.0.0.1", args.port), **options)
+    print(f"🧪 Mock LLM: {server.base_url} (OPENAI_BASE_URL)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# money.py — денежные значения в целых минорных единицах (центах)
+#
+# Суммы хранятся как int64 центов: сложение/вычитание/SUM точны и так же быстры, как float64.
+# Умножение на ставку — целочисленное деление с округлением half-up (от нуля), как в учёте.
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+MINOR = 100          # центов в единице валюты
+RATE_SCALE = 10_000  # commission_percent — DECIMAL(5,4), т.е. единицы 0.0001
+
+
+def to_minor(value):
+    """245.505 → 24551 (half-up). Для отдельных значений"""
+    return int((Decimal(str(value)) * MINOR).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_minor_array(values):
+    """Вектор денежных значений с ≤ 2 знаками → int64 центов.
+    Такие float отличаются от целого числа центов на ~1e-12, поэтому np.round точен"""
+    return np.round(np.asarray(values, dtype=np.float64) * MINOR).astype(np.int64)
+
+
+def from_minor(minor):
+    """Центы → значение в единицах валюты (скаляр или массив)"""
+    if isinstance(minor, (int, np.integer)):
+        return int(minor) / MINOR
+    return np.asarray(minor, dtype=np.float64) / MINOR
+
+
+def div_half_up(numerator, denominator):
+    """Целочисленное деление с округлением half-up (от нуля); скаляры и массивы int64"""
+    if isinstance(numerator, (int, np.integer)):
+        q, r = divmod(abs(int(numerator)), denominator)
+        q += 2 * r >= denominator
+        return q if numerator >= 0 else -q
+    numerator = np.asarray(numerator, dtype=np.int64)
+    q, r = np.divmod(np.abs(numerator), denominator)
+    q += 2 * r >= denominator
+    return np.where(numerator < 0, -q, q)
+
+
+def scaled(factor):
+    """Точная дробь для десятичного множителя: 0.015 → (15, 1000)"""
+    d = Decimal(str(factor)).normalize()
+    exponent = -d.as_tuple().exponent
+    if exponent <= 0:
+        return int(d), 1
+    scale = 10 ** exponent
+    return int(d * scale), scale
+
+
+def multiply(minor, factor):
+    """Центы × десятичный множитель с округлением half-up до цента"""
+    numerator, scale = scaled(factor)
+    if scale == 1:
+        return minor * numerator
+    return div_half_up(minor * numerator, scale)
+
+
+def rate_units(percent):
+    """Ставка 0.015 → 150 единиц RATE_SCALE"""
+    return int((Decimal(str(percent)) * RATE_SCALE).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def commission(amount_minor, percent, fixed_minor):
+    """amount × percent + fixed в центах: скаляр или вектор операций"""
+    return div_half_up(amount_minor * rate_units(percent), RATE_SCALE) + fixed_minor
+
+
+def total(minor):
+    """Точная сумма вектора центов (int64 не теряет копейки, в отличие от float64)"""
+    return int(np.asarray(minor, dtype=np.int64).sum())
@@ -0,0 +1,183 @@
+# rate_limiter.py — общий для всех сессий процесса лимит на запросы к LLM
+#
+# Каждая сессия Streamlit вызывает LLM из своего потока. Перед вызовом запрос встаёт в очередь:
+#   • token bucket — не больше rate запросов/с (пачка до burst);
+#   • не больше max_in_flight запросов одновременно;
+#   • очередь честная: у каждой сессии своя FIFO, сессии обслуживаются по кругу,
+#     запросы из открытого сейчас чата (priority) — раньше фоновых;
+#   • очередь ограничена (max_queue), ожидание — max_wait секунд: дальше кандидат получает
+#     fallback-ответ сразу, а не ждёт 429 и таймаут провайдера.
+# Настройки — переменные окружения DATAWORK_LLM_RPS, _BURST, _MAX_IN_FLIGHT, _MAX_QUEUE, _MAX_WAIT.
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+import streamlit as st
+
+
+class RateLimited(Exception):
+    """Запрос не дождался очереди (reason: "queue_full" | "timeout")"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        # Во время паузы после 429 токены не копятся — иначе сразу после неё уйдёт пачка burst
+        elapsed = now - max(self.updated, self.paused_until)
+        if elapsed > 0:
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated = max(self.updated, now)
+
+    def wait_time(self, now):
+        """Сколько ждать до следующего токена (0 — токен есть)"""
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, now, seconds):
+        """Провайдер ответил 429: не выдавать токены seconds секунд"""
+        self.tokens = 0.0
+        self.updated = now
+        self.paused_until = max(self.paused_until, now + seconds)
+
+
+class _Ticket:
+    __slots__ = ("session", "priority", "enqueued")
+
+    def __init__(self, session, priority, enqueued):
+        self.session = session
+        self.priority = priority
+        self.enqueued = enqueued
+
+
+class LLMRateLimiter:
+    """Очередь запросов к LLM: слот выдаёт acquire()/slot(), освобождает release()"""
+
+    def __init__(self, rate=3.0, burst=5, max_in_flight=4, max_queue=100, max_wait=8.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        # Класс приоритета -> {сессия: FIFO билетов}; порядок ключей dict — круг обслуживания сессий
+        self._queues = ({}, {})
+        self._depth = 0
+        self.max_depth = 0
+        self.granted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.throttled = 0
+        self._waits = deque(maxlen=1000)
+
+    def _head(self):
+        for queues in self._queues:
+            for tickets in queues.values():
+                return tickets[0]
+        return None
+
+    def _remove(self, ticket):
+        queues = self._queues[0 if ticket.priority else 1]
+        tickets = queues[ticket.session]
+        tickets.remove(ticket)
+        # Сессия уходит в конец круга (или из него, если билетов больше нет)
+        del queues[ticket.session]
+        if tickets:
+            queues[ticket.session] = tickets
+        self._depth -= 1
+
+    def acquire(self, session, priority=False):
+        """Ждёт своей очереди. RateLimited — очередь полна или ожидание дольше max_wait"""
+        with self._cond:
+            now = time.monotonic()
+            if self._depth >= self.max_queue:
+                self.rejected += 1
+                raise RateLimited("queue_full")
+            ticket = _Ticket(session, priority, now)
+            self._queues[0 if priority else 1].setdefault(session, deque()).append(ticket)
+            self._depth += 1
+            self.max_depth = max(self.max_depth, self._depth)
+            deadline = now + self.max_wait
+            while True:
+                now = time.monotonic()
+                wait = None
+                if self._head() is ticket and self.in_flight < self.max_in_flight:
+                    wait = self.bucket.wait_time(now)
+                    if wait == 0:
+                        break
+                if now >= deadline:
+                    self._remove(ticket)
+                    self.timed_out += 1
+                    self._cond.notify_all()
+                    raise RateLimited("timeout")
+                self._cond.wait(min(deadline - now, wait) if wait else deadline - now)
+            self._remove(ticket)
+            self.bucket.take(now)
+            self.in_flight += 1
+            self.granted += 1
+            self._waits.append(now - ticket.enqueued)
+            self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, session, priority=False):
+        self.acquire(session, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def throttle(self, seconds=2.0):
+        """Провайдер вернул 429 — притормозить всех"""
+        with self._cond:
+            self.throttled += 1
+            self.bucket.pause(time.monotonic(), seconds)
+
+    def stats(self):
+        with self._cond:
+            waits = np.array(self._waits) if self._waits else np.zeros(1)
+            return {
+                "queue_depth": self._depth,
+                "max_depth": self.max_depth,
+                "in_flight": self.in_flight,
+                "granted": self.granted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "throttled": self.throttled,
+                "wait_p50": float(np.percentile(waits, 50)),
+                "wait_p95": float(np.percentile(waits, 95)),
+            }
+
+
+@st.cache_resource
+def get_rate_limiter():
+    env = os.environ.get
+    return LLMRateLimiter(
+        rate=float(env("DATAWORK_LLM_RPS", 3)),
+        burst=int(env("DATAWORK_LLM_BURST", 5)),
+        max_in_flight=int(env("DATAWORK_LLM_MAX_IN_FLIGHT", 4)),
+        max_queue=int(env("DATAWORK_LLM_MAX_QUEUE", 100)),
+        max_wait=float(env("DATAWORK_LLM_MAX_WAIT", 8)),
+    )
@@ -0,0 +1,256 @@
+# reconciliation.py — эталонная сверка наших операций с реестрами партнёров
+#
+# Всё считается целыми колонками: статусы — через словари, связи — hash join (pd.merge),
+# деньги — int64 центов (money). Результат — таблица расхождений с влиянием на выручку
+# и итоговая «правильная» выручка; это эталон для автопроверки ответов кандидата.
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import money
+from sql_validator import is_cents, prepare_tables, to_output
+
+# Статусы партнёра → наши. Данные партнёра — источник истины (см. базу знаний)
+PARTNERS = {
+    "PARTNER_A": {
+        "table": "partner_a_payments",
+        "statuses": {"COMPLETED": "success", "DECLINED": "failed", "IN_PROGRESS": "pending"},
+        "via_additional_data": False,
+    },
+    "PARTNER_B": {
+        "table": "partner_b_payments",
+        "statuses": {"SUCCESS": "success", "FAILED": "failed"},
+        "via_additional_data": True,
+    },
+}
+
+# Виды расхождений (в порядке вывода)
+KINDS = {
+    "duplicate_ours": "Дубль операции в нашей БД",
+    "status_mismatch": "Статус не совпадает с партнёром",
+    "commission_mismatch": "Комиссия не совпадает с расчётной",
+    "duplicate_registry": "Операция в нескольких реестрах партнёра",
+    "duplicate_partner_row": "Дубль строки в реестре партнёра",
+    "missing_in_partner": "Нет в реестре партнёра",
+    "missing_in_ours": "Нет в нашей БД",
+}
+
+COLUMNS = [
+    "kind", "processing_id", "partner_contract_id", "partner_id", "registry_id",
+    "our_status", "partner_status", "amount", "our_commission", "partner_commission",
+    "expected_commission", "revenue_impact",
+]
+
+
+def _cents(series):
+    """Денежная колонка → (int64-массив центов, маска NULL) независимо от представления"""
+    if is_cents(series.dtype):
+        return series.to_numpy(dtype=np.int64, na_value=0), series.isna().to_numpy()
+    values = pd.to_numeric(series).astype("float64")
+    return money.to_minor_array(values.fillna(0)), values.isna().to_numpy()
+
+
+def _money(values, mask=None):
+    values = np.asarray(values, dtype=np.int64)
+    return pd.arrays.IntegerArray(values, np.zeros(len(values), dtype=bool) if mask is None else np.asarray(mask))
+
+
+def _text(series):
+    return series.astype(object).where(series.notna(), None)
+
+
+class Reconciliation:
+    """discrepancies — расхождения (деньги — Int64 центов), summary — итоги в центах"""
+
+    def __init__(self, discrepancies, summary):
+        self.discrepancies = discrepancies
+        self.summary = summary
+
+    def table(self):
+        """Таблица для показа: центы → деньги, вид расхождения — по-русски"""
+        df = to_output(self.discrepancies)
+        return df.assign(kind=df["kind"].map(KINDS))
+
+    def discrepancy_ids(self, kinds=None):
+        """processing_id с расхождениями (по умолчанию — требующие исправления наших данных)"""
+        kinds = kinds or ("status_mismatch", "duplicate_ours")
+        rows = self.discrepancies[self.discrepancies["kind"].isin(kinds)]
+        return sorted(set(rows["processing_id"].dropna()))
+
+
+def reconcile(tables):
+    """tables — {name: DataFrame} как в SQLSimulator (или списки строк — тогда типы приводятся здесь)"""
+    tables = prepare_tables({
+        name: df.copy(deep=False) if isinstance(df, pd.DataFrame) else pd.DataFrame(df) for name, df in tables.items()
+    })
+    ops_all = tables["processing_operations"]
+    amount_all, _ = _cents(ops_all["amount"])
+    commission_all, commission_na = _cents(ops_all["commission_amount"])
+    success_all = (_text(ops_all["status"]) == "success").to_numpy()
+    our_revenue = int(((amount_all - np.where(commission_na, 0, commission_all)) * success_all).sum())
+
+    rates = tables["commission_rates"].drop_duplicates("partner_contract_id", keep="last").set_index("partner_contract_id")
+    rate_units = {p: money.rate_units(r) for p, r in rates["commission_percent"].items()}
+    fixed_units = dict(zip(rates.index, _cents(rates["fixed_commission"])[0]))
+
+    frames = []
+
+    # 1. Дубли у нас: оставляем последнюю запись (она исправленная), остальные — расхождение
+    dropped = ops_all.duplicated("processing_id", keep="last").to_numpy()
+    if dropped.any():
+        revenue = np.where(success_all & dropped, amount_all - np.where(commission_na, 0, commission_all), 0)
+        dup = ops_all[dropped]
+        frames.append(pd.DataFrame({
+            "kind": "duplicate_ours",
+            "processing_id": _text(dup["processing_id"]).to_numpy(),
+            "partner_contract_id": _text(dup["partner_contract_id"]).to_numpy(),
+            "our_status": _text(dup["status"]).to_numpy(),
+            "amount": _money(amount_all[dropped]),
+            "our_commission": _money(commission_all[dropped], commission_na[dropped]),
+            "revenue_impact": _money(-revenue[dropped]),
+        }))
+
+    ops = ops_all[~dropped].reset_index(drop=True)
+    amount, _ = _cents(ops["amount"])
+    our_commission, our_commission_na = _cents(ops["commission_amount"])
+    partner_of_op = _text(ops["partner_contract_id"])
+    units = partner_of_op.map(rate_units).fillna(0).to_numpy(dtype=np.int64)
+    fixed = partner_of_op.map(fixed_units).fillna(0).to_numpy(dtype=np.int64)
+    expected_commission = money.div_half_up(amount * units, money.RATE_SCALE) + fixed
+    ours = pd.DataFrame({
+        "processing_id": _text(ops["processing_id"]).to_numpy(),
+        "partner_contract_id": partner_of_op.to_numpy(),
+        "our_status": _text(ops["status"]).to_numpy(),
+        "_amount": amount,
+        "_our_commission": our_commission,
+        "_our_commission_na": our_commission_na,
+        "_expected_commission": expected_commission,
+    })
+
+    excluded = set(_text(tables["registry_statuses"].loc[tables["registry_statuses"]["is_excluded"] == 1, "registry_id"]))
+    additional = tables["operation_additional_data"]
+    links = additional.loc[_text(additional["additional_type"]) == "partner_operation_id", ["additional_value", "processing_id"]]
+    links = pd.DataFrame({
+        "partner_id": _text(links["additional_value"]).to_numpy(),
+        "processing_id": _text(links["processing_id"]).to_numpy(),
+    }).drop_duplicates("partner_id", keep="first")
+
+    final_status = ours["our_status"].copy()
+    for partner, config in PARTNERS.items():
+        payments = tables[config["table"]]
+        payments = payments[~_text(payments["registry_id"]).isin(excluded).to_numpy()]
+        commission, commission_missing = _cents(payments["commission"])
+        pay = pd.DataFrame({
+            "partner_id": _text(payments["partner_id"]).to_numpy(),
+            "registry_id": _text(payments["registry_id"]).to_numpy(),
+            "partner_status": _text(payments["status"]).map(config["statuses"]).to_numpy(),
+            "_partner_commission": commission,
+            "_partner_commission_na": commission_missing,
+        })
+        if config["via_additional_data"]:
+            pay = pay.merge(links, on="partner_id", how="left")
+        else:
+            pay["processing_id"] = _text(payments["processing_id"]).to_numpy()
+
+        # 2. Дубли у партнёра: в нескольких реестрах — оставляем первый реестр, внутри реестра — последнюю строку
+        registries = pay.groupby("partner_id", sort=False)["registry_id"].transform("nunique").to_numpy()
+        in_registry_dup = pay.duplicated(["partner_id", "registry_id"], keep="last").to_numpy()
+        multi = pay[(registries > 1)].drop_duplicates(["partner_id", "registry_id"], keep="last")
+        multi = multi[multi.duplicated("partner_id", keep="first").to_numpy()]
+        for kind, rows in (("duplicate_registry", multi), ("duplicate_partner_row", pay[in_registry_dup])):
+            if len(rows):
+                frames.append(pd.DataFrame({
+                    "kind": kind,
+                    "processing_id": rows["processing_id"].to_numpy(),
+                    "partner_contract_id": partner,
+                    "partner_id": rows["partner_id"].to_numpy(),
+                    "registry_id": rows["registry_id"].to_numpy(),
+                    "partner_status": rows["partner_status"].to_numpy(),
+                    "partner_commission": _money(rows["_partner_commission"], rows["_partner_commission_na"]),
+                    "revenue_impact": _money(np.zeros(len(rows))),
+                }))
+        pay = pay[~in_registry_dup].drop_duplicates("partner_id", keep="first")
+
+        # 3. Hash join наших операций партнёра с его реестром
+        ours_p = ours[ours["partner_contract_id"] == partner]
+        merged = ours_p.reset_index().merge(pay, on="processing_id", how="outer", indicator=True)
+        both = (merged["_merge"] == "both").to_numpy()
+        only_ours = (merged["_merge"] == "left_only").to_numpy()
+        only_partner = (merged["_merge"] == "right_only").to_numpy()
+
+        our_status = merged["our_status"].to_numpy(dtype=object)
+        partner_status = merged["partner_status"].to_numpy(dtype=object)
+        amount_m = merged["_amount"].fillna(0).to_numpy(dtype=np.int64)
+        our_comm = merged["_our_commission"].fillna(0).to_numpy(dtype=np.int64)
+        our_comm_na = merged["_our_commission_na"].fillna(True).to_numpy(dtype=bool)
+        expected = merged["_expected_commission"].fillna(0).to_numpy(dtype=np.int64)
+        partner_comm = merged["_partner_commission"].fillna(0).to_numpy(dtype=np.int64)
+        partner_comm_na = merged["_partner_commission_na"].fillna(True).to_numpy(dtype=bool)
+
+        ours_success = our_status == "success"
+        partner_success = partner_status == "success"
+        status_mismatch = both & (our_status != partner_status)
+        # Ставим статус партнёра; выручка успешной операции считается по расчётной комиссии
+        current_revenue = np.where(ours_success, amount_m - np.where(our_comm_na, 0, our_comm), 0)
+        status_impact = np.where(partner_success, amount_m - expected, 0) - current_revenue
+        commission_mismatch = both & ~status_mismatch & ours_success & (
+            (~partner_comm_na & (partner_comm != expected)) | (~our_comm_na & (our_comm != expected))
+        )
+        commission_impact = np.where(our_comm_na, 0, our_comm) - expected
+
+        for kind, mask, impact in (
+            ("status_mismatch", status_mismatch, status_impact),
+            ("commission_mismatch", commission_mismatch, commission_impact),
+            ("missing_in_partner", only_ours, np.zeros(len(merged), dtype=np.int64)),
+            ("missing_in_ours", only_partner, np.zeros(len(merged), dtype=np.int64)),
+        ):
+            if mask.any():
+                rows = merged[mask]
+                frames.append(pd.DataFrame({
+                    "kind": kind,
+                    "processing_id": rows["processing_id"].to_numpy(),
+                    "partner_contract_id": partner,
+                    "partner_id": rows["partner_id"].to_numpy(),
+                    "registry_id": rows["registry_id"].to_numpy(),
+                    "our_status": rows["our_status"].to_numpy(),
+                    "partner_status": rows["partner_status"].to_numpy(),
+                    "amount": _money(amount_m[mask], only_partner[mask]),
+                    "our_commission": _money(our_comm[mask], our_comm_na[mask]),
+                    "partner_commission": _money(partner_comm[mask], partner_comm_na[mask]),
+                    "expected_commission": _money(expected[mask], only_partner[mask]),
+                    "revenue_impact": _money(impact[mask]),
+                }))
+
+        matched = merged[both]
+        final_status.loc[matched["index"].to_numpy(dtype=np.int64)] = matched["partner_status"].to_numpy()
+
+    final_success = (final_status == "success").to_numpy()
+    expected_revenue = int(((amount - expected_commission) * final_success).sum())
+
+    if frames:
+        discrepancies = pd.concat(frames, ignore_index=True).reindex(columns=COLUMNS)
+        for col in ("amount", "our_commission", "partner_commission", "expected_commission", "revenue_impact"):
+            discrepancies[col] = discrepancies[col].astype("Int64")
+        order = {kind: i for i, kind in enumerate(KINDS)}
+        discrepancies = discrepancies.sort_values(
+            ["kind", "processing_id"], key=lambda s: s.map(order) if s.name == "kind" else s, kind="stable"
+        ).reset_index(drop=True)
+    else:
+        discrepancies = pd.DataFrame(columns=COLUMNS)
+
+    counts = discrepancies["kind"].value_counts()
+    summary = {
+        "our_revenue_minor": our_revenue,
+        "expected_revenue_minor": expected_revenue,
+        "revenue_impact_minor": int(discrepancies["revenue_impact"].sum()),
+        "operations": int(len(ops)),
+        "counts": {kind: int(counts.get(kind, 0)) for kind in KINDS},
+    }
+    return Reconciliation(discrepancies, summary)
+
+
+@st.cache_resource
+def get_reconciliation():
+    """Эталонная сверка базовых данных — одна на процесс"""
+    from sql_validator import get_sql_simulator
+    return reconcile(get_sql_simulator().tables)
@@ -0,0 +1,273 @@
+# replay.py — детерминированный прогон записанных сессий кандидатов на текущем коде
+#
+#   python replay.py sessions/                          # diff баллов с записанными + пропускная способность
+#   python replay.py a.json b.json --workers 8 --repeat 20   # нагрузочный прогон
+#   python replay.py sessions/ --speed 60               # паузы между событиями, сжатые в 60 раз
+#   python replay.py --synthetic 200 --workers 4        # сгенерированные сессии (без записанных баллов)
+#   python replay.py sessions/ --update                 # записать текущие баллы как ожидаемые
+#
+# Лог сессии — JSON из «🕒 История выполненного» (⬇️ Лог сессии):
+#   {"session_id", "candidate", "scenario", "role", "events": [...], "scores": {...}}
+# Оценка повторяет приложение: TextEvaluator по сообщениям, SQLSimulator + триггеры и эталонные ответы
+# по запросам, DBA — заново по сообщениям в #dba-team, в конце — generate_report.
+# Ответы персонажей — только fallback (без OpenAI), random засевается на каждую сессию.
+#
+# Код возврата 1, если баллы хотя бы одной сессии разошлись с записанными.
+import argparse
+import glob
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+BLOCKS = ("soft_skills", "hard_skills", "data_integrity", "process_documentation")
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class ReplayContext:
+    """Всё, что не зависит от сессии: симулятор, эталонные ответы, конфиги. Одно на процесс"""
+
+    def __init__(self):
+        from columnar_store import demo_version, load_demo_tables
+        from kb_search import KBIndex
+        from knowledge_base import KNOWLEDGE_BASE
+        from reconciliation import reconcile
+        from result_fingerprint import AnswerRegistry
+        from sql_validator import QueryResultCache, SQLSimulator
+        from text_evaluator import TextEvaluator
+
+        self.simulator = SQLSimulator(load_demo_tables(), result_cache=QueryResultCache(), data_version=demo_version())
+        self.answers = AnswerRegistry(reconcile(self.simulator.tables))
+        self.kb_index = KBIndex(KNOWLEDGE_BASE)
+        self.evaluator = TextEvaluator()
+        with open(os.path.join(_BASE_DIR, "triggers.json"), "r", encoding="utf-8") as f:
+            self.triggers = json.load(f)
+        with open(os.path.join(_BASE_DIR, "role_weights.json"), "r", encoding="utf-8") as f:
+            self.weights = json.load(f)["role_weights"]
+
+
+_context = None
+
+
+def get_context():
+    global _context
+    if _context is None:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            _context = ReplayContext()
+    return _context
+
+
+def replay_session(session, seed=0, speed=0.0):
+    """Прогоняет события сессии. speed > 0 — выдерживать паузы между событиями, сжатые в speed раз"""
+    from characters import get_smart_fallback
+    from dba_engine import DBAEngine, TransactionLog
+    from events import DBAEvent, EventLog, event_from_dict
+    from report_generator import generate_report
+    from session_scoring import SessionScorer
+    from sql_validator import DataOverlay
+
+    ctx = get_context()
+    random.seed(f"{seed}:{session['session_id']}")
+    scenario = session.get("scenario")
+    overlay = DataOverlay()
+    dba = DBAEngine(ctx.simulator, overlay, TransactionLog())
+    events = EventLog()
+    scorer = SessionScorer(ctx.triggers, ctx.evaluator, ctx.answers)
+
+    def record(event):
+        # Как record_event в app.py: в лог и в scorer
+        events.append(event)
+        scorer.observe(event, events.appended - 1)
+
+    latencies = []
+    previous = None
+
+    started = time.perf_counter()
+    for raw in session["events"]:
+        event = event_from_dict(raw)
+        # Производные события (операции DBA, совпадения с эталоном) появятся заново
+        if event.type in ("dba", "result_match"):
+            continue
+        if speed and previous is not None:
+            time.sleep(max(0.0, event.timestamp - previous) / speed)
+        previous = event.timestamp
+        t0 = time.perf_counter()
+        record(event)
+
+        if event.type == "chat":
+            if event.to == "dba_team":
+                _, applied = dba.execute_request(event.content)
+                for entry in applied:
+                    record(DBAEvent(entry["statement"], entry["kind"], len(entry["images"]), event.timestamp))
+            else:
+                get_smart_fallback(event.to, event.content)
+
+        elif event.type == "sql":
+            result, _ = ctx.simulator.execute_sql(event.query, overlay)
+            for match in scorer.result_matches(result, event.query, scenario, event.timestamp):
+                record(match)
+
+        elif event.type == "kb_search":
+            ctx.kb_index.search(event.query)
+
+        latencies.append(time.perf_counter() - t0)
+
+    report = generate_report(events, ctx.triggers, ctx.weights.get(session.get("role") or "analyst"))
+    return {
+        "session_id": session["session_id"],
+        "scores": scorer.scores,
+        "report": {block: report["blocks"][block]["score"] for block in BLOCKS},
+        "events": len(events),
+        "elapsed": time.perf_counter() - started,
+        "latencies": latencies,
+    }
+
+
+def _warm_up(_):
+    return os.getpid()
+
+
+def _replay_job(args):
+    session, seed, speed = args
+    return replay_session(session, seed, speed)
+
+
+# ==========================================
+# Сессии
+# ==========================================
+def load_sessions(paths):
+    """Файлы *.json и папки с ними → [(путь, сессия)]"""
+    files = []
+    for path in paths:
+        files += sorted(glob.glob(os.path.join(path, "*.json"))) if os.path.isdir(path) else [path]
+    sessions = []
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            session = json.load(f)
+        session.setdefault("session_id", os.path.splitext(os.path.basename(path))[0])
+        sessions.append((path, session))
+    return sessions
+
+
+def synthetic_session(i, seed=0):
+    """Правдоподобная сессия кандидата: БЗ, чаты, SQL, бэкап и UPDATE через DBA, проверка, отчёт"""
+    rng = random.Random(f"{seed}:synthetic:{i}")
+    steps = [
+        ("kb_search", {"query": rng.choice(["статусы партнера", "is_excluded", "выручка"]), "results": 3}),
+        ("chat", {"to": "alice", "content": rng.choice([
+            "Спасибо! Какой срок по выручке за 15.01?", "Максим просит выручку, до 11:00 успеем?",
+            "Что значит IN_PROGRESS у партнера А?"])}),
+        ("sql", {"query": "SELECT * FROM registry_statuses WHERE is_excluded = 1"}),
+        ("sql", {"query": rng.choice([
+            "SELECT * FROM processing_operations WHERE status = 'success'",
+            "SELECT status, COUNT(*) AS n FROM processing_operations GROUP BY status"])}),
+        ("sql", {"query": "SELECT p.processing_id, o.additional_value FROM processing_operations p "
+                          "INNER JOIN operation_additional_data o ON p.processing_id = o.processing_id "
+                          "WHERE o.additional_type = 'partner_operation_id'"}),
+        ("chat", {"to": "partner_b", "content": "Добрый день, подскажите, почему PTR_B_016 есть в двух реестрах?"}),
+        ("chat", {"to": "dba_team", "content": "CREATE TABLE processing_operations_backup AS SELECT * FROM processing_operations; "
+                                               "UPDATE processing_operations SET status = 'failed' WHERE processing_id = 'PB026'"}),
+        ("sql", {"query": "SELECT processing_id, status FROM processing_operations WHERE processing_id = 'PB026'"}),
+        ("sql", {"query": "SELECT SUM(amount - commission_amount) AS revenue FROM processing_operations WHERE status = 'success'"}),
+        ("report", {"data": {
+            "description": "Выручка за 15.01 расходится с партнёрами: статусы PB026–PB030",
+            "action": "CREATE TABLE processing_operations_backup, UPDATE processing_operations SET status='failed'",
+            "result": "Было/стало сверено запросом, расхождение устранено"}}),
+    ]
+    events, ts = [], 1_700_000_000.0 + i
+    for kind, fields in steps[:rng.randint(6, len(steps))]:
+        ts += rng.uniform(5, 90)
+        events.append({"type": kind, **fields, "timestamp": ts})
+    return {"session_id": f"synthetic_{i}", "scenario": "revenue_mismatch", "role": "analyst", "events": events}
+
+
+# ==========================================
+# Отчёт
+# ==========================================
+def score_diffs(session, result):
+    """[(блок, записано, сейчас)] для блоков, где баллы разошлись"""
+    recorded = session.get("scores")
+    if not recorded:
+        return []
+    return [(b, recorded.get(b, 0), result["scores"][b]) for b in BLOCKS if recorded.get(b, 0) != result["scores"][b]]
+
+
+def print_report(pairs, wall):
+    diffs = 0
+    print(f"{'session':<32} {'events':>6} {'ms':>9}  scores (soft/hard/integrity/doc)")
+    for session, result in pairs:
+        changed = score_diffs(session, result)
+        diffs += bool(changed)
+        scores = "/".join(str(result["scores"][b]) for b in BLOCKS)
+        mark = "  ⚠️ " + ", ".join(f"{b}: {old} → {new}" for b, old, new in changed) if changed else ""
+        print(f"{result['session_id'][:32]:<32} {result['events']:>6} {result['elapsed'] * 1000:>9.1f}  {scores}{mark}")
+
+    latencies = sorted(l for _, r in pairs for l in r["latencies"])
+    n_events = sum(r["events"] for _, r in pairs)
+    print()
+    print(f"Сессий: {len(pairs)} · событий: {n_events} · {wall:.2f} с")
+    print(f"Пропускная способность: {len(pairs) / wall:.1f} сессий/с · {n_events / wall:.0f} событий/с")
+    if latencies:
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"Событие: p50 {statistics.median(latencies) * 1000:.2f} мс · p95 {p95 * 1000:.2f} мс · "
+              f"max {latencies[-1] * 1000:.2f} мс")
+    if diffs:
+        print(f"\n❌ Баллы изменились в {diffs} сессиях")
+    else:
+        print("\n✅ Баллы совпадают с записанными")
+    return diffs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Повтор записанных сессий кандидатов")
+    parser.add_argument("paths", nargs="*", help="JSON-логи сессий или папки с ними")
+    parser.add_argument("--synthetic", type=int, default=0, help="добавить N сгенерированных сессий")
+    parser.add_argument("--seed", type=int, default=0, help="seed для random (fallback-ответы, синтетика)")
+    parser.add_argument("--speed", type=float, default=0.0, help="сжатие времени между событиями (0 — без пауз)")
+    parser.add_argument("--workers", type=int, default=1, help="процессов для параллельного прогона")
+    parser.add_argument("--repeat", type=int, default=1, help="прогнать каждую сессию N раз (нагрузка)")
+    parser.add_argument("--update", action="store_true", help="записать текущие баллы в файлы сессий")
+    parser.add_argument("--json", help="сохранить результаты в JSON")
+    args = parser.parse_args(argv)
+
+    loaded = load_sessions(args.paths) + [(None, synthetic_session(i, args.seed)) for i in range(args.synthetic)]
+    if not loaded:
+        parser.error("нет сессий: укажите файлы/папки или --synthetic N")
+    jobs = [(session, args.seed, args.speed) for _, session in loaded] * args.repeat
+
+    # Контекст (симулятор, эталоны) строится до замера — в каждом процессе один раз
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=get_context) as pool:
+            list(pool.map(_warm_up, range(args.workers)))
+            started = time.perf_counter()
+            results = list(pool.map(_replay_job, jobs, chunksize=max(1, len(jobs) // (args.workers * 4))))
+    else:
+        get_context()
+        started = time.perf_counter()
+        results = [_replay_job(job) for job in jobs]
+    wall = time.perf_counter() - started
+
+    pairs = [(session, result) for (session, _, _), result in zip(jobs, results)]
+    diffs = print_report(pairs, wall)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([{k: v for k, v in r.items() if k != "latencies"} for r in results], f, ensure_ascii=False, indent=2)
+    if args.update:
+        for (path, session), result in zip(loaded, results):
+            if path:
+                session["scores"] = result["scores"]
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(session, f, ensure_ascii=False, indent=2)
+        print(f"💾 Баллы записаны в {sum(1 for p, _ in loaded if p)} файлов")
+        return 0
+    return 1 if diffs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
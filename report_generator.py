@@ -1,121 +1,39 @@
 # report_generator.py
-import json
-import plotly.graph_objects as go
+from scoring import score_summary
+from session_scoring import SessionScorer
 
-def generate_report(events, triggers_config):
+def generate_report(events, triggers_config, weights=None):
     """
     Генерирует отчёт на основе событий и триггеров.
-    events: list of {"type": "chat"/"sql"/"report", ...}
+    events: events.EventLog
     triggers_config: содержимое triggers.json
+    weights: веса блоков (role_weights.json); без весов — среднее по блокам
+    Баллы — тем же SessionScorer, что и живая оценка в app.py, поэтому отчёт по логу
+    совпадает с баллами сессии.
     """
-    # Базовые баллы
-    scores = {
-        "soft_skills": 0,
-        "hard_skills": 0,
-        "data_integrity": 0,
-        "process_documentation": 0
-    }
-    feedback = {
-        "soft_skills": [],
-        "hard_skills": [],
-        "data_integrity": [],
-        "process_documentation": []
-    }
-
-    # Оценка событий
-    for event in events:
-        if event["type"] == "chat":
-            from text_evaluator import TextEvaluator
-            evaluator = TextEvaluator()
-            triggers = evaluator.evaluate_chat_message(event["content"], to=event.get("to"))
-            for t in triggers:
-                for trig in triggers_config["mvp_triggers"]:
-                    if trig["id"] == t["id"]:
-                        scores[trig["block"]] += t["points"]
-                        if t["points"] != 0:
-                            feedback[trig["block"]].append(trig["feedback"])
-                        break
+    from text_evaluator import TextEvaluator
 
-        elif event["type"] == "sql":
-            from text_evaluator import TextEvaluator
-            evaluator = TextEvaluator()
-            triggers = evaluator.evaluate_sql_query(event["query"])
-            for t in triggers:
-                for trig in triggers_config["mvp_triggers"]:
-                    if trig["id"] == t["id"]:
-                        scores[trig["block"]] += t["points"]
-                        if t["points"] != 0:
-                            feedback[trig["block"]].append(trig["feedback"])
-                        break
+    # Совпадения с эталоном (result_match) и операции DBA уже в логе — эталоны не нужны
+    scorer = SessionScorer(triggers_config, TextEvaluator())
+    for seq, event in enumerate(events, start=events.dropped):
+        scorer.observe(event, seq)
 
-        elif event["type"] == "report":
-            from text_evaluator import TextEvaluator
-            evaluator = TextEvaluator()
-            report = event["data"]
-            result = evaluator.evaluate_task_report(
-                report["description"],
-                report["action"],
-                report["result"]
-            )
-            scores[result["block"]] += result["score"]
-            for fb in result["feedback"]:
-                feedback[result["block"]].append(fb)
-    
-    # Применяем веса
-    if weights:
-        final_score = (
-            scores["soft_skills"] * weights["soft_skills"] +
-            scores["hard_skills"] * weights["hard_skills"] +
-            scores["data_integrity"] * weights["data_integrity"] +
-            scores["process_documentation"] * weights["process_documentation"]
-        ) / 100
-    else:
-        final_score = sum(scores.values()) / 4
-    
-    # Формируем структуру отчёта
+    # Итог, рекомендации и радар — общие с report_result (scoring.py)
+    summary = score_summary(scorer.scores, weights)
     blocks = {
-        "soft_skills": {
-            "name": "Soft Skills",
-            "score": max(0, min(100, scores["soft_skills"])),
-            "max_score": 100,
-            "feedback": list(set(feedback["soft_skills"]))
-        },
-        "hard_skills": {
-            "name": "Hard Skills",
-            "score": max(0, min(100, scores["hard_skills"])),
-            "max_score": 100,
-            "feedback": list(set(feedback["hard_skills"]))
-        },
-        "data_integrity": {
-            "name": "Data Integrity",
-            "score": max(0, min(100, scores["data_integrity"])),
-            "max_score": 100,
-            "feedback": list(set(feedback["data_integrity"]))
-        },
-        "process_documentation": {
-            "name": "Документация",
-            "score": max(0, min(12, scores["process_documentation"])),
-            "max_score": 12,
-            "feedback": list(set(feedback["process_documentation"]))
-        }
+        block: {"name": b["name"], "score": b["score"], "max_score": b["max"],
+                "feedback": list(set(scorer.feedback[block]))}
+        for block, b in summary.blocks().items()
     }
 
-    # Рекомендации
-    recommendations = []
-    if blocks["soft_skills"]["score"] < 70:
-        recommendations.append("🔹 Практикуйте уточнение сроков и приоритетов перед началом задачи")
-    if blocks["data_integrity"]["score"] < 70:
-        recommendations.append("🔹 Обратите внимание на работу с метаданными (is_excluded, registry_statuses)")
-    if blocks["process_documentation"]["score"] < 10:
-        recommendations.append("🔹 Используйте шаблон оформления задачи из базы знаний")
-
     return {
         "blocks": blocks,
-        "total_score": sum(b["score"] for b in blocks.values()),
-        "max_total": 312,
-        "recommendations": recommendations,
+        "weighted_score": summary.weighted,
+        "total_score": sum(summary.scores),
+        "max_total": sum(b["max_score"] for b in blocks.values()),
+        "recommendations": list(summary.recommendations),
         "radar_data": {
-            "r": [blocks[k]["score"] for k in blocks],
-            "theta": [blocks[k]["name"] for k in blocks]
+            "r": list(summary.scores),
+            "theta": [b["name"] for b in blocks.values()]
         }
     }
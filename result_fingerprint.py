@@ -0,0 +1,130 @@
+# result_fingerprint.py — автопроверка результатов SELECT по отпечаткам
+#
+# Отпечаток не зависит от порядка строк и колонок и от имён колонок:
+#   значение ячейки нормализуется (деньги и числа — центы int64, даты — ISO-строка, NULL — константа),
+#   хэши ячеек строки смешиваются в порядке, заданном самими колонками,
+#   хэши строк складываются по модулю 2^64 (коммутативно, дубли строк учитываются).
+# Эталонные таблицы строятся один раз из reconciliation; хранятся только отпечатки.
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import money
+from sql_validator import is_cents
+
+_NULL = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def _mix(x):
+    """splitmix64-финализатор для массива uint64"""
+    x = x ^ (x >> np.uint64(30))
+    x = x * _MIX1
+    x = x ^ (x >> np.uint64(27))
+    x = x * _MIX2
+    return x ^ (x >> np.uint64(31))
+
+
+def _is_number(value):
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def _normalize(series):
+    """(значения для хэширования, маска NULL) — одинаковые для равных по смыслу ответов"""
+    mask = series.isna().to_numpy()
+    if is_cents(series.dtype):
+        return series.to_numpy(dtype=np.int64, na_value=0), mask
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        dates = series.dt.normalize().eq(series)[~mask].all()  # NaT не делает колонку «датой со временем»
+        return series.dt.strftime("%Y-%m-%d" if dates else "%Y-%m-%dT%H:%M:%S").fillna("").to_numpy(dtype=object), mask
+    if pd.api.types.is_bool_dtype(series.dtype):
+        series = series.astype("float64")
+    elif series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+        # Числа текстом ('245.50') — как числа (в pandas 3 такие колонки — str, а не object).
+        # Полный разбор — только если первое значение число: колонки ID не разбираем
+        present = series[~mask]
+        if len(present) and _is_number(present.iloc[0]):
+            numbers = pd.to_numeric(series, errors="coerce")
+            if numbers.notna().sum() == len(present):
+                series = numbers
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        # Числа сравниваются с точностью до цента: 5, 5.0 и 5.001 — один ответ
+        values = series.astype("float64").fillna(0).to_numpy()
+        return money.to_minor_array(values), mask
+    return series.astype(str).to_numpy(dtype=object), mask
+
+
+def _cell_hashes(series):
+    values, mask = _normalize(series)
+    hashes = pd.util.hash_array(values)
+    hashes[mask] = _NULL
+    return hashes
+
+
+def fingerprint(df, distinct=False):
+    """'<строк>x<колонок>:<hex>' за O(строк × колонок)"""
+    if distinct:
+        df = df.drop_duplicates()
+    columns = [_cell_hashes(df.iloc[:, i]) for i in range(df.shape[1])]
+    # Порядок колонок — по их собственному содержимому, а не по SELECT
+    columns.sort(key=lambda h: int(_mix(h).sum()))
+    rows = np.full(len(df), np.uint64(df.shape[1]), dtype=np.uint64)
+    for hashes in columns:
+        rows = _mix(rows ^ hashes)
+    return f"{df.shape[0]}x{df.shape[1]}:{int(rows.sum()):016x}"
+
+
+# ==========================================
+# Эталонные ответы по шагам сценариев
+# ==========================================
+def _ids(recon, kind, column="processing_id"):
+    d = recon.discrepancies
+    return pd.DataFrame({column: sorted(set(d.loc[d["kind"] == kind, column].dropna()))})
+
+
+# scenario -> step -> (построитель эталона по Reconciliation, сравнивать как множество)
+SCENARIO_STEPS = {
+    "revenue_mismatch": {
+        "revenue": (lambda r: pd.DataFrame({"revenue": [money.from_minor(r.summary["expected_revenue_minor"])]}), False),
+        "discrepancy_ids": (lambda r: pd.DataFrame({"processing_id": r.discrepancy_ids()}), True),
+        "status_mismatch_ids": (lambda r: _ids(r, "status_mismatch"), True),
+        "duplicate_registry_ids": (lambda r: _ids(r, "duplicate_registry", "partner_id"), True),
+        "missing_in_partner_ids": (lambda r: _ids(r, "missing_in_partner"), True),
+    },
+}
+
+
+class AnswerRegistry:
+    """Отпечатки эталонов: (колонок, distinct) -> {отпечаток: [(scenario, step)]}"""
+
+    def __init__(self, reconciliation, scenario_steps=None):
+        self._index = {}
+        for scenario, steps in (scenario_steps or SCENARIO_STEPS).items():
+            for step, (build, distinct) in steps.items():
+                expected = build(reconciliation)
+                key = (expected.shape[1], distinct)
+                self._index.setdefault(key, {}).setdefault(fingerprint(expected), []).append((scenario, step))
+
+    def match(self, df, scenario=None):
+        """Шаги, ответ на которые даёт результат df (scenario=None — любой сценарий)"""
+        if df is None or df.empty:
+            return []
+        found = []
+        for distinct in (False, True):
+            candidates = self._index.get((df.shape[1], distinct))
+            if candidates:
+                for s, step in candidates.get(fingerprint(df, distinct), []):
+                    if scenario is None or s == scenario:
+                        found.append(step)
+        return list(dict.fromkeys(found))
+
+
+@st.cache_resource
+def get_answer_registry():
+    from reconciliation import get_reconciliation
+    return AnswerRegistry(get_reconciliation())
@@ -0,0 +1,55 @@
+# sanitizer.py — проверка сообщений кандидата перед отправкой в LLM
+#
+# Все правила собраны в одну скомпилированную регулярку с именованными группами:
+# сообщение сканируется один раз, каждое совпадение — {"rule", "start", "end", "text"} для аудита.
+# Разрешённые правила зависят от адресата (POLICIES): #dba-team нужен DML и CREATE TABLE ... (бэкап),
+# Алисе — вопросы про UPDATE/INSERT статусов; партнёрам и остальным — ничего из списка.
+import re
+
+RULES = {
+    "dml": r"\b(?:UPDATE|INSERT|DELETE)\b",
+    "create": r"\bCREATE\b",
+    "ddl": r"\b(?:DROP|ALTER|TRUNCATE)\b",
+    "exec": r"\bEXEC\b",
+    "comment_injection": r";\s*(?:--|#|/\*)",
+    "tautology": r"'(?:\s*OR\s+1=1|--)",
+    "path_traversal": r"\.\.[/\\]|/proc/self/environ",  # не многоточие в обычном тексте
+    "script": r"<script.*?>.*?</script>",
+}
+
+POLICIES = {
+    "dba_team": {"dml", "create"},
+    "alice": {"dml"},
+}
+
+_SCANNER = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in RULES.items()),
+                      re.IGNORECASE | re.MULTILINE)
+
+
+class UnsafeInput(ValueError):
+    """Сообщение нарушает политику адресата. findings — совпадения, из-за которых оно отклонено"""
+
+    def __init__(self, findings):
+        super().__init__("dangerous content")
+        self.findings = findings
+
+
+def scan(text):
+    """Все совпадения правил в тексте по порядку"""
+    return [{"rule": m.lastgroup, "start": m.start(), "end": m.end(), "text": m.group()}
+            for m in _SCANNER.finditer(text)]
+
+
+def violations(text, character=None):
+    """Совпадения, которые адресату не разрешены"""
+    allowed = POLICIES.get(character, ())
+    return [f for f in scan(text) if f["rule"] not in allowed]
+
+
+def sanitize(text, character=None):
+    """Текст без пробелов по краям; UnsafeInput, если политика адресата нарушена"""
+    text = text.strip()
+    found = violations(text, character)
+    if found:
+        raise UnsafeInput(found)
+    return text
@@ -0,0 +1,150 @@
+# scenario_scheduler.py — шаги сценариев (scenarios.json) по времени и по событиям кандидата
+#
+# Шаг сценария:
+#   {"id", "chat", "message"} + условие запуска:
+#     "at": 2                          — через 2 с после старта сценария
+#     "on": "sql"                      — после события этого типа (events.EVENT_TYPES), опционально:
+#         "to": "update"                 target события: адресат чата / вид операции DBA / шаг эталона
+#         "pattern": "registry_statuses" регулярка по тексту события (сообщение, SQL)
+#         "count": 2                     на N-е подходящее событие (по умолчанию — первое)
+#     "after": "maxim_asap"            — после другого шага
+#   "delay": 5 — задержка после события / шага.
+# Таймеры лежат в хэшированном колесе: rerun проверяет только занятые ячейки прошедших тиков,
+# события смотрят только шаги, подписанные на их тип — O(наступивших шагов), а не O(всех шагов).
+import math
+import re
+
+
+class TimerWheel:
+    """Хэшированное колесо таймеров: slots ячеек по tick секунд, таймер — в ячейке due_tick % slots.
+    Ячейка — {due_tick: [элементы]}: тик забирает только свои элементы, таймеры следующих оборотов не просматриваются.
+    occupied — битовая маска непустых ячеек: advance/next_due переходят сразу к занятым ячейкам,
+    пустые тики (простой между rerun) не перебираются"""
+
+    def __init__(self, start, tick=1.0, slots=64):
+        self.start = start
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]
+        self.occupied = 0
+        self.current = 0  # последний обработанный тик
+        self.pending = 0
+
+    def schedule(self, at, item):
+        # Тик округляется вверх — таймер никогда не срабатывает раньше срока
+        due = max(math.ceil((at - self.start) / self.tick), self.current + 1)
+        slot = due % len(self.slots)
+        self.slots[slot].setdefault(due, []).append(item)
+        self.occupied |= 1 << slot
+        self.pending += 1
+
+    def _occupied_ahead(self, span):
+        """Смещения k (0 ≤ k < span, span ≤ slots) от тика current + 1, чьи ячейки заняты, по возрастанию"""
+        n = len(self.slots)
+        shift = (self.current + 1) % n
+        # Маска, повёрнутая так, что бит k — ячейка тика current + 1 + k
+        mask = ((self.occupied >> shift) | (self.occupied << (n - shift))) & ((1 << span) - 1)
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def _pop(self, slot, tick):
+        items = self.slots[slot].pop(tick)
+        if not self.slots[slot]:
+            self.occupied &= ~(1 << slot)
+        return items
+
+    def advance(self, now):
+        """Элементы, чей срок наступил к now, в порядке срока — O(занятых ячеек), а не O(прошедших тиков)"""
+        target = math.floor((now - self.start) / self.tick)
+        if target <= self.current or not self.pending:
+            self.current = max(self.current, target)
+            return []
+        n = len(self.slots)
+        fired = []
+        if target - self.current < n:
+            for k in list(self._occupied_ahead(target - self.current)):
+                tick = self.current + 1 + k
+                if tick in self.slots[tick % n]:
+                    fired.append((tick, self._pop(tick % n, tick)))
+        else:
+            # Простой дольше оборота колеса — обход только занятых ячеек
+            for k in list(self._occupied_ahead(n)):
+                slot = (self.current + 1 + k) % n
+                for tick in [t for t in self.slots[slot] if t <= target]:
+                    fired.append((tick, self._pop(slot, tick)))
+            fired.sort(key=lambda entry: entry[0])
+        self.current = target
+        result = [item for _, items in fired for item in items]
+        self.pending -= len(result)
+        return result
+
+    def next_due(self):
+        """Время ближайшего таймера (или None): по занятым ячейкам вперёд, не по всем таймерам"""
+        if not self.pending:
+            return None
+        n = len(self.slots)
+        for k in self._occupied_ahead(n):
+            tick = self.current + 1 + k
+            if tick in self.slots[tick % n]:
+                return self.start + tick * self.tick
+        due = min(t for slot in self.slots for t in slot)
+        return self.start + due * self.tick
+
+
+class ScenarioScheduler:
+    """Состояние сценария одной сессии: подписки на события, колесо таймеров, сработавшие шаги"""
+
+    def __init__(self, scenario, start_time):
+        self.scenario = scenario
+        self.steps = {step["id"]: step for step in scenario["steps"]}
+        self.wheel = TimerWheel(start_time)
+        self.listeners = {}  # тип события -> [шаг]
+        self.followers = {}  # id шага -> [шаги с "after"]
+        self.matched = {}    # id шага -> подходящих событий
+        self.fired = []
+        for step in scenario["steps"]:
+            if "at" in step:
+                self.wheel.schedule(start_time + step["at"], step["id"])
+            elif "on" in step:
+                self.listeners.setdefault(step["on"], []).append(step)
+            elif "after" in step:
+                self.followers.setdefault(step["after"], []).append(step)
+        self._patterns = {step["id"]: re.compile(step["pattern"], re.I | re.S)
+                          for step in scenario["steps"] if step.get("pattern")}
+
+    def on_event(self, event):
+        """Событие кандидата (events.Event): ставит в колесо шаги, условие которых выполнено"""
+        listeners = self.listeners.get(event.type)
+        if not listeners:
+            return
+        waiting = []
+        for step in listeners:
+            if "to" in step and event.target != step["to"]:
+                waiting.append(step)
+                continue
+            pattern = self._patterns.get(step["id"])
+            if pattern and not (event.text and pattern.search(event.text)):
+                waiting.append(step)
+                continue
+            self.matched[step["id"]] = self.matched.get(step["id"], 0) + 1
+            if self.matched[step["id"]] >= step.get("count", 1):
+                self.wheel.schedule(event.timestamp + step.get("delay", 0), step["id"])
+            else:
+                waiting.append(step)
+        self.listeners[event.type] = waiting
+
+    def due(self, now):
+        """Шаги, срок которых наступил (каждый — один раз). Зависящие шаги ставятся в колесо
+        от момента срабатывания — не раньше следующего тика"""
+        result = []
+        for step_id in self.wheel.advance(now):
+            step = self.steps[step_id]
+            self.fired.append(step_id)
+            result.append(step)
+            for follower in self.followers.pop(step_id, ()):
+                self.wheel.schedule(now + follower.get("delay", 0), follower["id"])
+        return result
+
+    def next_due(self):
+        return self.wheel.next_due()
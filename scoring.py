@@ -0,0 +1,72 @@
+# scoring.py — итоговый балл, рекомендации и радар по баллам блоков
+#
+# Общее для report_result (живой отчёт кандидата) и report_generator.generate_report (отчёт по логу).
+# Результат зависит только от (баллы, веса) — кэшируется по кортежам: ревьюер, переключающий
+# вкладки и роли, получает готовые цифры и фигуру без пересчёта.
+from functools import lru_cache
+
+import plotly.graph_objects as go
+
+# Блок -> (название, максимум)
+BLOCKS = {
+    "soft_skills": ("Soft Skills", 100),
+    "hard_skills": ("Hard Skills", 100),
+    "data_integrity": ("Data Integrity", 100),
+    "process_documentation": ("Документация", 12),
+}
+EQUAL_WEIGHTS = {block: 100 / len(BLOCKS) for block in BLOCKS}
+
+# (блок, порог, рекомендация) — рекомендация, если балл блока ниже порога
+RECOMMENDATIONS = (
+    ("soft_skills", 70, "🔹 Практикуйте уточнение сроков и приоритетов перед началом задачи"),
+    ("data_integrity", 70, "🔹 Обратите внимание на работу с метаданными (is_excluded, registry_statuses)"),
+    ("process_documentation", 10, "🔹 Используйте шаблон оформления задачи из базы знаний"),
+)
+
+
+class ScoreSummary:
+    """scores — баллы блоков в порядке BLOCKS (в пределах 0..максимум), weighted — итог по весам"""
+
+    __slots__ = ("scores", "weighted", "recommendations")
+
+    def __init__(self, scores, weighted, recommendations):
+        self.scores = scores
+        self.weighted = weighted
+        self.recommendations = recommendations
+
+    def blocks(self):
+        """{блок: {"name", "score", "max"}} — новый dict на каждый вызов (кэшированное не меняется)"""
+        return {block: {"name": name, "score": score, "max": top}
+                for (block, (name, top)), score in zip(BLOCKS.items(), self.scores)}
+
+
+def _key(mapping):
+    return tuple(mapping.get(block, 0) for block in BLOCKS)
+
+
+@lru_cache(maxsize=4096)
+def _summary(scores, weights):
+    scores = tuple(max(0, min(top, score)) for (_, top), score in zip(BLOCKS.values(), scores))
+    weighted = sum(s * w for s, w in zip(scores, weights)) / 100
+    by_block = dict(zip(BLOCKS, scores))
+    recommendations = tuple(text for block, threshold, text in RECOMMENDATIONS if by_block[block] < threshold)
+    return ScoreSummary(scores, weighted, recommendations)
+
+
+def score_summary(scores, weights=None):
+    """scores/weights — {блок: значение}; без весов — среднее по блокам"""
+    return _summary(_key(scores), _key(weights or EQUAL_WEIGHTS))
+
+
+@lru_cache(maxsize=256)
+def _radar(scores):
+    return go.Figure(data=go.Scatterpolar(
+        r=list(scores),
+        theta=[name for name, _ in BLOCKS.values()],
+        fill='toself'
+    ))
+
+
+def radar_figure(summary):
+    """Радар по баллам блоков. Фигура общая для одинаковых баллов — не изменять"""
+    return _radar(summary.scores)
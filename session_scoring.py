@@ -0,0 +1,117 @@
+# session_scoring.py — начисление баллов по событиям сессии
+#
+# Обработчик на каждый тип события — одно место для живой оценки (app.py), replay.py и
+# report_generator.generate_report (отчёт по логу прогоняет события через тот же scorer).
+# SessionScorer — состояние одной сессии: баллы блоков, последние SQL/операции DBA (цепочки
+# sql_sequence), решённые шаги сценария и ledger — что, кому и за какое событие начислено.
+# Сообщения в чат и поиски по базе знаний баллов не дают.
+# События подаются в scorer в том же порядке, что и в EventLog (seq — номер события в логе).
+from collections import deque
+
+from events import ResultMatchEvent
+
+BLOCKS = ("soft_skills", "hard_skills", "data_integrity", "process_documentation")
+REPORT_MAX_SCORE = 12  # документация: баллы за отчёты не выше максимума блока
+
+
+class ScoreLedger:
+    """Начисления колонками: номер события в EventLog, блок, баллы (как у триггера), триггер"""
+
+    __slots__ = ("seq", "block", "points", "trigger")
+
+    def __init__(self):
+        self.seq, self.block, self.points, self.trigger = [], [], [], []
+
+    def add(self, seq, block, points, trigger_id):
+        self.seq.append(seq)
+        self.block.append(block)
+        self.points.append(points)
+        self.trigger.append(trigger_id)
+
+    def __len__(self):
+        return len(self.seq)
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame({"seq": self.seq, "block": self.block, "points": self.points, "trigger": self.trigger})
+
+    def by_event(self):
+        """seq -> (триггеры через запятую, сумма баллов) — для таблицы истории"""
+        frame = self.to_frame()
+        return frame.groupby("seq").agg(trigger=("trigger", ", ".join), points=("points", "sum"))
+
+
+class SessionScorer:
+    """Баллы одной сессии. observe(event, seq) — начислить за событие; результаты SELECT,
+    совпавшие с эталоном, дают новые события result_match (result_matches)"""
+
+    def __init__(self, triggers, evaluator, answers=None, sequence_window=10):
+        self.triggers = triggers
+        self.by_id = {t["id"]: t for t in triggers["mvp_triggers"]}
+        self.by_step = {t["step"]: t for t in triggers["mvp_triggers"] if t.get("condition") == "result_fingerprint"}
+        self.evaluator = evaluator
+        self.answers = answers
+        self.scores = dict.fromkeys(BLOCKS, 0)
+        self.ledger = ScoreLedger()
+        self.feedback = {block: [] for block in BLOCKS}
+        self.executed = deque(maxlen=sequence_window)  # SQL кандидата и операции DBA по порядку
+        self.solved = set()
+        self._handlers = {
+            "sql": self._on_sql,
+            "dba": self._on_dba,
+            "result_match": self._on_result_match,
+            "report": self._on_report,
+        }
+
+    def award(self, seq, block, points, trigger_id=None, max_score=None, feedback=None):
+        """Начисляет баллы блоку (не ниже 0, не выше max_score). Возвращает (блок, баллы, итог блока, триггер).
+        feedback — пояснения для отчёта; по умолчанию feedback триггера, если баллы не нулевые"""
+        score = max(0, self.scores[block] + points)
+        if max_score is not None:
+            score = min(max_score, score)
+        self.scores[block] = score
+        self.ledger.add(seq, block, points, trigger_id)
+        if feedback is None:
+            trig = self.by_id.get(trigger_id)
+            feedback = [trig["feedback"]] if trig and points and trig.get("feedback") else []
+        self.feedback[block] += feedback
+        return block, points, score, trigger_id
+
+    def observe(self, event, seq):
+        """Начисления за событие: [(блок, баллы, итог блока, триггер)]"""
+        handler = self._handlers.get(event.type)
+        return [self.award(seq, *award) for award in handler(event)] if handler else []
+
+    def _triggered(self, found):
+        return [(self.by_id[t["id"]]["block"], t["points"], t["id"]) for t in found if t["id"] in self.by_id]
+
+    def _on_sql(self, event):
+        self.executed.append(event.query)
+        found = self.evaluator.evaluate_sql_query(event.query)
+        # Цепочки (UPDATE → проверочный SELECT): UPDATE — из реально выполненных операций DBA
+        found += self.evaluator.evaluate_sql_sequence(list(self.executed), self.triggers)
+        return self._triggered(found)
+
+    def _on_dba(self, event):
+        self.executed.append(event.statement)
+        return []
+
+    def _on_result_match(self, event):
+        trig = self.by_step.get(event.step)
+        if trig is None or event.step in self.solved:
+            return []
+        self.solved.add(event.step)
+        return [(trig["block"], trig["points"], trig["id"])]
+
+    def _on_report(self, event):
+        data = event.data
+        report = self.evaluator.evaluate_task_report(data["description"], data["action"], data["result"])
+        return [(report["block"], report["score"], "task_report_filled", REPORT_MAX_SCORE, report["feedback"])]
+
+    def result_matches(self, result, query, scenario, timestamp=None):
+        """Новые события result_match: результат совпал с эталоном шага, шаг ещё не решён (баллы — один раз)"""
+        if self.answers is None:
+            return []
+        return [ResultMatchEvent(step, query, timestamp)
+                for step in self.answers.match(result, scenario)
+                if step in self.by_step and step not in self.solved]
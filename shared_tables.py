@@ -0,0 +1,218 @@
+# shared_tables.py — базовые таблицы симулятора в shared memory: одна копия на все процессы сервера
+#
+# Сегменты (multiprocessing.shared_memory, в Linux — файлы в /dev/shm):
+#     dwl_<формат>_<версия>     — буферы колонок подряд (выравнивание 64 байта)
+#     dwl_<формат>_<версия>_m   — манифест JSON: таблицы, колонки, kind, dtype/shape/offset буферов, словари
+# Манифест создаётся последним: есть манифест — данные записаны полностью.
+# Worker'ы подключаются к сегментам и оборачивают их в read-only numpy-массивы без копирования,
+# поэтому RSS worker'а не растёт с числом процессов. Строки лежат в формате Arrow (как у pandas 3),
+# числа с NULL — значения + маска, справочники — коды pd.Categorical.
+#
+# Включается переменной DATAWORK_SHARED_TABLES=1 (columnar_store.load_demo_tables).
+# Сегменты переживают процессы сервера; удалить старые версии:
+#   python shared_tables.py --unlink
+import argparse
+import json
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+from columnar_store import decode_column
+
+try:
+    import pyarrow as pa
+except ImportError:  # без pyarrow строки декодируются в каждом процессе (как в columnar_store)
+    pa = None
+
+PREFIX = "dwl_"
+FORMAT_VERSION = 1
+_ALIGN = 64
+_attached = {}  # version -> (сегмент данных, layout): буфер должен жить, пока живут DataFrame
+
+
+def _arrow_strings():
+    """Строки pandas хранятся в Arrow (pandas 3 + pyarrow) — их буферы можно отдать без копирования"""
+    return pa is not None and getattr(pd.Series(["x"]).dtype, "storage", None) == "pyarrow"
+
+
+def segment_names(version):
+    name = f"{PREFIX}{FORMAT_VERSION}_{version}"
+    return name, name + "_m"
+
+
+def _untrack(shm):
+    """Сегментом владеет сервер, а не процесс: resource_tracker не должен удалять его при выходе процесса"""
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _unlink(shm):
+    # unlink() сам снимает регистрацию — возвращаем её, чтобы resource_tracker не ругался
+    resource_tracker.register(shm._name, "shared_memory")
+    shm.close()
+    shm.unlink()
+
+
+def _buffers(kind, array, dictionary, categorical):
+    """(kind, {имя: массив}, dictionary) — в том виде, в каком pandas использует их без копирования"""
+    array = np.asarray(array)
+    if kind == "nullable_int":
+        values = decode_column(kind, array, dictionary)
+        return kind, {"values": array, "mask": values._mask}, None
+    if kind != "dictionary":
+        return kind, {"values": array}, None
+    if categorical:
+        codes = pd.Categorical.from_codes(array, categories=pd.Index(dictionary)).codes
+        return "categorical", {"codes": codes}, dictionary
+    if _arrow_strings():
+        strings = pa.array(decode_column(kind, array, dictionary), type=pa.large_string())
+        validity, offsets, data = strings.buffers()
+        buffers = {
+            "offsets": np.frombuffer(offsets, dtype=np.int64),
+            "data": np.frombuffer(data, dtype=np.uint8) if data is not None else np.zeros(0, np.uint8),
+        }
+        if validity is not None:
+            buffers["validity"] = np.frombuffer(validity, dtype=np.uint8)
+        return "arrow_string", buffers, None
+    return kind, {"values": array}, dictionary
+
+
+def _column(kind, buffers, dictionary, length):
+    if kind == "nullable_int":
+        return pd.arrays.IntegerArray(buffers["values"], buffers["mask"])
+    if kind == "categorical":
+        return pd.Categorical.from_codes(buffers["codes"], categories=pd.Index(dictionary))
+    if kind == "arrow_string":
+        validity = buffers.get("validity")
+        strings = pa.Array.from_buffers(pa.large_string(), length, [
+            pa.py_buffer(validity) if validity is not None else None,
+            pa.py_buffer(buffers["offsets"]),
+            pa.py_buffer(buffers["data"]),
+        ])
+        return pd.arrays.ArrowStringArray(pa.chunked_array([strings]), dtype=pd.Series(["x"]).dtype)
+    return decode_column(kind, buffers["values"], dictionary)
+
+
+def publish_columns(columns, version, categorical=None):
+    """columns — {name: {column: (kind, array, dictionary)}} (columnar_store.read_columns).
+    categorical — {table: [колонки]}, которые отдаются как pd.Categorical.
+    FileExistsError — версию уже публикует другой процесс"""
+    categorical = categorical or {}
+    layout, arrays, size = {}, [], 0
+    for name, cols in columns.items():
+        layout[name] = {}
+        for col, (kind, array, dictionary) in cols.items():
+            kind, buffers, dictionary = _buffers(kind, array, dictionary, col in categorical.get(name, ()))
+            info = {"kind": kind, "length": len(array), "dictionary": dictionary, "buffers": {}}
+            for key, buffer in buffers.items():
+                size = -(-size // _ALIGN) * _ALIGN
+                info["buffers"][key] = {"dtype": buffer.dtype.str, "shape": list(buffer.shape), "offset": size}
+                arrays.append((size, buffer))
+                size += buffer.nbytes
+            layout[name][col] = info
+
+    data_name, manifest_name = segment_names(version)
+    data = _untrack(shared_memory.SharedMemory(name=data_name, create=True, size=max(size, 1)))
+    try:
+        for offset, buffer in arrays:
+            np.ndarray(buffer.shape, dtype=buffer.dtype, buffer=data.buf, offset=offset)[...] = buffer
+        payload = json.dumps(layout, ensure_ascii=False).encode("utf-8")
+        manifest = _untrack(shared_memory.SharedMemory(name=manifest_name, create=True, size=len(payload)))
+        manifest.buf[:len(payload)] = payload
+        manifest.close()
+    except BaseException:
+        _unlink(data)
+        raise
+    data.close()
+
+
+def attach_tables(version):
+    """{name: DataFrame} поверх сегментов версии без копирования.
+    FileNotFoundError — версия ещё не опубликована"""
+    if version not in _attached:
+        data_name, manifest_name = segment_names(version)
+        manifest = _untrack(shared_memory.SharedMemory(name=manifest_name))
+        layout = json.loads(bytes(manifest.buf).rstrip(b"\0"))
+        manifest.close()
+        _attached[version] = (_untrack(shared_memory.SharedMemory(name=data_name)), layout)
+    data, layout = _attached[version]
+
+    tables = {}
+    for name, cols in layout.items():
+        columns = {}
+        for col, info in cols.items():
+            buffers = {}
+            for key, spec in info["buffers"].items():
+                array = np.ndarray(spec["shape"], dtype=spec["dtype"], buffer=data.buf, offset=spec["offset"])
+                array.flags.writeable = False
+                buffers[key] = array
+            columns[col] = _column(info["kind"], buffers, info["dictionary"], info["length"])
+        tables[name] = pd.DataFrame(columns, copy=False)
+    return tables
+
+
+def open_shared_tables(build, version, categorical=None, timeout=30):
+    """Таблицы версии из shared memory. build() — {name: {column: (kind, array, dictionary)}},
+    вызывается только первым процессом; остальные ждут его манифест"""
+    try:
+        return attach_tables(version)
+    except FileNotFoundError:
+        pass
+    try:
+        publish_columns(build(), version, categorical)
+    except FileExistsError:
+        deadline = time.time() + timeout
+        while True:
+            try:
+                return attach_tables(version)
+            except FileNotFoundError:
+                if time.time() > deadline:
+                    raise TimeoutError(
+                        f"Сегмент {segment_names(version)[0]} есть, а манифеста нет — "
+                        f"публикация прервалась? Удалите: python shared_tables.py --unlink"
+                    )
+                time.sleep(0.05)
+    return attach_tables(version)
+
+
+def unlink_tables(keep=None):
+    """Удаляет опубликованные версии (кроме keep). Подключённые процессы продолжают работать со своей копией"""
+    removed = []
+    shm_dir = "/dev/shm"
+    if not os.path.isdir(shm_dir):
+        return removed
+    keep_names = set(segment_names(keep)) if keep else set()
+    for name in sorted(os.listdir(shm_dir)):
+        if name.startswith(PREFIX) and name not in keep_names:
+            try:
+                _unlink(_untrack(shared_memory.SharedMemory(name=name)))
+                removed.append(name)
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Таблицы SQL-симулятора в shared memory")
+    parser.add_argument("--publish", action="store_true", help="опубликовать текущую версию демо-БД")
+    parser.add_argument("--unlink", action="store_true", help="удалить опубликованные версии")
+    parser.add_argument("--keep-current", action="store_true", help="с --unlink: не трогать текущую версию")
+    args = parser.parse_args(argv)
+
+    from columnar_store import demo_version
+    version = demo_version()
+    if args.unlink:
+        for name in unlink_tables(version if args.keep_current else None):
+            print(f"🗑️ {name}")
+    if args.publish:
+        os.environ["DATAWORK_SHARED_TABLES"] = "1"
+        from columnar_store import load_demo_tables
+        tables = load_demo_tables()
+        print(f"📤 {segment_names(version)[0]}: " + ", ".join(f"{n} ({len(df)})" for n, df in tables.items()))
+
+
+if __name__ == "__main__":
+    main()
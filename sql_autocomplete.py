@@ -0,0 +1,169 @@
+# sql_autocomplete.py — подсказки по схеме БД для SQL песочницы
+import re
+
+import streamlit as st
+
+SQL_KEYWORDS = [
+    "SELECT", "FROM", "WHERE", "AND", "OR", "NOT", "IN", "IS NULL", "IS NOT NULL", "INNER JOIN", "LEFT JOIN",
+    "ON", "AS", "ORDER BY", "GROUP BY", "HAVING", "LIMIT", "ASC", "DESC", "DISTINCT",
+    "COUNT(*)", "SUM(", "AVG(", "MIN(", "MAX(", "CREATE TABLE", "UPDATE", "SET", "INSERT INTO", "VALUES",
+]
+
+# Колонки, по которым таблицы связываются, даже если FK в схеме не указан
+_SHARED_KEYS = ["processing_id", "registry_id", "partner_contract_id"]
+
+_ALIAS_DEF = re.compile(r'\b(?:from|join)\s+(\w+)(?:\s+(?:as\s+)?(?!on\b|where\b|inner\b|left\b|join\b|order\b|group\b|limit\b)(\w+))?', re.IGNORECASE)
+_LAST_WORD = re.compile(r'(\w*)$')
+
+
+class _TrieNode:
+    __slots__ = ("children", "completions")
+
+    def __init__(self):
+        self.children = {}
+        self.completions = []
+
+
+class PrefixTrie:
+    """Trie, в каждом узле которого заранее сохранены первые limit дополнений.
+    Поиск — проход по символам префикса, O(длина префикса)."""
+
+    def __init__(self, words, limit=10):
+        self.root = _TrieNode()
+        for word in sorted(set(words), key=lambda w: (len(w), w)):
+            node = self.root
+            if len(node.completions) < limit:
+                node.completions.append(word)
+            for ch in word.lower():
+                node = node.children.setdefault(ch, _TrieNode())
+                if len(node.completions) < limit:
+                    node.completions.append(word)
+
+    def complete(self, prefix):
+        node = self.root
+        for ch in prefix.lower():
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return node.completions
+
+
+class SchemaIndex:
+    """Всё, что нужно подсказкам и вкладке «Схема БД», считается один раз на процесс"""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.tables = PrefixTrie(schema.keys())
+        self.keywords = PrefixTrie(SQL_KEYWORDS)
+        self.columns = {table: PrefixTrie(info["columns"].keys()) for table, info in schema.items()}
+        self.all_columns = PrefixTrie(c for info in schema.values() for c in info["columns"])
+        self.join_keys = self._build_join_keys()
+        # Строки для вкладки «Схема БД» — одна таблица вместо st.columns на каждую колонку
+        self.table_rows = {
+            table: [
+                {
+                    "Колонка": col,
+                    "Тип": col_info["type"],
+                    "Ключ": "🔑" if col_info.get("pk") else f"🔗 {col_info['fk']}" if col_info.get("fk") else "",
+                    "Описание": col_info["description"],
+                }
+                for col, col_info in info["columns"].items()
+            ]
+            for table, info in schema.items()
+        }
+
+    def _build_join_keys(self):
+        """(table_a, table_b) -> [(col_a, col_b)]: FK из схемы + общие ключевые колонки"""
+        keys = {}
+        for table, info in self.schema.items():
+            for col, col_info in info["columns"].items():
+                ref = col_info.get("fk")
+                if ref in self.schema and col in self.schema[ref]["columns"]:
+                    keys.setdefault((table, ref), []).append((col, col))
+                    keys.setdefault((ref, table), []).append((col, col))
+        for a in self.schema:
+            for b in self.schema:
+                if a == b:
+                    continue
+                for col in _SHARED_KEYS:
+                    if col in self.schema[a]["columns"] and col in self.schema[b]["columns"]:
+                        pairs = keys.setdefault((a, b), [])
+                        if (col, col) not in pairs:
+                            pairs.append((col, col))
+        # Партнёр Б связан с нашими операциями только через operation_additional_data
+        for a, b in (("operation_additional_data", "partner_b_payments"), ("operation_additional_data", "partner_a_payments")):
+            keys.setdefault((a, b), []).append(("additional_value", "partner_id"))
+            keys.setdefault((b, a), []).append(("partner_id", "additional_value"))
+        return keys
+
+    @staticmethod
+    def aliases(sql):
+        """alias -> table из FROM/JOIN (имя таблицы — тоже алиас)"""
+        result = {}
+        for table, alias in _ALIAS_DEF.findall(sql):
+            table = table.lower()
+            result[table] = table
+            if alias:
+                result[alias.lower()] = table
+        return result
+
+    def complete(self, sql, limit=8):
+        """Подсказки для конца текста: [(чем заменить недописанное слово, подпись)]"""
+        aliases = {a: t for a, t in self.aliases(sql).items() if t in self.schema}
+        dotted = re.search(r'(\w+)\.(\w*)$', sql)
+        if dotted:
+            table = aliases.get(dotted.group(1).lower())
+            trie = self.columns[table] if table else self.all_columns
+            return [(col, f"{dotted.group(1)}.{col}") for col in trie.complete(dotted.group(2))[:limit]]
+
+        prefix = _LAST_WORD.search(sql).group(1)
+        before = sql[:len(sql) - len(prefix)].rstrip()
+        prev_word = re.search(r'(\w+)$', before)
+        prev_word = prev_word.group(1).lower() if prev_word else ""
+
+        if prev_word in ("from", "join"):
+            return [(t, t) for t in self.tables.complete(prefix)[:limit]]
+
+        if prev_word == "on":
+            return self._join_suggestions(sql, prefix)[:limit]
+
+        in_query = {t for t in aliases.values()}
+        suggestions = [(k, k) for k in self.keywords.complete(prefix)] if prefix else []
+        for table in in_query:
+            suggestions += [(c, c) for c in self.columns[table].complete(prefix)]
+        if not in_query:
+            suggestions += [(c, c) for c in self.all_columns.complete(prefix)] if prefix else []
+        seen, unique = set(), []
+        for item in suggestions:
+            if item[0] not in seen:
+                seen.add(item[0])
+                unique.append(item)
+        return unique[:limit]
+
+    def _join_suggestions(self, sql, prefix):
+        """После ON: условия связи последней присоединённой таблицы с остальными"""
+        joins = list(_ALIAS_DEF.finditer(sql))
+        if len(joins) < 2:
+            return []
+        right_table = joins[-1].group(1).lower()
+        right_alias = joins[-1].group(2) or right_table
+        suggestions = []
+        for m in joins[:-1]:
+            left_table, left_alias = m.group(1).lower(), m.group(2) or m.group(1)
+            for left_col, right_col in self.join_keys.get((left_table, right_table), []):
+                condition = f"{left_alias}.{left_col} = {right_alias}.{right_col}"
+                if condition.lower().startswith(prefix.lower()):
+                    suggestions.append((condition, condition))
+        return suggestions
+
+
+def apply_completion(sql, insert):
+    """Заменяет недописанное слово в конце запроса на выбранную подсказку"""
+    prefix = _LAST_WORD.search(sql).group(1)
+    return sql[:len(sql) - len(prefix)] + insert + " "
+
+
+@st.cache_resource
+def get_schema_index():
+    from database_schema import DATABASE_SCHEMA
+    return SchemaIndex(DATABASE_SCHEMA)
@@ -0,0 +1,75 @@
+# sql_history.py — история запросов SQL песочницы с ограничением памяти сессии
+import pickle
+import time
+import zlib
+
+from result_fingerprint import fingerprint
+
+HISTORY_LIMIT = 10
+PREVIEW_ROWS = 100
+PREVIEW_BUDGET = 512 * 1024  # байт сжатых превью на сессию
+
+
+class QueryHistory:
+    """Последние запросы сессии: текст, отпечаток и размер результата.
+
+    entry: {"id", "query", "fingerprint", "rows", "columns", "feedback", "timestamp", "preview"}
+    preview — первые PREVIEW_ROWS строк результата (pickle + zlib) или None.
+    Превью всех записей вместе не больше budget байт: новые вытесняют превью старых,
+    без превью результат пересчитывается по запросу (см. sql_sandbox).
+    """
+
+    def __init__(self, limit=HISTORY_LIMIT, budget=PREVIEW_BUDGET, preview_rows=PREVIEW_ROWS):
+        self.entries = []
+        self.limit = limit
+        self.budget = budget
+        self.preview_rows = preview_rows
+        self._next_id = 1
+
+    def append(self, query, result, feedback):
+        entry = {
+            "id": self._next_id,
+            "query": query,
+            "fingerprint": fingerprint(result) if result is not None else None,
+            "rows": len(result) if result is not None else None,
+            "columns": list(result.columns) if result is not None else [],
+            "feedback": feedback,
+            "timestamp": time.time(),
+            "preview": None,
+        }
+        self._next_id += 1
+        if result is not None:
+            preview = zlib.compress(pickle.dumps(result.head(self.preview_rows), protocol=pickle.HIGHEST_PROTOCOL))
+            if len(preview) <= self.budget:
+                entry["preview"] = preview
+        self.entries = (self.entries + [entry])[-self.limit:]
+        self._enforce_budget()
+        return entry
+
+    def _enforce_budget(self):
+        used = self.preview_bytes()
+        for entry in self.entries:
+            if used <= self.budget:
+                break
+            if entry["preview"] is not None:
+                used -= len(entry["preview"])
+                entry["preview"] = None
+
+    def preview_bytes(self):
+        return sum(len(e["preview"]) for e in self.entries if e["preview"] is not None)
+
+    def get(self, entry_id):
+        return next((e for e in self.entries if e["id"] == entry_id), None)
+
+    def preview(self, entry):
+        """DataFrame превью или None, если превью вытеснено"""
+        if entry["preview"] is None:
+            return None
+        return pickle.loads(zlib.decompress(entry["preview"]))
+
+    def queries(self, n=None):
+        queries = [e["query"] for e in self.entries]
+        return queries[-n:] if n else queries
+
+    def __len__(self):
+        return len(self.entries)
@@ -1,35 +1,731 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import operator
+
+import money
+import numpy as np
 import pandas as pd
 import re
 import streamlit as st
 
+class DataOverlay:
+    """Приватные изменения сессии поверх общих базовых таблиц (copy-on-write).
+
+    changed        — {table: {row_key: {col: value}}} для строк базовой таблицы
+    inserted       — {table: [row | None, ...]} для вставленных строк (None — откатанная вставка)
+    Значения хранятся в единицах пользователя, в типы колонок они приводятся в merge.
+    created_tables — {name: DataFrame} таблицы сессии (бэкапы CREATE TABLE ... AS SELECT)
+    Ключ вставленной строки = len(base) + её номер, поэтому UPDATE адресует
+    базовые и вставленные строки единообразно.
+    """
+
+    def __init__(self):
+        self.changed = {}
+        self.inserted = {}
+        self.created_tables = {}
+        self.version = 0
+
+    def is_empty(self):
+        return (not any(self.changed.values())
+                and not any(row is not None for rows in self.inserted.values() for row in rows)
+                and not self.created_tables)
+
+    def touches(self, table_name):
+        return bool(self.changed.get(table_name)) or bool(self.inserted.get(table_name))
+
+    def get_row(self, base_df, table_name, key):
+        """Текущий образ строки с учётом изменений сессии"""
+        n = len(base_df)
+        if key >= n:
+            return dict(self.inserted[table_name][key - n])
+        row = {col: to_display(base_df[col].dtype, value) for col, value in base_df.iloc[key].items()}
+        row.update(self.changed.get(table_name, {}).get(key, {}))
+        return row
+
+    def set_values(self, base_df, table_name, key, values):
+        """Меняет значения строки. Возвращает (before, after)"""
+        values = {col: normalize_value(base_df[col].dtype, v) for col, v in values.items()}
+        before = self.get_row(base_df, table_name, key)
+        n = len(base_df)
+        if key >= n:
+            self.inserted[table_name][key - n].update(values)
+        else:
+            self.changed.setdefault(table_name, {}).setdefault(key, {}).update(values)
+        self.version += 1
+        return before, self.get_row(base_df, table_name, key)
+
+    def insert_row(self, base_df, table_name, row):
+        rows = self.inserted.setdefault(table_name, [])
+        full_row = {col: None for col in base_df.columns}
+        full_row.update({col: normalize_value(base_df[col].dtype, v) for col, v in row.items()})
+        rows.append(full_row)
+        self.version += 1
+        return len(base_df) + len(rows) - 1
+
+    def snapshot_row(self, base_df, table_name, key):
+        """Состояние строки внутри overlay (не образ строки!) — для отката"""
+        n = len(base_df)
+        if key >= n:
+            row = self.inserted[table_name][key - n]
+            return None if row is None else dict(row)
+        values = self.changed.get(table_name, {}).get(key)
+        return None if values is None else dict(values)
+
+    def restore_row(self, base_df, table_name, key, state):
+        """Возвращает строку в состояние из snapshot_row — O(1) на строку"""
+        n = len(base_df)
+        if key >= n:
+            self.inserted[table_name][key - n] = state
+        elif state is None:
+            self.changed.get(table_name, {}).pop(key, None)
+        else:
+            self.changed.setdefault(table_name, {})[key] = state
+        self.version += 1
+
+    def create_table(self, name, df):
+        self.created_tables[name] = df
+        self.version += 1
+
+    def drop_table(self, name):
+        self.created_tables.pop(name, None)
+        self.version += 1
+
+    def merge(self, table_name, base_df):
+        """Базовая таблица + изменения сессии. Копируются только затронутые колонки."""
+        changed = self.changed.get(table_name)
+        inserted = self.inserted.get(table_name)
+        if not changed and not inserted:
+            return base_df
+
+        df = base_df.copy(deep=False)
+        if changed:
+            by_col = {}
+            for key, values in changed.items():
+                for col, value in values.items():
+                    by_col.setdefault(col, {})[key] = value
+            for col, updates in by_col.items():
+                df[col] = _assign_values(df[col], updates)
+
+        if inserted:
+            n = len(base_df)
+            live = [(n + i, row) for i, row in enumerate(inserted) if row is not None]
+            if live:
+                keys, rows = zip(*live)
+                extra = {}
+                for col in base_df.columns:
+                    values = [to_storage(df[col].dtype, row.get(col)) for row in rows]
+                    df[col] = _with_categories(df[col], values)
+                    extra[col] = _typed_series(values, df[col].dtype, list(keys))
+                df = pd.concat([df, pd.DataFrame(extra)])
+        return df
+
+def _typed_series(values, dtype, index):
+    try:
+        return pd.Series(values, index=index, dtype=dtype)
+    except (TypeError, ValueError):
+        return pd.Series(values, index=index, dtype=object)
+
+def _assign_values(series, updates):
+    values = [to_storage(series.dtype, v) for v in updates.values()]
+    series = _with_categories(series, values).copy()
+    try:
+        series.loc[list(updates)] = values
+    except (TypeError, ValueError):
+        # Несовместимый тип (например, строка в числовой колонке) — object в единицах пользователя
+        series = pd.Series([to_display(series.dtype, v) for v in series], index=series.index, dtype=object)
+        series.loc[list(updates)] = list(updates.values())
+    return series
+
+def _parse_literal(raw):
+    raw = raw.strip()
+    if len(raw) >= 2 and raw[0] == raw[-1] and raw[0] in "'\"":
+        return raw[1:-1].replace("''", "'")
+    if raw.lower() == 'null':
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        pass
+    try:
+        return float(raw)
+    except ValueError:
+        return raw
+
+_LITERAL = r"'(?:[^']|'')*'|\"[^\"]*\"|[^,\s][^,]*"
+
+# ==========================================
+# 🔢 Типы колонок из DATABASE_SCHEMA
+# ==========================================
+# Хранение: VARCHAR-справочники — category (коды int8 + словарь), DATE — datetime64,
+# DECIMAL(x,2) — целые центы (Int64), остальные DECIMAL — float64.
+# Наружу (результаты SELECT, образы строк DBA) деньги отдаются в исходных единицах.
+CATEGORY_COLUMNS = {"status", "currency", "partner_contract_id"}
+CENTS = money.MINOR
+
+def column_kind(sql_type, column):
+    sql_type = sql_type.upper()
+    if column in CATEGORY_COLUMNS:
+        return "category"
+    if sql_type == "DATE":
+        return "date"
+    if sql_type.startswith("DECIMAL"):
+        return "cents" if sql_type.replace(" ", "").endswith(",2)") else "float"
+    if sql_type == "INTEGER":
+        return "int"
+    return "text"
+
+def prepare_tables(tables):
+    """Типы колонок по DATABASE_SCHEMA (см. column_kind), на месте. Уже приведённые колонки не трогаем"""
+    from database_schema import DATABASE_SCHEMA
+    for table_name, df in tables.items():
+        columns = DATABASE_SCHEMA.get(table_name, {}).get("columns", {})
+        for col, info in columns.items():
+            if col not in df.columns:
+                continue
+            kind, dtype = column_kind(info["type"], col), df[col].dtype
+            if kind == "category":
+                if not isinstance(dtype, pd.CategoricalDtype):
+                    df[col] = df[col].astype("category")
+            elif kind == "date":
+                if not pd.api.types.is_datetime64_any_dtype(dtype):
+                    df[col] = pd.to_datetime(df[col], format="%Y-%m-%d", errors="coerce")
+            elif kind == "cents":
+                if not is_cents(dtype):
+                    values = pd.to_numeric(df[col]).astype("float64")
+                    df[col] = pd.arrays.IntegerArray(money.to_minor_array(values.fillna(0)), values.isna().to_numpy())
+            elif kind == "float":
+                if dtype != "float64":
+                    df[col] = pd.to_numeric(df[col]).astype("float64")
+            elif kind == "int":
+                if not pd.api.types.is_integer_dtype(dtype):
+                    df[col] = pd.to_numeric(df[col]).astype("Int32" if df[col].isna().any() else "int64")
+    return tables
+
+def categorical_columns():
+    """{table: [колонки-справочники]} — для загрузки из колоночного кэша сразу в category"""
+    from database_schema import DATABASE_SCHEMA
+    return {
+        table: [col for col in info["columns"] if col in CATEGORY_COLUMNS]
+        for table, info in DATABASE_SCHEMA.items()
+    }
+
+def is_cents(dtype):
+    return isinstance(dtype, pd.Int64Dtype)
+
+def _is_null(value):
+    return value is None or value is pd.NaT or (isinstance(value, float) and value != value) or value is pd.NA
+
+def to_storage(dtype, value):
+    """Значение в единицах пользователя → представление колонки. Неконвертируемое — как есть"""
+    if _is_null(value):
+        return None
+    try:
+        if is_cents(dtype):
+            return money.to_minor(value)
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            return pd.Timestamp(value)
+    except (ArithmeticError, ValueError, TypeError):
+        pass
+    return value
+
+def to_display(dtype, value):
+    """Представление колонки → значение в единицах пользователя"""
+    if _is_null(value):
+        return None
+    if is_cents(dtype) and isinstance(value, (int, np.integer)):
+        return int(value) / CENTS
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d")
+    return value
+
+def normalize_value(dtype, value):
+    """Значение пользователя так, как его сохранит колонка (245.505 → 245.51 для центов)"""
+    return to_display(dtype, to_storage(dtype, value))
+
+def _with_categories(series, values):
+    """Категориальная колонка, в словаре которой есть все values (словарь остаётся отсортированным)"""
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    new = {v for v in values if not _is_null(v)} - set(series.cat.categories)
+    if not new:
+        return series
+    try:
+        return series.cat.set_categories(sorted(set(series.cat.categories) | new))
+    except TypeError:
+        return series.astype(object)
+
+def to_output(df):
+    """Результат SELECT: центы → денежные значения"""
+    cents = [col for col, dtype in df.dtypes.items() if is_cents(dtype)]
+    if not cents:
+        return df
+    df = df.copy(deep=False)
+    for col in cents:
+        df[col] = df[col].to_numpy(dtype="float64", na_value=np.nan) / CENTS
+    return df
+
+def normalize_query(sql_query):
+    """Регистр и пробелы вне литералов ('...' и "...") не важны, ';' в конце — тоже"""
+    parts = re.split(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")", sql_query.strip().rstrip(';').strip())
+    return "".join(
+        part if i % 2 else re.sub(r'\s+', ' ', part.lower())
+        for i, part in enumerate(parts)
+    )
+
+def query_fingerprint(sql_query):
+    return hashlib.blake2b(normalize_query(sql_query).encode("utf-8"), digest_size=16).hexdigest()
+
+class QueryResultCache:
+    """Процесс-общий кэш результатов SELECT по базовым таблицам.
+
+    Ключ — (отпечаток нормализованного запроса, версия данных). Бюджет — в байтах
+    (размер DataFrame считается через memory_usage), вытеснение LRU до попадания
+    в бюджет; результаты больше max_entry_bytes не кэшируются вовсе.
+    Закэшированные DataFrame общие для всех сессий — их нельзя менять на месте.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 8
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _sizeof(result, feedback):
+        size = len(feedback) * 4
+        if result is not None:
+            size += int(result.memory_usage(index=True, deep=True).sum())
+        return size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, result, feedback):
+        size = self._sizeof(result, feedback)
+        if size > self.max_entry_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[2]
+            self._entries[key] = (result, feedback, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes and self._entries:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+# ==========================================
+# ⚡ Быстрый путь WHERE: простые предикаты через AND без df.query
+# ==========================================
+_NUMBER = r"-?\d+(?:\.\d+)?"
+_STRING = r"'(?:[^']|'')*'|\"[^\"]*\""
+_COMPARISON = re.compile(rf"\b([a-zA-Z_]\w*)\s*(==|!=|>=|<=|>|<)\s*({_NUMBER})\b(?!\.)")
+_TEXT_COMPARISON = re.compile(rf"\b([a-zA-Z_]\w*)\s*(==|!=|>=|<=|>|<)\s*({_STRING})")
+_IN_LIST = re.compile(r"\b([a-zA-Z_]\w*)(\s+(?:not\s+)?in\s*)\(([^()]*)\)", re.IGNORECASE)
+_LIST_ITEM = re.compile(rf"{_STRING}|(?<![\w.]){_NUMBER}")
+_PREDICATE = re.compile(
+    rf"^\s*(\w+)\s*(?:(==|!=|>=|<=|>|<)\s*({_NUMBER}|{_STRING})|\s(not\s+in|in)\s*\(((?:\s*(?:{_NUMBER}|{_STRING})\s*,?)+)\))\s*$"
+)
+_OPERATORS = {
+    "==": operator.eq, "!=": operator.ne, ">=": operator.ge,
+    "<=": operator.le, ">": operator.gt, "<": operator.lt,
+}
+
+def _literal_value(raw):
+    raw = raw.strip()
+    if raw[0] in "'\"":
+        return raw[1:-1].replace("''", "'")
+    return float(raw) if "." in raw else int(raw)
+
+def _bind_in_list(m, df):
+    """`col [not] in (...)`: для денежной колонки числа списка → центы; один элемент — кортеж (x,),
+    иначе df.query сравнивает со скаляром"""
+    col, op, items = m.groups()
+    if col not in df.columns:
+        return m.group(0)
+    if is_cents(df[col].dtype):
+        items = _LIST_ITEM.sub(
+            lambda item: item.group(0) if item.group(0)[0] in "'\"" else str(money.to_minor(item.group(0))), items)
+    if len(_LIST_ITEM.findall(items)) == 1 and not items.rstrip().endswith(","):
+        items = items.rstrip() + ","
+    return f"{col}{op}({items})"
+
+def _predicate_mask(series, op, values):
+    """Маска для `col op literal` / `col [not] in (...)`; None — предикат не для быстрого пути"""
+    is_text = [isinstance(v, str) for v in values]
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        if not all(is_text):
+            return None
+        values, is_text = [pd.Timestamp(v) for v in values], [False] * len(values)
+    elif isinstance(series.dtype, pd.CategoricalDtype):
+        if not all(is_text) or op not in ("==", "!=", "in", "not in"):
+            return None
+        # Сравнение кодов словаря вместо строк
+        codes = series.cat.codes.to_numpy()
+        categories = series.cat.categories
+        wanted = [categories.get_loc(v) for v in values if v in categories]
+        mask = codes == wanted[0] if len(wanted) == 1 else np.isin(codes, wanted)
+        return ~mask if op in ("!=", "not in") else mask
+    if any(is_text):
+        if not all(is_text) or not (pd.api.types.is_string_dtype(series.dtype) or series.dtype == object):
+            return None
+    elif not (pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_datetime64_any_dtype(series.dtype)):
+        return None
+    if op in ("in", "not in"):
+        mask = series.isin(values)
+        return ~mask.to_numpy() if op == "not in" else mask.to_numpy()
+    mask = _OPERATORS[op](series, values[0])
+    if hasattr(mask, "fillna"):
+        mask = mask.fillna(False)
+    return np.asarray(mask, dtype=bool)
+
+def _fast_mask(df, cond):
+    """Маска для условия из простых предикатов через AND; None — нужен df.query"""
+    if re.search(r"\bor\b|\bnot\b(?!\s+in\b)", cond):
+        return None
+    mask = None
+    for part in re.split(r"\s+and\s+", cond.strip()):
+        m = _PREDICATE.match(part)
+        if not m or m.group(1) not in df.columns:
+            return None
+        col, op, literal, in_op, in_list = m.groups()
+        if in_op:
+            op = "not in" if in_op.startswith("not") else "in"
+            values = [_literal_value(v) for v in re.findall(rf"{_NUMBER}|{_STRING}", in_list)]
+        else:
+            values = [_literal_value(literal)]
+        part_mask = _predicate_mask(df[col], op, values)
+        if part_mask is None:
+            return None
+        mask = part_mask if mask is None else mask & part_mask
+    return mask
+
+# ==========================================
+# 🧮 Выражения в SELECT: арифметика и агрегаты (деньги — в центах)
+# ==========================================
+class QueryError(Exception):
+    """Ошибка запроса с готовым сообщением для пользователя"""
+
+_AGGREGATES = {"sum", "count", "avg", "min", "max"}
+_EXPR_TOKEN = re.compile(r"\s*(?:(\d+(?:\.\d+)?)|([a-zA-Z_]\w*(?:\.[a-zA-Z_]\w*)?)|(\*|[-+/(),]))")
+_SIMPLE_ITEM = re.compile(r"^\s*(?:\w+\.)?(?:\w+|\*)\s*$")
+
+class _Value:
+    """Результат подвыражения: Series или скаляр; money — значения в центах"""
+    __slots__ = ("data", "money", "literal")
+
+    def __init__(self, data, money=False, literal=False):
+        self.data = data
+        self.money = money
+        self.literal = literal
+
+def _split_items(columns_part):
+    """Элементы списка SELECT по запятым верхнего уровня"""
+    items, depth, current = [], 0, ""
+    for ch in columns_part:
+        if ch == "," and depth == 0:
+            items.append(current)
+            current = ""
+            continue
+        depth += (ch == "(") - (ch == ")")
+        current += ch
+    items.append(current)
+    return [item.strip() for item in items if item.strip()]
+
+def needs_projection(columns_part, group_by):
+    return bool(group_by) or not all(_SIMPLE_ITEM.match(item) for item in _split_items(columns_part))
+
+def _tokenize_expr(expr):
+    tokens, pos = [], 0
+    expr = expr.strip()
+    while pos < len(expr):
+        m = _EXPR_TOKEN.match(expr, pos)
+        if not m or m.end() == pos:
+            raise QueryError(f"❌ Unsupported expression: `{expr}`")
+        number, name, symbol = m.groups()
+        tokens.append(("num", number) if number else ("name", name.lower()) if name else ("op", symbol))
+        pos = m.end()
+    return tokens
+
+def _parse_expr(tokens):
+    """Рекурсивный спуск: expr := term (+|- term)*, term := factor (*|/ factor)*"""
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else (None, None)
+
+    def take():
+        nonlocal pos
+        pos += 1
+        return tokens[pos - 1]
+
+    def expr():
+        node = term()
+        while peek() in (("op", "+"), ("op", "-")):
+            node = ("bin", take()[1], node, term())
+        return node
+
+    def term():
+        node = factor()
+        while peek() in (("op", "*"), ("op", "/")):
+            node = ("bin", take()[1], node, factor())
+        return node
+
+    def factor():
+        kind, value = take() if pos < len(tokens) else (None, None)
+        if kind == "num":
+            return ("num", float(value) if "." in value else int(value))
+        if (kind, value) == ("op", "-"):
+            return ("bin", "-", ("num", 0), factor())
+        if (kind, value) == ("op", "("):
+            node = expr()
+            if take() != ("op", ")"):
+                raise QueryError("❌ Missing `)` in expression")
+            return node
+        if kind == "name" and peek() == ("op", "("):
+            take()
+            if value not in _AGGREGATES:
+                raise QueryError(f"❌ Unsupported function: `{value.upper()}`")
+            distinct = peek() == ("name", "distinct")
+            if distinct:
+                take()
+            if peek() == ("op", "*"):
+                take()
+                arg = ("star",)
+            else:
+                arg = expr()
+            if take() != ("op", ")"):
+                raise QueryError(f"❌ Missing `)` after {value.upper()}(")
+            return ("agg", value, arg, distinct)
+        if kind == "name":
+            return ("col", value.split(".")[-1])
+        raise QueryError("❌ Invalid expression in SELECT")
+
+    node = expr()
+    if pos != len(tokens):
+        raise QueryError("❌ Invalid expression in SELECT")
+    return node
+
+def _has_aggregate(node):
+    if node[0] == "agg":
+        return True
+    if node[0] == "bin":
+        return _has_aggregate(node[2]) or _has_aggregate(node[3])
+    return False
+
+def _int_values(data):
+    """(int64-массив, маска NULL) для Series с Int64/числами"""
+    mask = data.isna().to_numpy()
+    return data.to_numpy(dtype=np.int64, na_value=0), mask
+
+def _money_series(values, mask, index):
+    return pd.Series(pd.arrays.IntegerArray(np.asarray(values, dtype=np.int64), mask), index=index)
+
+def _round_half_up(values):
+    values = np.asarray(values, dtype=np.float64)
+    return np.sign(values) * np.floor(np.abs(values) + 0.5)
+
+def _to_money(value):
+    """Немонетарный операнд → центы (литерал 10.5 в `amount - 10.5`)"""
+    data = value.data
+    if isinstance(data, pd.Series):
+        return _Value((data * money.MINOR).round().astype("Int64"), money=True)
+    return _Value(money.to_minor(data), money=True, literal=value.literal)
+
+def _arith(op, left, right):
+    if op in "+-":
+        if left.money != right.money:
+            left, right = (left, _to_money(right)) if left.money else (_to_money(left), right)
+        data = left.data + right.data if op == "+" else left.data - right.data
+        return _Value(data, money=left.money, literal=left.literal and right.literal)
+    if op == "*" and left.money and right.money:
+        raise QueryError("❌ Money × money is not supported")
+    if op == "*" and (left.money or right.money):
+        amount, factor = (left, right) if left.money else (right, left)
+        if isinstance(factor.data, (int, float)):
+            # Точное умножение на десятичный литерал: центы × 15 / 1000, half-up
+            if isinstance(amount.data, pd.Series):
+                values, mask = _int_values(amount.data)
+                return _Value(_money_series(money.multiply(values, factor.data), mask, amount.data.index), money=True)
+            return _Value(money.multiply(amount.data, factor.data), money=True)
+        product = amount.data.astype("float64") * factor.data
+        return _Value(pd.Series(_round_half_up(product), index=product.index).astype("Int64").where(product.notna()), money=True)
+    if op == "/":
+        if left.money and right.money:
+            return _Value(left.data / right.data)
+        if left.money:
+            quotient = left.data / right.data
+            if isinstance(quotient, pd.Series):
+                return _Value(pd.Series(_round_half_up(quotient), index=quotient.index).astype("Int64").where(quotient.notna()), money=True)
+            return _Value(int(_round_half_up(quotient)), money=True)
+        return _Value(left.data / right.data)
+    return _Value(left.data * right.data, literal=left.literal and right.literal)
+
+def _aggregate(func, arg, distinct, df, groups):
+    """Агрегат по всей выборке (groups is None) или по группам"""
+    if arg is None:  # COUNT(*)
+        return _Value(len(df) if groups is None else groups.size().astype("int64"))
+    data = arg.data if isinstance(arg.data, pd.Series) else pd.Series(arg.data, index=df.index)
+    if isinstance(data.dtype, pd.CategoricalDtype):
+        # Словарь отсортирован — MIN/MAX по кодам совпадают со строковым порядком
+        data = data.cat.as_ordered()
+    grouped = data if groups is None else data.groupby(groups.ngroup().to_numpy(), sort=True)
+    if func == "count":
+        counts = grouped.nunique() if distinct else grouped.count()
+        return _Value(counts if groups is None else counts.astype("int64").set_axis(groups.size().index))
+    if func == "avg":
+        if arg.money:
+            sums, counts = grouped.sum(), grouped.count()
+            if groups is None:
+                return _Value(money.div_half_up(int(sums), int(counts)) if counts else None, money=True)
+            values = money.div_half_up(sums.to_numpy(dtype=np.int64), np.maximum(counts.to_numpy(), 1))
+            return _Value(_money_series(values, counts.to_numpy() == 0, groups.size().index), money=True)
+        result = grouped.mean()
+    else:
+        # SUM группы из одних NULL — NULL, как и SUM по всей выборке
+        result = grouped.sum(min_count=1) if func == "sum" else getattr(grouped, func)()
+        if groups is None and not data.count():
+            result = None  # агрегат пустой выборки — NULL
+        elif func == "sum" and arg.money and groups is None:
+            result = int(result)  # Int64 суммируется в int64 — точно
+    if groups is not None:
+        result = result.set_axis(groups.size().index)
+    return _Value(result, money=arg.money)
+
+def _eval(node, df, groups):
+    """Вычисляет узел. groups — GroupBy для агрегатного запроса (или None для построчного)"""
+    kind = node[0]
+    if kind == "num":
+        return _Value(node[1], literal=True)
+    if kind == "col":
+        col = node[1]
+        if col not in df.columns:
+            raise QueryError(f"❌ Columns not found: ['{col}']")
+        series = df[col]
+        if groups is not None:
+            if col not in groups.keys:
+                raise QueryError(f"❌ Column `{col}` must appear in GROUP BY or be used in an aggregate function")
+            series = groups[col].first()
+        return _Value(series, money=is_cents(series.dtype))
+    if kind == "agg":
+        _, func, arg_node, distinct = node
+        arg = None if arg_node == ("star",) else _eval(arg_node, df, None)
+        return _aggregate(func, arg, distinct, df, groups)
+    _, op, left, right = node
+    return _arith(op, _eval(left, df, groups), _eval(right, df, groups))
+
+def project(df, columns_part, group_by=None):
+    """SELECT-список с выражениями/агрегатами/GROUP BY → DataFrame (деньги — Int64 центов)"""
+    items = []
+    for item in _split_items(columns_part):
+        alias_match = re.match(r"^(.*?)(?:\s+as\s+|(?<=\))\s+)(\w+)$", item, re.IGNORECASE | re.DOTALL)
+        expr, alias = (alias_match.group(1), alias_match.group(2)) if alias_match else (item, None)
+        if expr.strip() == "*":
+            raise QueryError("❌ `*` cannot be combined with expressions or GROUP BY")
+        node = _parse_expr(_tokenize_expr(expr))
+        items.append((alias or re.sub(r"\b[a-zA-Z_]\w*\.(?=[a-zA-Z_])", "", expr.strip()), node))
+
+    keys = [k.strip().split(".")[-1] for k in group_by.split(",")] if group_by else []
+    missing = [k for k in keys if k not in df.columns]
+    if missing:
+        raise QueryError(f"❌ GROUP BY columns not found: {missing}")
+    aggregated = bool(keys) or any(_has_aggregate(node) for _, node in items)
+
+    if not aggregated:
+        return pd.DataFrame({name: _eval(node, df, None).data for name, node in items}, index=df.index)
+
+    # Группировка по кодам категорий (observed=True) и целым центам — без строк и float
+    groups = df.groupby(keys, observed=True, sort=True, dropna=False) if keys else None
+    columns = {}
+    for name, node in items:
+        value = _eval(node, df, groups)
+        data = value.data
+        if groups is None:
+            data = pd.array([data], dtype="Int64") if value.money else [data]
+        elif value.money and not is_cents(data.dtype):
+            data = data.astype("Int64")
+        columns[name] = data
+    result = pd.DataFrame(columns)
+    return result.reset_index(drop=True)
+
 class SQLSimulator:
-    def __init__(self, demo_data):
-        """demo_data — dict с таблицами из get_demo_database()"""
+    def __init__(self, demo_data, result_cache=None, data_version=None):
+        """demo_data — dict с таблицами из get_demo_database() (списки строк или готовые DataFrame)
+        result_cache — QueryResultCache для SELECT по базовым данным (None — без кэша)
+        data_version — версия данных, если уже известна (колоночный кэш); иначе — хэш содержимого"""
         self.tables = {
-            "processing_operations": pd.DataFrame(demo_data["processing_operations"]),
-            "partner_a_payments": pd.DataFrame(demo_data["partner_a_payments"]),
-            "partner_b_payments": pd.DataFrame(demo_data["partner_b_payments"]),
-            "operation_additional_data": pd.DataFrame(demo_data["operation_additional_data"]),
-            "registry_statuses": pd.DataFrame(demo_data["registry_statuses"]),
-            "commission_rates": pd.DataFrame(demo_data["commission_rates"])
+            name: rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+            for name, rows in demo_data.items()
         }
         self._prepare_data_types()
+        self._output_tables = {}
+        self.result_cache = result_cache
+        # Версия базовых данных — часть ключа кэша результатов
+        self.data_version = data_version or hashlib.blake2b(b"".join(
+            name.encode() + pd.util.hash_pandas_object(df, index=True).values.tobytes()
+            for name, df in self.tables.items()
+        ), digest_size=8).hexdigest()
 
     def _prepare_data_types(self):
-        for df in self.tables.values():
-            for col in df.columns:
-                if df[col].dtype == 'object':
-                    try:
-                        df[col] = pd.to_numeric(df[col], errors='ignore')
-                    except:
-                        pass
-
-    def execute_sql(self, sql_query):
+        prepare_tables(self.tables)
+
+    def _output_table(self, table_name):
+        """Базовая таблица с деньгами вместо центов — считается один раз на таблицу"""
+        output = self._output_tables.get(table_name)
+        if output is None:
+            output = self._output_tables[table_name] = to_output(self.tables[table_name])
+        return output
+
+    def has_table(self, table_name, overlay=None):
+        return table_name in self.tables or (overlay is not None and table_name in overlay.created_tables)
+
+    def _table(self, table_name, overlay=None):
+        if overlay is not None and table_name in overlay.created_tables:
+            return overlay.created_tables[table_name]
+        base_df = self.tables[table_name]
+        if overlay is not None:
+            return overlay.merge(table_name, base_df)
+        return base_df
+
+    def execute_sql(self, sql_query, overlay=None):
         try:
             sql_lower = sql_query.lower().strip()
             
             if sql_lower.startswith('select'):
-                return self._execute_select(sql_query)
+                # Кэш только для базовых данных: у сессии с приватными изменениями свои результаты
+                if self.result_cache is None or (overlay is not None and not overlay.is_empty()):
+                    return self._execute_select(sql_query, overlay)
+                key = (query_fingerprint(sql_query), self.data_version)
+                cached = self.result_cache.get(key)
+                if cached is not None:
+                    return cached
+                result, feedback = self._execute_select(sql_query, overlay)
+                if result is not None:
+                    self.result_cache.put(key, result, feedback)
+                return result, feedback
             elif any(kw in sql_lower for kw in ['update', 'insert', 'delete', 'drop', 'alter', 'create', 'truncate']):
                 return None, "❌ ERROR: DML/DDL operations are not allowed in sandbox"
             else:
@@ -38,9 +734,10 @@ class SQLSimulator:
         except Exception as e:
             return None, f"❌ Execution error: {str(e)}"
 
-    def _execute_select(self, sql_query):
+    def _execute_select(self, sql_query, overlay=None):
         try:
-            sql_lower = sql_query.lower().strip()
+            sql_query = sql_query.strip()
+            sql_lower = sql_query.lower()
             
             # Базовый парсинг SELECT ... FROM
             select_pattern = r'select\s+(.*?)\s+from\s+(\w+)(?:\s+(?:as\s+)?(\w+))?'
@@ -52,23 +749,37 @@ class SQLSimulator:
             table_name = select_match.group(2)
             table_alias = select_match.group(3)
 
-            if table_name not in self.tables:
+            if not self.has_table(table_name, overlay):
                 return None, f"❌ Table not found: `{table_name}`"
 
-            result = self.tables[table_name].copy()
+            base = self._table(table_name, overlay)
+            where_match = re.search(r'where\s+(.*?)(?=\s+(?:order\s+by|group\s+by|limit)|\s*;?\s*$)', sql_lower, re.IGNORECASE | re.DOTALL)
+            group_match = re.search(r'group\s+by\s+(.+?)(?=\s+(?:having|order\s+by|limit)\b|\s*;?\s*$)', sql_lower, re.IGNORECASE | re.DOTALL)
+            group_by = group_match.group(1) if group_match else None
+            projection = needs_projection(columns_part, group_by)
+            if base is self.tables.get(table_name) and not where_match and not projection and 'join' not in sql_lower:
+                # Только выбор колонок, ORDER BY, LIMIT — по базовой таблице, уже переведённой в деньги
+                # (порядок центов и денежных значений совпадает)
+                base = self._output_table(table_name)
+            result = base
 
             # Обработка JOIN
             if 'join' in sql_lower:
-                result = self._apply_joins(sql_query, result, table_name)
+                result = self._apply_joins(sql_query, result, table_name, overlay)
 
             # Обработка WHERE
-            where_match = re.search(r'where\s+(.*?)(?=\s+(?:order\s+by|group\s+by|limit|$))', sql_lower, re.IGNORECASE)
             if where_match:
-                where_condition = where_match.group(1)
+                # Условие берём из исходного запроса — литералы ('PA023') чувствительны к регистру
+                where_condition = sql_query[where_match.start(1):where_match.end(1)]
                 result = self._apply_where_condition(result, where_condition, table_alias)
 
             # Обработка SELECT колонок
-            if columns_part == '*':
+            if projection:
+                try:
+                    result = project(result, columns_part, group_by)
+                except QueryError as e:
+                    return None, str(e)
+            elif columns_part == '*':
                 pass
             else:
                 clean_columns = self._parse_columns(columns_part, table_alias, result.columns)
@@ -79,27 +790,36 @@ class SQLSimulator:
 
             # Обработка ORDER BY
             order_match = re.search(r'order\s+by\s+(\w+)(?:\s+(asc|desc))?', sql_lower, re.IGNORECASE)
+            limit_match = re.search(r'limit\s+(\d+)', sql_lower, re.IGNORECASE)
+            limit = int(limit_match.group(1)) if limit_match else None
             if order_match:
                 col = order_match.group(1)
                 asc = order_match.group(2) != 'desc'
-                if col in result.columns:
-                    result = result.sort_values(col, ascending=asc)
-                else:
+                if col not in result.columns:
                     return None, f"❌ ORDER BY column not found: `{col}`"
+                series = result[col]
+                if pd.api.types.is_numeric_dtype(series.dtype) and not series.hasnans:
+                    # Числовая колонка (в т.ч. центы Int64) — argsort по numpy-массиву
+                    values = series.to_numpy(dtype="float64")
+                    order = np.argsort(values if asc else -values, kind="stable")
+                    result = result.iloc[order[:limit] if limit is not None else order]
+                else:
+                    result = result.sort_values(col, ascending=asc)
 
-            # Обработка LIMIT
-            limit_match = re.search(r'limit\s+(\d+)', sql_lower, re.IGNORECASE)
-            if limit_match:
-                limit = int(limit_match.group(1))
-                result = result.head(limit)
+            # Обработка LIMIT (срез без копии: результат — новый кадр или copy-on-write представление)
+            if limit is not None:
+                result = result.iloc[:limit]
 
             # 🔒 Защита от DoS: лимит 1000 строк
             if len(result) > 1000:
                 warning = f" (showing first 1000 of {len(result)} rows)"
-                result = result.head(1000)
-                return result, "✅ Query executed" + warning
+                return to_output(result.iloc[:1000]), "✅ Query executed" + warning
 
-            return result, "✅ Query executed successfully"
+            # Центы → деньги — только у оставшихся строк и колонок
+            result = to_output(result)
+            # Без фильтров и проекции — не отдаём наружу саму базовую таблицу
+            # (поверхностной копии достаточно: copy-on-write не даст изменить базу через результат)
+            return (result.copy(deep=False) if result is base else result), "✅ Query executed successfully"
 
         except Exception as e:
             return None, f"❌ Query execution failed: {str(e)}"
@@ -117,7 +837,7 @@ class SQLSimulator:
             cols.append(col)
         return cols
 
-    def _apply_joins(self, sql_query, base_df, base_table):
+    def _apply_joins(self, sql_query, base_df, base_table, overlay=None):
         sql_lower = sql_query.lower()
         
         # Поддержка INNER и LEFT JOIN
@@ -129,15 +849,15 @@ class SQLSimulator:
         for kw, join_type in join_types:
             if kw in sql_lower:
                 # Ищем первую JOIN-клаузулу
-                pattern = rf'{kw}\s+(\w+)(?:\s+as\s+(\w+))?\s+on\s+(.*?)(?=\s+(?:where|order\s+by|limit|$|inner\s+join|left\s+join))'
+                pattern = rf'{kw}\s+(\w+)(?:\s+(?:as\s+)?(?!on\b)(\w+))?\s+on\s+(.*?)(?=\s+(?:where|group\s+by|order\s+by|limit|inner\s+join|left\s+join)|\s*;?\s*$)'
                 match = re.search(pattern, sql_lower, re.IGNORECASE)
                 if match:
                     join_table = match.group(1)
                     join_alias = match.group(2)
                     condition = match.group(3)
                     
-                    if join_table in self.tables:
-                        right_df = self.tables[join_table]
+                    if self.has_table(join_table, overlay):
+                        right_df = self._table(join_table, overlay)
                         result = self._perform_join(base_df, right_df, condition, join_type)
                         return result
         
@@ -157,48 +877,150 @@ class SQLSimulator:
                                   how=how)
         return left_df
 
-    def _apply_where_condition(self, df, condition, table_alias=None):
+    def _apply_where_condition(self, df, condition, table_alias=None, strict=False):
+        """strict — для DML: нераспознанное условие → ValueError, а не все строки"""
         try:
-            # Нормализация: !=, <> → !=
-            cond = condition.replace('<>', '!=').replace('=', '==')
-            # Убираем алиасы
-            cond = re.sub(r'\b\w+\.', '', cond)
-            
-            return df.query(cond, engine='python')
+            # Нормализация: <> → !=, = → == (не трогая >=, <=, !=)
+            cond = condition.replace('<>', '!=')
+            cond = re.sub(r'(?<![<>!=])=(?!=)', '==', cond)
+            cond = re.sub(r'\b(and|or|not|in)\b', lambda m: m.group(1).lower(), cond, flags=re.IGNORECASE)
+            # Убираем алиасы (но не дробную часть чисел: 245.50)
+            cond = re.sub(r'\b[a-zA-Z_]\w*\.(?=[a-zA-Z_])', '', cond)
+            # Денежные колонки хранятся в центах — литералы переводим в центы
+            cond = _COMPARISON.sub(
+                lambda m: f"{m.group(1)} {m.group(2)} {money.to_minor(m.group(3))}"
+                if m.group(1) in df.columns and is_cents(df[m.group(1)].dtype) else m.group(0),
+                cond,
+            )
+            cond = _IN_LIST.sub(lambda m: _bind_in_list(m, df), cond)
+
+            mask = _fast_mask(df, cond)
+            if mask is not None:
+                return df[mask]
+            # Даты хранятся как datetime64 — строковые литералы передаём как Timestamp
+            dates = {}
+            def bind_date(m):
+                if m.group(1) not in df.columns or not pd.api.types.is_datetime64_any_dtype(df[m.group(1)].dtype):
+                    return m.group(0)
+                name = f"_date{len(dates)}"
+                dates[name] = pd.Timestamp(_literal_value(m.group(3)))
+                return f"{m.group(1)} {m.group(2)} @{name}"
+            cond = _TEXT_COMPARISON.sub(bind_date, cond)
+            return df.query(cond, engine='python', local_dict=dates)
         except:
-            return self._manual_where(df, condition)
+            return self._manual_where(df, condition, strict)
 
-    def _manual_where(self, df, condition):
-        condition = condition.strip().lower()
+    def _manual_where(self, df, condition, strict=False):
+        original = condition
+        condition = re.sub(r'\b[a-zA-Z_]\w*\.(?=[a-zA-Z_])', '', condition.strip().lower())
+        # Сравнения — по значениям в единицах пользователя, строки берём из df
+        view = to_output(df)
         
         if '=' in condition and '>=' not in condition and '<=' not in condition and '!=' not in condition and '<>' not in condition:
             col, val = condition.split('=', 1)
             col, val = col.strip(), val.strip().strip("'\"")
-            return df[df[col].astype(str) == val]
+            self._check_where_column(view, col, original, strict)
+            return df[view[col].astype(str) == val]
         
         elif '>' in condition and '>=' not in condition:
             col, val = condition.split('>', 1)
             col, val = col.strip(), val.strip()
+            self._check_where_column(view, col, original, strict)
             try:
-                return df[df[col] > float(val)]
+                return df[view[col] > float(val)]
             except:
-                return df[df[col].astype(str) > val]
+                return df[view[col].astype(str) > val]
         
         elif ' in (' in condition:
             col, vals = condition.split(' in (', 1)
             col = col.strip()
+            self._check_where_column(view, col, original, strict)
             vals = [v.strip().strip("'\"") for v in vals.rstrip(')').split(',')]
-            return df[df[col].astype(str).isin(vals)]
+            if is_cents(df[col].dtype):
+                # Центы сравниваем как числа: '245.50' и 245.5 — одно значение
+                return df[df[col].isin([money.to_minor(v) for v in vals])]
+            return df[view[col].astype(str).isin(vals)]
         
+        if strict:
+            raise ValueError(f"Unsupported WHERE condition: {original}")
         return df
 
+    @staticmethod
+    def _check_where_column(view, col, condition, strict):
+        # Слева от оператора не колонка (LIKE ... AND x = 1 и т.п.) — условие не разобрано
+        if strict and col not in view.columns:
+            raise ValueError(f"Unsupported WHERE condition: {condition}")
+
+    def apply_dml(self, statement, overlay):
+        """UPDATE ... SET ... WHERE / INSERT INTO ... VALUES в приватный overlay сессии.
+        Возвращает (images, сообщение), images — [(table, key, before, after, state)],
+        где state — состояние строки в overlay до изменения (для отката). При ошибке images = None"""
+        statement = statement.strip().rstrip(';').strip()
+
+        update_match = re.match(r'update\s+(\w+)\s+set\s+(.*?)\s+where\s+(.+)$', statement, re.IGNORECASE | re.DOTALL)
+        if update_match:
+            table_name, set_part, condition = update_match.groups()
+            table_name = table_name.lower()
+            if table_name not in self.tables:
+                return None, f"❌ Table not found: `{table_name}`"
+            base_df = self.tables[table_name]
+            values = {}
+            for col, raw in re.findall(rf"(\w+(?:\.\w+)?)\s*=\s*({_LITERAL})", set_part):
+                col = col.split('.')[-1].lower()
+                if col not in base_df.columns:
+                    return None, f"❌ Column not found: `{col}`"
+                values[col] = _parse_literal(raw)
+            if not values:
+                return None, "❌ Invalid UPDATE syntax. Expected: UPDATE table SET col=value WHERE condition"
+
+            try:
+                matched = self._apply_where_condition(overlay.merge(table_name, base_df), condition, strict=True)
+            except ValueError as e:
+                return None, f"❌ {e}. Supported: =, <>, <, >, <=, >=, IN (...), AND/OR"
+            images = []
+            for key in matched.index:
+                key = int(key)
+                state = overlay.snapshot_row(base_df, table_name, key)
+                before, after = overlay.set_values(base_df, table_name, key, values)
+                images.append((table_name, key, before, after, state))
+            return images, f"✅ Updated rows: {len(images)}"
+
+        insert_match = re.match(r'insert\s+into\s+(\w+)\s*\((.*?)\)\s*values\s*(.+)$', statement, re.IGNORECASE | re.DOTALL)
+        if insert_match:
+            table_name, columns_part, values_part = insert_match.groups()
+            table_name = table_name.lower()
+            if table_name not in self.tables:
+                return None, f"❌ Table not found: `{table_name}`"
+            base_df = self.tables[table_name]
+            columns = [c.strip().lower() for c in columns_part.split(',')]
+            missing = [c for c in columns if c not in base_df.columns]
+            if missing:
+                return None, f"❌ Columns not found: {missing}"
+            parsed_rows = []
+            for raw_row in re.findall(r'\(((?:[^()\']|\'(?:[^\']|\'\')*\')*)\)', values_part):
+                raw_values = re.findall(_LITERAL, raw_row)
+                if len(raw_values) != len(columns):
+                    return None, "❌ INSERT: number of values does not match number of columns"
+                parsed_rows.append(dict(zip(columns, map(_parse_literal, raw_values))))
+            images = []
+            for row in parsed_rows:
+                key = overlay.insert_row(base_df, table_name, row)
+                images.append((table_name, key, None, overlay.get_row(base_df, table_name, key), None))
+            return images, f"✅ Inserted rows: {len(images)}"
+
+        return None, "❌ Only UPDATE ... WHERE and INSERT INTO ... VALUES are supported"
+
+    def restore_images(self, images, overlay):
+        """Откат изменений apply_dml — O(кол-во изменённых строк)"""
+        for table_name, key, _, _, state in reversed(images):
+            overlay.restore_row(self.tables[table_name], table_name, key, state)
+
 # 🔥 Кэширование — критично для скорости
 @st.cache_resource
 def get_sql_simulator():
-    from database import get_demo_database
-    demo_data = get_demo_database()
-    return SQLSimulator(demo_data)
+    from columnar_store import demo_version, load_demo_tables
+    return SQLSimulator(load_demo_tables(), result_cache=QueryResultCache(), data_version=demo_version())
 
-def validate_sql_query(sql_query):
+def validate_sql_query(sql_query, overlay=None):
     simulator = get_sql_simulator()
-    return simulator.execute_sql(sql_query)
+    return simulator.execute_sql(sql_query, overlay)
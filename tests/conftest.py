@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def simulator():
+    from columnar_store import demo_version, load_demo_tables
+    from sql_validator import QueryResultCache, SQLSimulator
+    return SQLSimulator(load_demo_tables(), result_cache=QueryResultCache(), data_version=demo_version())
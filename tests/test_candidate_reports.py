@@ -0,0 +1,52 @@
+import random
+
+from candidate_reports import BLOCKS, CandidateReportStore
+
+WEIGHTS = {"soft_skills": 20, "hard_skills": 30, "data_integrity": 40, "process_documentation": 10}
+
+
+def test_top_k_follows_incremental_updates():
+    rng = random.Random(7)
+    store = CandidateReportStore()
+    ids = [f"c{i}" for i in range(200)]
+    for cid in ids:
+        store.register(cid, cid, "alex_data")
+    first = [row["candidate_id"] for row in store.query(WEIGHTS, top_k=10)]
+    for _ in range(2000):
+        cid, block = rng.choice(ids), rng.choice(BLOCKS)
+        store.ingest_event(cid, "chat")
+        store.ingest_score(cid, block, 5, rng.randint(0, 100))
+    top = store.query(WEIGHTS, top_k=10)
+    expected = sorted(
+        ids, key=lambda cid: -sum(store._candidates[cid]["scores"][b] * WEIGHTS[b] for b in BLOCKS))
+    assert [row["total"] for row in top] == [
+        round(sum(store._candidates[cid]["scores"][b] * WEIGHTS[b] for b in BLOCKS) / 100, 1)
+        for cid in expected[:10]]
+    assert top != first
+    assert sum(row["events"] for row in store.query(WEIGHTS, sort_by="events")) == 2000
+
+
+def test_capacity_and_idle_sessions_are_evicted():
+    store = CandidateReportStore(capacity=3)
+    for i in range(5):
+        store.register(f"c{i}", f"c{i}", "alex_data")
+    store.ingest_event("c2", "sql")
+    store.register("c5", "c5", "alex_data")
+    assert len(store) == 3
+    assert "c2" in {row["candidate_id"] for row in store.query(WEIGHTS)}
+
+    store.idle_ttl = -1
+    assert store.query(WEIGHTS) == []
+    assert len(store) == 0
+
+
+def test_idle_session_is_not_ranked():
+    store = CandidateReportStore()
+    store.register("idle", "idle", "alex_data")
+    store.register("active", "active", "alex_data")
+    assert store.query(WEIGHTS) == []
+    store.ingest_event("active", "sql")
+    for sort_by in ("total", "events", "hard_skills"):
+        assert [row["candidate_id"] for row in store.query(WEIGHTS, sort_by=sort_by)] == ["active"]
+    store.ingest_event("idle", "chat")
+    assert {row["candidate_id"] for row in store.query(WEIGHTS)} == {"active", "idle"}
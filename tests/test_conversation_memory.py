@@ -0,0 +1,72 @@
+from conversation_memory import ConversationMemory, estimate_tokens, history_before
+
+
+def _chat(n, size=90):
+    return [{"role": "user" if i % 2 == 0 else "bot",
+             "content": f"Реплика {i}. " + "x" * size} for i in range(n)]
+
+
+def test_history_is_cut_at_pending_message_index():
+    chat = _chat(4)
+    chat.append({"role": "user", "content": "Вопрос"})
+    pending = len(chat) - 1
+    # Пока ждём ответа, сценарий дописал в чат сообщение и «печатает…»
+    chat.insert(2, {"role": "bot", "content": "…", "typing": True})
+    pending += 1
+    chat.append({"role": "bot", "content": "Сообщение сценария после вопроса"})
+    history = history_before(chat, pending)
+    assert [m["content"] for m in history] == [m["content"] for m in _chat(4)]
+    assert history_before(chat, 0) == []
+
+
+def test_recent_turns_fit_budget_and_older_are_summarized():
+    memory = ConversationMemory(budget=200, summary_budget=60)
+    chat = _chat(12)
+    context = memory.context("alice", chat)
+    summary, recent = context[0], context[1:]
+    assert summary["role"] == "system"
+    assert summary["content"].startswith("Ранее в переписке:")
+    assert recent[-1]["content"] == chat[-1]["content"]
+    assert sum(estimate_tokens(m["content"]) for m in recent) <= memory.budget - memory.summary_budget
+    assert memory.tokens(context) <= memory.budget
+    # В содержании — первые предложения самых поздних свёрнутых реплик
+    assert summary["content"].endswith(f"Реплика {len(chat) - len(recent) - 1}.")
+    assert [m["role"] for m in recent] == ["user" if m["role"] == "user" else "assistant"
+                                           for m in chat[-len(recent):]]
+
+
+def test_summary_is_incremental_and_reset_when_chat_is_cleared():
+    memory = ConversationMemory(budget=200, summary_budget=100)
+    chat = _chat(12)
+    memory.context("alice", chat[:8])
+    covered = memory.summaries["alice"]["covered"]
+    lines = list(memory.summaries["alice"]["lines"])
+    memory.context("alice", chat[:8])
+    assert memory.summaries["alice"]["lines"] == lines
+    memory.context("alice", chat)
+    summary = memory.summaries["alice"]
+    assert summary["covered"] > covered
+    assert summary["lines"][-1].endswith(f"Реплика {summary['covered'] - 1}.")
+    # Прежние строки не пересчитываются: остаются их последние, в том же порядке, затем — новые
+    kept = [line for line in lines if line in summary["lines"]]
+    assert kept == lines[len(lines) - len(kept):]
+    assert summary["lines"][:len(kept)] == kept
+
+    assert memory.context("alice", []) == []
+    assert memory.summaries["alice"] == {"covered": 0, "lines": []}
+
+
+def test_single_message_longer_than_window_keeps_its_end():
+    memory = ConversationMemory(budget=100, summary_budget=40)
+    text = "начало " + "y" * 1000 + " конец"
+    context = memory.context("dba_team", [{"role": "user", "content": text}])
+    assert len(context) == 1
+    assert context[0]["content"].startswith("…") and context[0]["content"].endswith(" конец")
+    assert estimate_tokens(context[0]["content"]) <= memory.budget
+
+
+def test_empty_and_typing_messages_are_skipped():
+    memory = ConversationMemory()
+    chat = [{"role": "user", "content": ""}, {"role": "bot", "content": "…", "typing": True},
+            {"role": "user", "content": "Привет"}]
+    assert memory.context("maxim", chat) == [{"role": "user", "content": "Привет"}]
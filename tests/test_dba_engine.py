@@ -0,0 +1,41 @@
+import pytest
+
+from dba_engine import DBAEngine, TransactionLog
+from sql_validator import DataOverlay
+
+
+@pytest.fixture
+def engine(simulator):
+    engine = DBAEngine(simulator, DataOverlay(), TransactionLog())
+    reply, applied = engine.execute_request(
+        "CREATE TABLE processing_operations_backup AS SELECT * FROM processing_operations;\n"
+        "UPDATE processing_operations SET status = 'failed' WHERE processing_id = 'PA001'")
+    assert len(applied) == 2, reply
+    return engine
+
+
+@pytest.mark.parametrize("message, entry_id", [
+    ("rollback", 2),
+    ("  Откат  ", 2),
+    ("откати #1", 1),
+    ("ROLLBACK 2.", 2),
+    ("откатить 1!", 1),
+])
+def test_explicit_rollback_command(engine, message, entry_id):
+    reply, applied = engine.execute_request(message)
+    assert reply.startswith("↩️ Откат выполнен")
+    assert applied == []
+    assert [e["id"] for e in engine.log.active()] == list(range(1, entry_id))
+
+
+@pytest.mark.parametrize("message", [
+    "не надо откатывать",
+    "откатывать пока рано",
+    "Откат не нужен, всё верно, спасибо за 2 операции",
+    "если что, сделаем rollback 1 позже",
+    "проверил 3 строки, откат не требуется",
+])
+def test_mentions_of_rollback_are_not_commands(engine, message):
+    reply, applied = engine.execute_request(message)
+    assert reply is None and applied == []
+    assert [e["id"] for e in engine.log.active()] == [1, 2]
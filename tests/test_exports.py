@@ -0,0 +1,22 @@
+import pandas as pd
+import pytest
+
+from exports import to_csv, to_parquet
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({"id": [f"PA{i:03d}" for i in range(7)], "amount": [i * 1.5 for i in range(7)]})
+
+
+def test_chunked_csv_matches_whole_frame(frame):
+    assert to_csv(frame, chunk_rows=3).read() == frame.to_csv(index=False).encode("utf-8")
+    assert to_csv(frame.iloc[:0]).read() == frame.iloc[:0].to_csv(index=False).encode("utf-8")
+
+
+def test_parquet_round_trip_with_row_group_per_chunk(frame):
+    pq = pytest.importorskip("pyarrow.parquet")
+    data = to_parquet(frame, chunk_rows=3)
+    assert pq.ParquetFile(data).num_row_groups == 3
+    data.seek(0)
+    pd.testing.assert_frame_equal(pd.read_parquet(data), frame)
@@ -0,0 +1,65 @@
+import pytest
+
+from intents import DEFAULT_REPLY, INTENTS, IntentIndex, fallback_reply, tokenize
+
+
+@pytest.fixture(scope="module")
+def index():
+    return IntentIndex(INTENTS)
+
+
+def _id(index, character, message):
+    intent = index.resolve(character, message)
+    return intent and intent["id"]
+
+
+@pytest.mark.parametrize("character, message, intent_id", [
+    ("alice", "Максим попросил посчитать", "new_task"),
+    ("alice", "Как считать ВЫРУЧКУ?", "revenue"),
+    ("alice", "Нашёл расхождения в статусах", "status_mismatch"),
+    ("alice", "помоги с SQL", "sql_help"),
+    ("alice", "привет", "default"),
+    ("maxim", "Когда нужен результат?", "deadline"),
+    ("kirill", "Это срочно?", "urgency"),
+])
+def test_stems_match_word_forms_by_priority(index, character, message, intent_id):
+    assert _id(index, character, message) == intent_id
+
+
+def test_earlier_intent_wins_when_several_match(index):
+    # «выручка» и «статус» — первым в таблице Алисы стоит revenue
+    assert _id(index, "alice", "статус выручки") == "revenue"
+    assert _id(index, "maxim", "выручка к какому сроку?") == "revenue"
+
+
+def test_every_keyword_group_must_match(index):
+    assert _id(index, "dba_team", "UPDATE t SET a = 1 WHERE id = 2") == "execute"
+    assert _id(index, "dba_team", "UPDATE t SET a = 1") == "bad_format"
+    assert _id(index, "dba_team", "where это?") == "default"
+
+
+def test_stem_must_start_the_word(index):
+    # «доход» внутри слова не считается, «ё» приводится к «е»
+    assert _id(index, "alice", "бездоходный") == "default"
+    assert tokenize("Ещё ёлка, ЕЩЁ") == {"еще", "елка"}
+
+
+def test_unknown_character_and_empty_message(index):
+    assert index.resolve("nobody", "выручка") is None
+    assert fallback_reply("nobody", "выручка") == DEFAULT_REPLY
+    assert _id(index, "alice", "") == "default"
+    assert _id(index, "kirill", "   ") == "default"
+
+
+def test_fallback_reply_comes_from_resolved_intent():
+    responses = {r for intent in INTENTS["partner_b"] if intent["id"] == "status_mismatch"
+                 for r in intent["responses"]}
+    for _ in range(5):
+        assert fallback_reply("partner_b", "Статусы расходятся") in responses
+
+
+def test_index_without_default_intent_returns_none():
+    index = IntentIndex({"bot": [{"id": "hi", "keywords": [["привет"]], "responses": ["Привет"]}]})
+    assert index.reply("bot", "приветствую") == "Привет"
+    assert index.resolve("bot", "пока") is None
+    assert index.reply("bot", "пока") == DEFAULT_REPLY
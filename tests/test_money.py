@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+import money
+
+
+@pytest.mark.parametrize("value, minor", [
+    (245.505, 24551),
+    (2.675, 268),     # во float это 2.67499…, но округляем десятичное значение
+    (1.015, 102),
+    ("0.125", 13),
+    (0.005, 1),
+    (-0.005, -1),     # half-up — от нуля, симметрично для отрицательных
+    (-245.505, -24551),
+    (0, 0),
+])
+def test_to_minor_rounds_half_cents_away_from_zero(value, minor):
+    assert money.to_minor(value) == minor
+
+
+def test_to_minor_array_matches_scalar_for_two_decimals():
+    values = [245.5, -0.01, 1.15, 0.1, 99999.99]
+    assert money.to_minor_array(values).tolist() == [money.to_minor(v) for v in values]
+    assert money.to_minor_array(values).dtype == np.int64
+
+
+@pytest.mark.parametrize("numerator, expected", [(5, 1), (-5, -1), (4, 0), (-4, 0), (15, 2), (-15, -2), (14, 1)])
+def test_div_half_up_scalar_and_vector_agree(numerator, expected):
+    assert money.div_half_up(numerator, 10) == expected
+    assert money.div_half_up(np.array([numerator]), 10).tolist() == [expected]
+
+
+def test_multiply_and_commission_round_to_the_cent():
+    assert money.scaled(0.015) == (15, 1000)
+    assert money.scaled(2) == (2, 1)
+    assert money.multiply(1001, 0.015) == 15      # 15.015 цента
+    assert money.multiply(-1001, 0.015) == -15
+    assert money.multiply(100, 2) == 200
+    assert money.rate_units(0.015) == 150
+    assert money.commission(24550, 0.015, 30) == 398  # 245.50 × 1.5% = 3.6825 → 3.68 + 0.30
+    amounts = np.array([24550, 10050, -10050])
+    assert money.commission(amounts, 0.015, 30).tolist() == [398, 181, -121]
+
+
+def test_total_is_exact_where_float_sum_drifts():
+    values = [0.1] * 10
+    assert sum(values) != 1.0
+    assert money.total(money.to_minor_array(values)) == 100
+    assert money.from_minor(24551) == 245.51
+    assert money.from_minor([1, -1]).tolist() == [0.01, -0.01]
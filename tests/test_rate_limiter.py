@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+import ai_client
+from rate_limiter import LLMRateLimiter, RateLimited, TokenBucket
+
+
+def test_bucket_allows_burst_then_waits_for_refill():
+    bucket = TokenBucket(rate=2.0, burst=3)
+    now = bucket.updated
+    for _ in range(3):
+        assert bucket.wait_time(now) == 0
+        bucket.take(now)
+    assert bucket.wait_time(now) == pytest.approx(0.5)
+    assert bucket.wait_time(now + 0.5) == 0
+    # Простой не копит токенов больше burst
+    assert bucket.wait_time(now + 100) == 0 and bucket.tokens == 3
+
+
+def test_429_pause_blocks_tokens_and_resets_bucket():
+    bucket = TokenBucket(rate=10.0, burst=5)
+    now = bucket.updated
+    bucket.pause(now, 2.0)
+    assert bucket.wait_time(now + 0.5) == pytest.approx(1.5)
+    bucket.pause(now + 0.5, 0.1)  # более короткая пауза не сокращает текущую
+    assert bucket.wait_time(now + 1.9) == pytest.approx(0.1)
+    # За паузу токены не копятся: после неё — один токен через 1/rate, а не пачка burst
+    assert bucket.wait_time(now + 2.0) == pytest.approx(0.1)
+    assert bucket.wait_time(now + 2.1) == 0
+    bucket.take(now + 2.1)
+    assert bucket.wait_time(now + 2.1) > 0
+
+
+def test_throttle_delays_next_request():
+    limiter = LLMRateLimiter(rate=100.0, burst=5, max_wait=2.0)
+    limiter.throttle(0.3)
+    started = time.monotonic()
+    with limiter.slot("s1"):
+        pass
+    assert time.monotonic() - started >= 0.25
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_throttle_longer_than_max_wait_falls_back():
+    limiter = LLMRateLimiter(rate=100.0, burst=5, max_wait=0.1)
+    limiter.throttle(5.0)
+    with pytest.raises(RateLimited) as error:
+        limiter.acquire("s1")
+    assert error.value.reason == "timeout"
+    stats = limiter.stats()
+    assert stats["timed_out"] == 1 and stats["queue_depth"] == 0 and stats["in_flight"] == 0
+
+
+def test_full_queue_rejects_immediately():
+    limiter = LLMRateLimiter(rate=100.0, burst=5, max_in_flight=1, max_queue=1, max_wait=1.0)
+    limiter.acquire("busy")
+    waiter = threading.Thread(target=lambda: limiter.slot("s1").__enter__())
+    waiter.start()
+    while limiter.stats()["queue_depth"] < 1:
+        time.sleep(0.001)
+    with pytest.raises(RateLimited) as error:
+        limiter.acquire("s2")
+    assert error.value.reason == "queue_full"
+    limiter.release()
+    waiter.join()
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_sessions_are_served_round_robin_and_priority_first():
+    limiter = LLMRateLimiter(rate=1000.0, burst=100, max_in_flight=1, max_wait=5.0)
+    limiter.acquire("blocker")
+    order = []
+
+    def request(session, priority=False):
+        with limiter.slot(session, priority):
+            order.append(session)
+
+    threads = []
+    for session, priority in [("a", False), ("a", False), ("a", False), ("b", False), ("c", True)]:
+        thread = threading.Thread(target=request, args=(session, priority))
+        thread.start()
+        threads.append(thread)
+        while limiter.stats()["queue_depth"] < len(threads):
+            time.sleep(0.001)
+    limiter.release()
+    for thread in threads:
+        thread.join()
+    assert order == ["c", "a", "b", "a", "a"]
+
+
+class _TooManyRequests(Exception):
+    status_code = 429
+
+
+class _Client:
+    class chat:
+        class completions:
+            @staticmethod
+            def create(**kwargs):
+                raise _TooManyRequests("rate limit")
+
+
+def test_provider_429_throttles_shared_limiter(monkeypatch):
+    limiter = LLMRateLimiter()
+    monkeypatch.setattr(ai_client, "get_rate_limiter", lambda: limiter)
+    client = ai_client.OpenAIClient()
+    client.client = _Client()
+    assert client._try_openai("alice", "привет", [], "s1") is None
+    assert limiter.stats()["throttled"] == 1
+    assert limiter.bucket.wait_time(time.monotonic()) > 0
+    assert limiter.stats()["in_flight"] == 0
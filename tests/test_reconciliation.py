@@ -0,0 +1,88 @@
+import pytest
+
+from reconciliation import reconcile
+
+
+def _op(pid, amount, status, commission, partner):
+    return {"processing_id": pid, "amount": amount, "currency": "EUR", "status": status,
+            "commission_amount": commission, "partner_contract_id": partner}
+
+
+@pytest.fixture
+def tables():
+    return {
+        "processing_operations": [
+            _op("PA001", 100.00, "success", 1.80, "PARTNER_A"),  # совпадает
+            _op("PA002", 200.00, "success", 3.30, "PARTNER_A"),  # у партнёра DECLINED
+            _op("PA003", 50.00, "success", 1.00, "PARTNER_A"),   # комиссия не по ставке (1.05)
+            _op("PA004", 10.00, "pending", 0.45, "PARTNER_A"),   # нет в реестре
+            _op("PB001", 80.00, "success", 1.60, "PARTNER_B"),   # дубль у нас
+            _op("PB001", 80.00, "success", 1.60, "PARTNER_B"),
+        ],
+        "commission_rates": [
+            {"partner_contract_id": "PARTNER_A", "commission_percent": 0.015, "fixed_commission": 0.30},
+            {"partner_contract_id": "PARTNER_B", "commission_percent": 0.02, "fixed_commission": 0.0},
+        ],
+        "registry_statuses": [
+            {"registry_id": "RA1", "is_excluded": 0},
+            {"registry_id": "RA_OLD", "is_excluded": 1},
+            {"registry_id": "RB1", "is_excluded": 0},
+            {"registry_id": "RB2", "is_excluded": 0},
+        ],
+        "partner_a_payments": [
+            {"partner_id": "A-1", "processing_id": "PA001", "status": "COMPLETED", "commission": 1.80, "registry_id": "RA1"},
+            {"partner_id": "A-1", "processing_id": "PA001", "status": "DECLINED", "commission": 0.0, "registry_id": "RA_OLD"},
+            {"partner_id": "A-2", "processing_id": "PA002", "status": "DECLINED", "commission": 0.0, "registry_id": "RA1"},
+            {"partner_id": "A-3", "processing_id": "PA003", "status": "COMPLETED", "commission": 1.05, "registry_id": "RA1"},
+            {"partner_id": "A-9", "processing_id": "PA999", "status": "COMPLETED", "commission": 0.45, "registry_id": "RA1"},
+        ],
+        "partner_b_payments": [
+            {"partner_id": "B-1", "status": "SUCCESS", "commission": 1.60, "registry_id": "RB1"},
+            {"partner_id": "B-1", "status": "SUCCESS", "commission": 1.60, "registry_id": "RB2"},
+        ],
+        "operation_additional_data": [
+            {"processing_id": "PB001", "additional_type": "partner_operation_id", "additional_value": "B-1"},
+        ],
+    }
+
+
+def test_discrepancies_by_kind(tables):
+    rec = reconcile(tables)
+    found = {(row.kind, row.processing_id) for row in rec.discrepancies.itertuples()}
+    assert found == {
+        ("duplicate_ours", "PB001"),
+        ("status_mismatch", "PA002"),
+        ("commission_mismatch", "PA003"),
+        ("duplicate_registry", "PB001"),
+        ("missing_in_partner", "PA004"),
+        ("missing_in_ours", "PA999"),
+    }
+    # Строка из исключённого реестра (RA_OLD) не даёт ни дубля, ни расхождения статуса по PA001
+    assert "PA001" not in set(rec.discrepancies["processing_id"])
+    assert rec.discrepancy_ids() == ["PA002", "PB001"]
+
+
+def test_revenue_is_exact_in_cents(tables):
+    rec = reconcile(tables)
+    impact = dict(zip(rec.discrepancies["kind"], rec.discrepancies["revenue_impact"].astype(int)))
+    assert impact["status_mismatch"] == -19670      # 200.00 − 3.30 больше не выручка
+    assert impact["commission_mismatch"] == -5       # 1.00 → 1.05
+    assert impact["duplicate_ours"] == -7840         # 80.00 − 1.60 посчитаны дважды
+    summary = rec.summary
+    assert summary["our_revenue_minor"] == 50070
+    assert summary["expected_revenue_minor"] == 22555
+    assert summary["our_revenue_minor"] + summary["revenue_impact_minor"] == summary["expected_revenue_minor"]
+    assert summary["operations"] == 5
+
+
+def test_table_shows_money_and_russian_kinds(tables):
+    table = reconcile(tables).table()
+    row = table[table["processing_id"] == "PA003"].iloc[0]
+    assert row["kind"] == "Комиссия не совпадает с расчётной"
+    assert (row["our_commission"], row["expected_commission"]) == (1.00, 1.05)
+
+
+def test_demo_data_reconciles_to_consistent_totals(simulator):
+    summary = reconcile(simulator.tables).summary
+    assert summary["our_revenue_minor"] + summary["revenue_impact_minor"] == summary["expected_revenue_minor"]
+    assert summary["counts"]["status_mismatch"] > 0
@@ -0,0 +1,53 @@
+import pandas as pd
+import pytest
+
+from reconciliation import reconcile
+from result_fingerprint import AnswerRegistry, fingerprint
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        "processing_id": ["PA001", "PA002", None],
+        "amount": [245.5, 100.0, 12.34],
+        "created_date": pd.to_datetime(["2025-01-15", "2025-01-16", None]),
+    })
+
+
+def test_independent_of_row_and_column_order_and_names(frame):
+    shuffled = frame.iloc[[2, 0, 1], [2, 0, 1]].reset_index(drop=True)
+    renamed = frame.rename(columns={"amount": "sum_eur", "processing_id": "id"})
+    assert fingerprint(shuffled) == fingerprint(frame) == fingerprint(renamed)
+
+
+def test_equal_meaning_values_match(frame):
+    as_text = frame.assign(amount=["245.50", "100", "12.34"], created_date=["2025-01-15", "2025-01-16", None])
+    assert fingerprint(as_text) == fingerprint(frame)
+    cents = frame.assign(amount=pd.array([24550, 10000, 1234], dtype="Int64"))  # колонка в центах
+    assert fingerprint(cents) == fingerprint(frame)
+
+
+def test_different_answers_differ(frame):
+    assert fingerprint(frame.assign(amount=[245.51, 100.0, 12.34])) != fingerprint(frame)
+    assert fingerprint(frame.iloc[:2]) != fingerprint(frame)
+    assert fingerprint(frame.assign(processing_id=["PA001", "PA002", "None"])) != fingerprint(frame)  # NULL ≠ 'None'
+    # Одни и те же значения, но в других строках
+    swapped = frame.assign(amount=[100.0, 245.5, 12.34])
+    assert fingerprint(swapped) != fingerprint(frame)
+
+
+def test_duplicates_count_unless_distinct(frame):
+    doubled = pd.concat([frame, frame.iloc[:1]])
+    assert fingerprint(doubled) != fingerprint(frame)
+    assert fingerprint(doubled, distinct=True) == fingerprint(frame, distinct=True)
+
+
+def test_registry_matches_reference_answers(simulator):
+    rec = reconcile(simulator.tables)
+    registry = AnswerRegistry(rec)
+    ids = pd.DataFrame({"pid": list(reversed(rec.discrepancy_ids()))})
+    assert registry.match(ids) == ["discrepancy_ids"]
+    assert registry.match(pd.concat([ids, ids]), "revenue_mismatch") == ["discrepancy_ids"]  # как множество
+    assert registry.match(ids, "other_scenario") == []
+    assert registry.match(ids.iloc[1:]) == []
+    assert registry.match(pd.DataFrame()) == [] and registry.match(None) == []
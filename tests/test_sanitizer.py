@@ -0,0 +1,54 @@
+import pytest
+
+from sanitizer import UnsafeInput, sanitize, scan, violations
+
+
+@pytest.mark.parametrize("text, rule", [
+    ("x'; -- drop", "comment_injection"),
+    ("1; /* hidden */", "comment_injection"),
+    ("name = '' OR 1=1", "tautology"),
+    ("admin'--", "tautology"),
+    ("open ../../etc/passwd", "path_traversal"),
+    ("..\\windows", "path_traversal"),
+    ("cat /proc/self/environ", "path_traversal"),
+    ("<SCRIPT src=x>alert(1)</script>", "script"),
+    ("exec xp_cmdshell", "exec"),
+    ("drop table processing_operations", "ddl"),
+])
+def test_injection_markers_are_rejected_for_everyone(text, rule):
+    for character in (None, "alice", "dba_team", "partner_a"):
+        with pytest.raises(UnsafeInput) as error:
+            sanitize(text, character)
+        assert rule in {f["rule"] for f in error.value.findings}
+
+
+def test_policy_depends_on_recipient():
+    update = "UPDATE processing_operations SET status = 'failed' WHERE processing_id = 'PA001'"
+    backup = "CREATE TABLE processing_operations_backup AS SELECT * FROM processing_operations"
+    assert sanitize(update, "dba_team") == update
+    assert sanitize(backup, "dba_team") == backup
+    assert sanitize("Можно сделать UPDATE статусов?", "alice")
+    with pytest.raises(UnsafeInput):
+        sanitize(backup, "alice")
+    for character in ("partner_a", "maxim", None):
+        with pytest.raises(UnsafeInput):
+            sanitize(update, character)
+
+
+def test_findings_record_position_and_text():
+    text = "ok; -- then DROP"
+    found = scan(text)
+    assert [f["rule"] for f in found] == ["comment_injection", "ddl"]
+    assert all(text[f["start"]:f["end"]] == f["text"] for f in found)
+    # Разрешённые адресату правила в нарушения не попадают
+    assert [f["rule"] for f in violations("UPDATE x; -- y", "dba_team")] == ["comment_injection"]
+
+
+@pytest.mark.parametrize("text", [
+    "Подожди... я проверю выручку",
+    "Обновил отчёт, статусы updated_at совпадают",
+    "email: user@example.com, сумма 245.50",
+    "  SELECT * FROM processing_operations WHERE status = 'success'  ",
+])
+def test_ordinary_messages_pass_and_are_stripped(text):
+    assert sanitize(text) == text.strip()
@@ -0,0 +1,52 @@
+import math
+import random
+
+from scenario_scheduler import ScenarioScheduler, TimerWheel
+
+
+def _reference(timers, start, now):
+    """Что должно сработать к now: элементы по тику срока (тик 1 с, округление вверх), в тике — по порядку постановки"""
+    due = [(math.ceil(at - start), item) for at, item in timers]
+    return [item for tick, item in sorted(due, key=lambda entry: entry[0]) if tick <= math.floor(now - start)]
+
+
+def test_advance_fires_due_timers_in_order_across_small_and_large_jumps():
+    rng = random.Random(3)
+    wheel = TimerWheel(start=1000.0)
+    timers = [(1000.0 + rng.uniform(0, 5000), i) for i in range(300)]
+    for at, item in timers:
+        wheel.schedule(at, item)
+    fired, now = [], 1000.0
+    for step in [0.5, 3, 40, 63, 64, 65, 700, 1, 2, 5000]:  # в пределах оборота, ровно оборот и простои
+        now += step
+        fired += wheel.advance(now)
+        assert fired == _reference(timers, 1000.0, now)
+    assert wheel.pending == 0 and wheel.occupied == 0 and wheel.next_due() is None
+
+
+def test_large_idle_jump_visits_only_occupied_slots():
+    wheel = TimerWheel(start=0.0)
+    wheel.schedule(10, "a")
+    wheel.schedule(30, "b")
+    wheel.schedule(7 * 24 * 3600, "later")
+    visited = []
+    pop = wheel._pop
+    wheel._pop = lambda slot, tick: visited.append(tick) or pop(slot, tick)
+
+    assert wheel.advance(3600.0) == ["a", "b"]  # простой в час: 3600 тиков, но только 2 ячейки
+    assert visited == [10, 30]
+    assert wheel.next_due() == 7 * 24 * 3600
+    assert wheel.advance(30 * 24 * 3600.0) == ["later"]
+    assert wheel.pending == 0
+
+
+def test_scheduler_after_long_rerun_gap_fires_steps_once():
+    scenario = {"steps": [
+        {"id": "hello", "chat": "maxim", "message": "...", "at": 2},
+        {"id": "follow", "chat": "maxim", "message": "...", "after": "hello", "delay": 5},
+    ]}
+    scheduler = ScenarioScheduler(scenario, start_time=0.0)
+    assert [step["id"] for step in scheduler.due(600.0)] == ["hello"]
+    assert scheduler.next_due() == 605.0
+    assert [step["id"] for step in scheduler.due(10_000.0)] == ["follow"]
+    assert scheduler.due(20_000.0) == []
@@ -0,0 +1,69 @@
+import json
+import os
+
+import pytest
+
+from events import ChatEvent, DBAEvent, EventLog, KBSearchEvent, ResultMatchEvent, SQLEvent
+from report_generator import generate_report
+from session_scoring import SessionScorer
+from text_evaluator import TextEvaluator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def scorer():
+    with open(os.path.join(ROOT, "triggers.json"), encoding="utf-8") as f:
+        return SessionScorer(json.load(f), TextEvaluator())
+
+
+def _feed(scorer, events):
+    log = EventLog()
+    for event in events:
+        log.append(event)
+        scorer.observe(event, log.appended - 1)
+    return log
+
+
+def test_verify_after_dba_update_and_ledger(scorer):
+    _feed(scorer, [
+        SQLEvent("SELECT * FROM registry_statuses"),
+        DBAEvent("UPDATE processing_operations SET status = 'failed' WHERE processing_id = 'PB026'", "update", 1),
+        SQLEvent("SELECT status FROM processing_operations WHERE processing_id = 'PB026'"),
+    ])
+    assert scorer.scores["hard_skills"] == 8
+    assert scorer.scores["data_integrity"] == 0  # не ниже 0
+    assert scorer.ledger.to_frame()[["seq", "points", "trigger"]].values.tolist() == [
+        [0, -20, "missing_is_excluded"], [2, 8, "verify_after_update"]]
+
+
+def test_result_match_scores_once_per_step(scorer):
+    _feed(scorer, [ResultMatchEvent("revenue", "SELECT 1"), ResultMatchEvent("revenue", "SELECT 1")])
+    assert scorer.scores["hard_skills"] == 15
+    assert len(scorer.ledger) == 1
+
+
+def test_generate_report_matches_live_scores(scorer):
+    log = _feed(scorer, [
+        KBSearchEvent("статусы партнера", 3),
+        ChatEvent("Спасибо! Что значит IN_PROGRESS?", to="alice"),
+        ChatEvent("Что значит DECLINED?", to="alice"),
+        DBAEvent("UPDATE processing_operations SET status = 'failed' WHERE processing_id = 'PB026'", "update", 1),
+        SQLEvent("SELECT status FROM processing_operations WHERE processing_id = 'PB026'"),
+        ResultMatchEvent("revenue", "SELECT 1"),
+    ])
+    report = generate_report(log, scorer.triggers)
+    assert {block: b["score"] for block, b in report["blocks"].items()} == scorer.scores
+    assert scorer.scores["hard_skills"] == 8 + 15
+
+
+def test_chat_messages_and_kb_searches_do_not_score(scorer):
+    log = _feed(scorer, [
+        KBSearchEvent("бэкап", 1),
+        ChatEvent("Сначала сделаю бэкап таблицы, потом UPDATE", to="dba"),
+        ChatEvent("Спасибо! Что значит IN_PROGRESS?", to="alice"),
+    ])
+    assert scorer.scores == dict.fromkeys(scorer.scores, 0)
+    assert len(scorer.ledger) == 0
+    report = generate_report(log, scorer.triggers)
+    assert report["total_score"] == 0
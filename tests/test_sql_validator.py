@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+
+from sql_validator import DataOverlay, SQLSimulator, normalize_query, query_fingerprint
+
+
+@pytest.mark.parametrize("condition", [
+    "processing_id LIKE 'PB02%'",
+    "processing_id BETWEEN 'PB0200' AND 'PB0299'",
+    "processing_id IS NULL",
+    "processing_id LIKE 'PB02%' AND status = 'success'",
+])
+def test_update_rejects_unsupported_where(simulator, condition):
+    overlay = DataOverlay()
+    images, feedback = simulator.apply_dml(
+        f"UPDATE processing_operations SET status='failed' WHERE {condition}", overlay)
+    assert images is None
+    assert feedback.startswith("❌ Unsupported WHERE condition")
+    assert overlay.is_empty()
+
+
+def test_update_supported_where_touches_only_matching_rows(simulator):
+    overlay = DataOverlay()
+    table = simulator.tables["processing_operations"]
+    processing_id = table["processing_id"].iloc[0]
+    images, feedback = simulator.apply_dml(
+        f"UPDATE processing_operations SET status='failed' WHERE processing_id = '{processing_id}'", overlay)
+    assert len(images) == (table["processing_id"] == processing_id).sum()
+    assert feedback == f"✅ Updated rows: {len(images)}"
+
+
+@pytest.mark.parametrize("query, other", [
+    ("SELECT * FROM t WHERE status = 'Success'", "SELECT * FROM t WHERE status = 'success'"),
+    ('SELECT * FROM t WHERE status = "Success"', 'SELECT * FROM t WHERE status = "success"'),
+    ('SELECT * FROM t WHERE status = "a  b"', 'SELECT * FROM t WHERE status = "a b"'),
+])
+def test_normalize_query_keeps_literals(query, other):
+    assert query_fingerprint(query) != query_fingerprint(other)
+
+
+def test_normalize_query_ignores_case_and_spacing_outside_literals():
+    assert normalize_query('select *\n  FROM t where s = "X";') == 'select * from t where s = "X"'
+
+
+def test_grouped_sum_of_all_null_group_is_null():
+    simulator = SQLSimulator({"t": pd.DataFrame({"g": ["a", "a", "b"], "amount": [1.5, 2.0, None], "n": [1, 2, None]})})
+    grouped, _ = simulator.execute_sql("SELECT g, SUM(amount) AS s, SUM(n) AS k FROM t GROUP BY g")
+    whole, _ = simulator.execute_sql("SELECT SUM(amount) AS s, SUM(n) AS k FROM t WHERE g = 'b'")
+    assert grouped.set_index("g").loc["a"].tolist() == [3.5, 3]
+    assert grouped.set_index("g").loc["b"].isna().all()
+    assert whole.iloc[0].isna().all()
+
+
+@pytest.mark.parametrize("column", ["amount", "commission_amount"])
+@pytest.mark.parametrize("tail", ["", " OR processing_id = 'NO_SUCH_ID'"])  # быстрый путь и df.query
+def test_in_list_on_money_column_compares_in_currency_units(simulator, column, tail):
+    row, _ = simulator.execute_sql(f"SELECT processing_id, {column} FROM processing_operations LIMIT 1")
+    value = row[column].iloc[0]
+    total, _ = simulator.execute_sql("SELECT COUNT(*) AS c FROM processing_operations")
+    matching, _ = simulator.execute_sql(
+        f"SELECT processing_id FROM processing_operations WHERE {column} = {value}")
+
+    found, _ = simulator.execute_sql(
+        f"SELECT processing_id, {column} FROM processing_operations WHERE {column} IN ({value}, 0.01){tail}")
+    rest, _ = simulator.execute_sql(
+        f"SELECT COUNT(*) AS c FROM processing_operations WHERE {column} NOT IN ({value}){tail}")
+
+    assert row["processing_id"].iloc[0] in set(found["processing_id"])
+    assert (found[column] == value).all()
+    assert len(found) == len(matching)
+    assert rest["c"].iloc[0] == total["c"].iloc[0] - len(matching)
+
+
+def test_plain_select_returns_money_values_and_does_not_expose_tables(simulator):
+    full, _ = simulator.execute_sql("SELECT * FROM processing_operations")
+    top, _ = simulator.execute_sql("SELECT processing_id, amount FROM processing_operations ORDER BY amount DESC LIMIT 3")
+    expected = full.sort_values("amount", ascending=False, kind="stable").head(3)
+    assert top["amount"].tolist() == expected["amount"].tolist()
+    assert full["amount"].dtype == "float64"
+
+    full.loc[full.index[0], "amount"] = -1.0
+    again, _ = simulator._execute_select("SELECT * FROM processing_operations")
+    assert again["amount"].iloc[0] != -1.0
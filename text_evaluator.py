@@ -41,7 +41,9 @@ class TextEvaluator:
             "feedback": feedback
         }
 
-    def evaluate_chat_message(self, message: str, to: str = None) -> list:
+    def evaluate_chat_message(self, message: str, to: str = None, kb_searched: bool = None) -> list:
+        """kb_searched — был ли поиск по базе знаний после предыдущего сообщения.
+        None — лог поиска недоступен, тогда судим по упоминанию базы знаний в тексте."""
         triggers = []
         msg_low = message.lower()
 
@@ -55,9 +57,14 @@ class TextEvaluator:
             triggers.append({"id": "specific_reference", "points": 3})
         if any(re.search(p, msg_low) for p in self.synonyms["backup_request"]):
             triggers.append({"id": "create_backup_table", "points": 10})
-        if "баз" in msg_low and ("знани" in msg_low or "kb" in msg_low):
+        is_question = "?" in message or re.search(r"что\s+значит|где\s+он", msg_low)
+        if kb_searched is None:
+            kb_used = "баз" in msg_low and ("знани" in msg_low or "kb" in msg_low)
+        else:
+            kb_used = kb_searched and is_question
+        if kb_used:
             triggers.append({"id": "kb_search_before_ask", "points": 3})
-        if re.search(r"что\s+значит|где\s+он", msg_low) and not re.search(r"баз[ау]\s+знаний", msg_low):
+        if not kb_used and re.search(r"что\s+значит|где\s+он", msg_low) and not re.search(r"баз[ау]\s+знаний", msg_low):
             triggers.append({"id": "no_kb_search", "points": -5})
 
         return triggers
@@ -76,3 +83,35 @@ class TextEvaluator:
             triggers.append({"id": "create_backup_table", "points": 10})
 
         return triggers
+
+    def evaluate_sql_sequence(self, queries: list, triggers_config: dict) -> list:
+        """Триггеры condition=sql_sequence: последний запрос закрывает цепочку шаблонов,
+        предыдущие шаги найдены по порядку не дальше within_queries запросов назад.
+        Срабатывает только первая проверка после изменения."""
+        triggers = []
+        if not queries:
+            return triggers
+
+        for trig in triggers_config.get("mvp_triggers", []):
+            if trig.get("condition") != "sql_sequence":
+                continue
+            patterns = [re.compile(p, re.I | re.S) for p in trig["pattern"]]
+            if not patterns[-1].search(queries[-1]):
+                continue
+            window = queries[-trig.get("within_queries", 3) - 1:-1]
+            step = len(patterns) - 2
+            first_step_at = None
+            for i in range(len(window) - 1, -1, -1):
+                if step < 0:
+                    break
+                if patterns[step].search(window[i]):
+                    first_step_at = i
+                    step -= 1
+            if step >= 0:
+                continue
+            # Между изменением и текущим запросом проверки ещё не было
+            if first_step_at is not None and any(patterns[-1].search(q) for q in window[first_step_at + 1:]):
+                continue
+            triggers.append({"id": trig["id"], "points": trig["points"]})
+
+        return triggers
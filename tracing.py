@@ -0,0 +1,95 @@
+# tracing.py — замеры времени этапов rerun'а Streamlit
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Каждая сессия Streamlit выполняет скрипт в своём потоке — активный трейсер храним per-thread
+_local = threading.local()
+
+
+class RerunTrace:
+    """Один rerun: спаны (name, start_ms, duration_ms, depth) и, опционально, профиль cProfile"""
+
+    __slots__ = ("started_at", "label", "spans", "total_ms", "profile")
+
+    def __init__(self, label=""):
+        self.started_at = time.time()
+        self.label = label
+        self.spans = []
+        self.total_ms = 0.0
+        self.profile = None
+
+    def slowest(self, n=3):
+        return sorted(self.spans, key=lambda s: s[2], reverse=True)[:n]
+
+
+class Tracer:
+    """Трейсер сессии: хранит последние history rerun'ов"""
+
+    def __init__(self, history=30, profile_lines=30):
+        self.history = deque(maxlen=history)
+        self.profile_lines = profile_lines
+        self._current = None
+        self._t0 = 0.0
+        self._depth = 0
+
+    @contextmanager
+    def rerun(self, label="", profile=False):
+        """Оборачивает весь rerun. st.rerun() бросает исключение — трасса сохраняется в finally"""
+        trace = RerunTrace(label)
+        profiler = cProfile.Profile() if profile else None
+        self._current, self._t0, self._depth = trace, time.perf_counter(), 0
+        _local.tracer = self
+        if profiler:
+            profiler.enable()
+        try:
+            yield trace
+        finally:
+            if profiler:
+                profiler.disable()
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(self.profile_lines)
+                trace.profile = out.getvalue()
+            trace.total_ms = (time.perf_counter() - self._t0) * 1000
+            self.history.append(trace)
+            self._current = None
+            _local.tracer = None
+
+    @contextmanager
+    def span(self, name):
+        if self._current is None:
+            yield
+            return
+        start = time.perf_counter()
+        depth = self._depth
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth = depth
+            end = time.perf_counter()
+            self._current.spans.append((name, (start - self._t0) * 1000, (end - start) * 1000, depth))
+
+    def span_stats(self):
+        """Агрегаты по именам спанов за историю: name -> (count, avg_ms, max_ms)"""
+        stats = {}
+        for trace in self.history:
+            for name, _, duration, _ in trace.spans:
+                count, total, worst = stats.get(name, (0, 0.0, 0.0))
+                stats[name] = (count + 1, total + duration, max(worst, duration))
+        return {name: (count, total / count, worst) for name, (count, total, worst) in stats.items()}
+
+
+@contextmanager
+def span(name):
+    """Спан в активном rerun'е текущего потока; вне rerun'а — no-op"""
+    tracer = getattr(_local, "tracer", None)
+    if tracer is None:
+        yield
+        return
+    with tracer.span(name):
+        yield